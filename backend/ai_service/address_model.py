@@ -0,0 +1,338 @@
+"""Local address plausibility model.
+
+A logistic regression over hashed character n-grams (of the consonant / vowel /
+digit shape of the text), whole tokens and shape features such as keyboard-row
+runs, repeated letters and long digit runs, trained ahead of time and loaded
+once at startup. Scoring is pure Python and takes well under a
+millisecond, so clearly valid or clearly invalid addresses are answered without
+the LLM; only the borderline band in between is sent to it.
+
+    python address_model.py train --out data/address_model.json [--history labelled.jsonl]
+    python address_model.py eval --model data/address_model.json [--data data/address_golden.jsonl]
+    python address_model.py score "House 12, Street 5, Gulberg III, Lahore"
+
+Training data is the golden file (hand-labelled, one {"address", "valid"} object
+per line), synthetic examples generated from it, and optionally stored history:
+a JSONL export of past verdicts, e.g. from the main API database:
+
+    SELECT a.street || ', ' || a.city || ', ' || a.country AS address, NOT f.triggered AS valid
+    FROM "Address" a JOIN "Order" o ON o."addressId" = a.id
+    JOIN "RiskAssessment" ra ON ra."orderId" = o.id
+    JOIN "RiskFlag" f ON f."riskAssessmentId" = ra.id AND f."ruleId" = 10;
+"""
+import argparse
+import json
+import math
+import os
+import random
+import re
+import sys
+import unicodedata
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+DEFAULT_MODEL_PATH = os.path.join(DATA_DIR, "address_model.json")
+DEFAULT_GOLDEN_PATH = os.path.join(DATA_DIR, "address_golden.jsonl")
+
+DIM = 1 << 18
+NGRAMS = (3, 4)
+_VOWELS = set("aeiouy")
+_DIGIT_RUN = re.compile(r"\d+")
+_CONSONANT_RUN = re.compile(r"[bcdfghjklmnpqrstvwxz]+")
+_LETTER_RUN = re.compile(r"[^\W\d_]+")
+_TOKEN = re.compile(r"[^\s,]+")
+_FLOAT = re.compile(r"\d+\.\d+")
+_PLAIN_PUNCTUATION = set(" ,.-/#'")
+# Letters folded to consonant / vowel classes for the n-grams, so they describe
+# the shape of a word ("cvccvc") rather than its spelling
+_CHAR_CLASSES = str.maketrans({**{ch: "c" for ch in "bcdfghjklmnpqrstvwxz"}, **{ch: "v" for ch in "aeiouy"}})
+_KEY_ROWS = ("qwertyuiop", "asdfghjkl", "zxcvbnm")
+_KEY_POS = {ch: (row, col) for row, keys in enumerate(_KEY_ROWS) for col, ch in enumerate(keys)}
+
+
+def _normalize(address: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", address)
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join(stripped.casefold().split())
+
+
+def _bucket(value: float, edges: Tuple[float, ...]) -> int:
+    for i, edge in enumerate(edges):
+        if value <= edge:
+            return i
+    return len(edges)
+
+
+def _adjacent_ratio(word: str) -> float:
+    """Share of consecutive letters that are neighbouring keys (or the same key)."""
+    pairs = list(zip(word, word[1:]))
+    if not pairs:
+        return 0.0
+    near = 0
+    for a, b in pairs:
+        pa, pb = _KEY_POS.get(a), _KEY_POS.get(b)
+        near += pa is not None and pb is not None and abs(pa[0] - pb[0]) <= 1 and abs(pa[1] - pb[1]) <= 1
+    return near / len(pairs)
+
+
+def _repetition(word: str) -> float:
+    """1 - distinct letters / length: 'sdfsdf' and 'aaaaa' score high, real words low."""
+    return 1 - len(set(word)) / len(word) if word else 0.0
+
+
+def features(address: str) -> List[int]:
+    """Hashed feature indices (binary features; repeats collapse).
+
+    Shape features carry most of the signal and generalise to unseen places:
+    keyboard-adjacent or repetitive letter runs, missing vowels, long digit runs
+    and stray floats or symbols. Character n-grams over consonant / vowel /
+    digit classes describe word shape; whole tokens add what the labelled data
+    says about specific words."""
+    text = _normalize(address)
+    shape = _DIGIT_RUN.sub(lambda m: "0" * len(m.group()), text)
+    classes = f" {shape.translate(_CHAR_CLASSES)} "
+    names = [f"{n}:{classes[i:i + n]}" for n in NGRAMS for i in range(len(classes) - n + 1)]
+    names += [f"w:{token}" for token in _TOKEN.findall(shape)]
+
+    words = [w for w in _LETTER_RUN.findall(text) if w.isascii()]
+    long_words = [w for w in words if len(w) >= 4]
+    digit_runs = [len(r) for r in _DIGIT_RUN.findall(text)]
+    consonant_runs = [len(r) for r in _CONSONANT_RUN.findall(text)]
+    max_adjacent = max_repetition = 0.0
+    for w in long_words:
+        adjacent, repetition = _adjacent_ratio(w), _repetition(w)
+        vowels = sum(1 for ch in w if ch in _VOWELS) / len(w)
+        names.append(f"word_shape:{_bucket(adjacent, (0.3, 0.5, 0.7))}:{_bucket(repetition, (0.2, 0.4))}:{_bucket(vowels, (0.0, 0.15, 0.3))}")
+        max_adjacent, max_repetition = max(max_adjacent, adjacent), max(max_repetition, repetition)
+    names += [
+        f"max_adjacent:{_bucket(max_adjacent, (0.3, 0.5, 0.7, 0.85))}",
+        f"max_repetition:{_bucket(max_repetition, (0.2, 0.35, 0.5, 0.7))}",
+        f"digit_run:{_bucket(max(digit_runs, default=0), (0, 2, 4, 6, 7, 9, 12))}",
+        f"digit_groups:{_bucket(len(digit_runs), (0, 1, 2, 3, 5, 8))}",
+        f"floats:{_bucket(len(_FLOAT.findall(text)), (0, 1))}",
+        f"consonant_run:{_bucket(max(consonant_runs, default=0), (2, 3, 4, 5, 6))}",
+        f"words:{_bucket(len(words), (0, 1, 2, 3, 5, 8))}",
+        f"symbols:{_bucket(sum(1 for ch in text if not ch.isalnum() and ch not in _PLAIN_PUNCTUATION), (0, 1, 3))}",
+        "bias",
+    ]
+    return sorted({zlib.crc32(name.encode("utf-8")) % DIM for name in names})
+
+
+def _sigmoid(z: float) -> float:
+    if z < -35:
+        return 0.0
+    if z > 35:
+        return 1.0
+    return 1.0 / (1.0 + math.exp(-z))
+
+
+class AddressModel:
+    """Probability that an address is a plausible delivery address, plus a
+    three-way verdict: VALID / INVALID when the score is outside the
+    [invalid_below, valid_above] band, None (ask the LLM) inside it."""
+
+    def __init__(self, weights: Dict[int, float], valid_above: float = 0.95, invalid_below: float = 0.05):
+        self.weights = weights
+        self.valid_above = valid_above
+        self.invalid_below = invalid_below
+
+    @classmethod
+    def load(cls, path: str, **thresholds: float) -> "AddressModel":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("dim") != DIM or tuple(data.get("ngrams", ())) != NGRAMS:
+            raise ValueError(f"{path} was trained with different feature settings")
+        return cls({int(k): v for k, v in data["weights"].items()}, **thresholds)
+
+    def save(self, path: str, min_weight: float = 1e-4) -> None:
+        kept = {str(k): round(w, 5) for k, w in sorted(self.weights.items()) if abs(w) >= min_weight}
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"dim": DIM, "ngrams": list(NGRAMS), "weights": kept}, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    def score(self, address: str) -> float:
+        weights = self.weights
+        return _sigmoid(sum(weights.get(i, 0.0) for i in features(address)))
+
+    def verdict(self, address: str) -> Tuple[Optional[str], float]:
+        p = self.score(address)
+        if p >= self.valid_above:
+            return "VALID", p
+        if p <= self.invalid_below:
+            return "INVALID", p
+        return None, p
+
+
+def load_address_model_from_env() -> Optional[AddressModel]:
+    """The model named by ADDRESS_MODEL_PATH (default data/address_model.json), if
+    present; ADDRESS_MODEL_PATH=off disables the pre-screen."""
+    path = os.getenv("ADDRESS_MODEL_PATH", DEFAULT_MODEL_PATH)
+    if path.lower() == "off" or not os.path.exists(path):
+        return None
+    return AddressModel.load(
+        path,
+        valid_above=float(os.getenv("ADDRESS_MODEL_VALID_ABOVE", "0.95")),
+        invalid_below=float(os.getenv("ADDRESS_MODEL_INVALID_BELOW", "0.05")),
+    )
+
+
+# --- training -----------------------------------------------------------------
+
+def read_labelled(path: str) -> List[Tuple[str, bool]]:
+    rows = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                rows.append((row["address"], bool(row["valid"])))
+    return rows
+
+
+def _mash(rng: random.Random) -> str:
+    """Keyboard mash: a run along one key row, often typed back and forth or repeated."""
+    row = rng.choice(_KEY_ROWS)
+    start = rng.randrange(len(row) - 3)
+    run = row[start:start + rng.randint(3, 6)]
+    style = rng.randrange(4)
+    if style == 0:
+        return run
+    if style == 1:
+        return run * rng.randint(2, 3)
+    if style == 2:
+        return run + run[::-1][1:]
+    return "".join(rng.choice(run) for _ in range(rng.randint(5, 9)))
+
+
+def _garbage(rng: random.Random) -> str:
+    letters = "bcdfghjklmnpqrstvwxz" if rng.random() < 0.5 else "abcdefghijklmnopqrstuvwxyz"
+    return "".join(rng.choice(letters) for _ in range(rng.randint(6, 12)))
+
+
+def synthesize(golden: List[Tuple[str, bool]], n: int, seed: int = 0) -> List[Tuple[str, bool]]:
+    """Valid examples recombined from golden valid addresses (renumbered, parts
+    shuffled between them) and invalid ones made by corrupting them the way the
+    validation prompt describes: keyboard mashes, unnaturally long numbers,
+    stray floats and symbols, or nothing address-like at all."""
+    rng = random.Random(seed)
+    valid = [a for a, ok in golden if ok]
+    parts = [[p.strip() for p in a.split(",") if p.strip()] for a in valid]
+    out: List[Tuple[str, bool]] = []
+    for _ in range(n):
+        base = list(rng.choice(parts))
+        if len(base) > 1 and rng.random() < 0.5:
+            other = rng.choice(parts)
+            base[-1] = other[-1]
+        base = [_DIGIT_RUN.sub(lambda m: str(rng.randint(1, 10 ** len(m.group()) - 1)), p) for p in base]
+        out.append((", ".join(base), True))
+
+        bad = list(base)
+        kind = rng.randrange(6)
+        i = rng.randrange(len(bad))
+        if kind == 0:
+            bad[i] = f"{_mash(rng)} {bad[i]}"
+        elif kind == 1:
+            bad[i] = " ".join(_mash(rng) for _ in range(rng.randint(1, 2)))
+        elif kind == 2:
+            bad[i] = f"{bad[i]} {rng.choice('123456789') * rng.randint(9, 24)}"
+        elif kind == 3:
+            bad.insert(i, f"{rng.randint(1, 99)}.{rng.randint(100, 999)}.{rng.randint(100, 999)} {'!' * rng.randint(1, 3)}")
+        elif kind == 4:
+            bad = [f"{_mash(rng)}{rng.randint(0, 9999)} {_mash(rng)}", base[-1]]
+        else:
+            bad[i] = _garbage(rng)
+        out.append((", ".join(bad), False))
+    return out
+
+
+def train(examples: List[Tuple[str, bool]], epochs: int = 5, lr: float = 0.5, l2: float = 1e-2, seed: int = 0) -> AddressModel:
+    """Logistic regression with per-feature AdaGrad steps over the sparse features."""
+    rng = random.Random(seed)
+    data = [(features(a), 1.0 if ok else 0.0) for a, ok in examples]
+    weights: Dict[int, float] = {}
+    grad_sq: Dict[int, float] = {}
+    for _ in range(epochs):
+        rng.shuffle(data)
+        for idx, y in data:
+            g = _sigmoid(sum(weights.get(i, 0.0) for i in idx)) - y
+            for i in idx:
+                w = weights.get(i, 0.0)
+                step = g + l2 * w
+                grad_sq[i] = grad_sq.get(i, 0.0) + step * step
+                weights[i] = w - lr * step / math.sqrt(grad_sq[i] + 1e-8)
+    return AddressModel(weights)
+
+
+def evaluate(model: AddressModel, examples: List[Tuple[str, bool]]) -> Dict[str, float]:
+    """Accuracy at 0.5, plus how much traffic the thresholds answer locally and
+    how often those local verdicts are wrong."""
+    correct = decided = decided_wrong = 0
+    for address, ok in examples:
+        p = model.score(address)
+        correct += (p >= 0.5) == ok
+        verdict, _ = model.verdict(address)
+        if verdict is not None:
+            decided += 1
+            decided_wrong += (verdict == "VALID") != ok
+    n = len(examples) or 1
+    return {
+        "examples": len(examples),
+        "accuracy": round(correct / n, 4),
+        "short_circuit_rate": round(decided / n, 4),
+        "short_circuit_error_rate": round(decided_wrong / decided, 4) if decided else 0.0,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Train, evaluate or query the local address plausibility model.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    tr = sub.add_parser("train", help="train a model from golden, synthetic and historical examples")
+    tr.add_argument("--golden", default=DEFAULT_GOLDEN_PATH)
+    tr.add_argument("--history", action="append", default=[], help="JSONL of {address, valid} from past verdicts (repeatable)")
+    tr.add_argument("--synthetic", type=int, default=3000, help="synthetic valid/invalid pairs generated from the golden set")
+    tr.add_argument("--holdout", type=float, default=0.0, help="fraction of golden examples kept out of training and reported on")
+    tr.add_argument("--epochs", type=int, default=5)
+    tr.add_argument("--seed", type=int, default=0)
+    tr.add_argument("--out", default=DEFAULT_MODEL_PATH)
+
+    ev = sub.add_parser("eval", help="report accuracy and short-circuit rates on labelled data")
+    ev.add_argument("--model", default=DEFAULT_MODEL_PATH)
+    ev.add_argument("--data", action="append", default=[], help="labelled JSONL (default: the golden set)")
+    ev.add_argument("--valid-above", type=float, default=0.95)
+    ev.add_argument("--invalid-below", type=float, default=0.05)
+
+    sc = sub.add_parser("score", help="score addresses given on the command line")
+    sc.add_argument("--model", default=DEFAULT_MODEL_PATH)
+    sc.add_argument("addresses", nargs="+")
+
+    args = parser.parse_args(argv)
+    if args.command == "train":
+        golden = read_labelled(args.golden)
+        random.Random(args.seed).shuffle(golden)
+        cut = int(len(golden) * args.holdout)
+        held_out, golden = golden[:cut], golden[cut:]
+        examples = golden + synthesize(golden, args.synthetic, args.seed)
+        for path in args.history:
+            examples += read_labelled(path)
+        model = train(examples, epochs=args.epochs, seed=args.seed)
+        model.save(args.out)
+        print(f"Wrote {args.out}: {len(model.weights)} weights from {len(examples)} examples")
+        if held_out:
+            print(json.dumps({"held_out": evaluate(model, held_out)}))
+        return 0
+
+    model = AddressModel.load(args.model, **({"valid_above": args.valid_above, "invalid_below": args.invalid_below} if args.command == "eval" else {}))
+    if args.command == "eval":
+        for path in args.data or [DEFAULT_GOLDEN_PATH]:
+            print(json.dumps({"data": path, **evaluate(model, read_labelled(path))}))
+        return 0
+    for address in args.addresses:
+        verdict, p = model.verdict(address)
+        print(f"{p:.4f}  {verdict or 'BORDERLINE'}  {address}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
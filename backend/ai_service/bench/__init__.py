@@ -0,0 +1,9 @@
+"""Offline benchmark for the analyze pipeline.
+
+Groq, ZipcodeStack and Nominatim are replaced by local stand-ins that replay the
+recorded responses in bench/fixtures with configurable latency and error rates,
+so the run needs no API keys or network. From backend/ai_service:
+
+    python -m bench.run --orders 500 --concurrency 1,16,64
+    python -m bench.run --llm-latency 1.2 --geo-error-rate 0.05 --json
+"""
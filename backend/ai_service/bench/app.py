@@ -0,0 +1,31 @@
+# ASGI entry point for multi-process benchmarks: the real service, with the LLM
+# and geo upstreams replaced by the recorded stand-ins in every worker.
+#
+#     BENCH_ARGS="--llm-latency 0.2" python serve.py --app bench.app:app --workers 4
+#
+# BENCH_ARGS takes the upstream options of bench.run (latencies, error rates...).
+import os
+import shlex
+from contextlib import asynccontextmanager
+
+# The lifespan must not need a Groq key; its gateway is replaced right away
+os.environ.setdefault("LLM_BACKEND", "fake")
+
+import main
+from bench.run import build_parser, install_fakes
+
+app = main.app
+_serve_lifespan = app.router.lifespan_context
+
+
+@asynccontextmanager
+async def _bench_lifespan(app):
+    async with _serve_lifespan(app):
+        llm, geo = app.state.llm, app.state.geo
+        install_fakes(app, build_parser().parse_args(shlex.split(os.getenv("BENCH_ARGS", ""))), keep_state=True)
+        await geo.aclose()
+        await llm.aclose()
+        yield
+
+
+app.router.lifespan_context = _bench_lifespan
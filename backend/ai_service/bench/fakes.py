@@ -0,0 +1,103 @@
+import asyncio
+import json
+import os
+import random
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from countries import resolve_iso2
+from llm_gateway import FakeBackend, LLMError
+from prompts import ADDRESS_VALIDATION_SYSTEM_PROMPT, E164_SYSTEM_PROMPT
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def load_fixture(name: str) -> Any:
+    with open(os.path.join(FIXTURES_DIR, f"{name}.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+@dataclass
+class UpstreamProfile:
+    """Latency / failure behaviour of one stand-in upstream.
+
+    Each call sleeps `latency` seconds +/- `jitter` (a fraction of latency) and
+    fails with a 503 with probability `error_rate`; with probability `slow_rate`
+    it stalls for `slow_factor` times as long (a tail-latency outlier)."""
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    slow_rate: float = 0.0
+    slow_factor: float = 20.0
+
+    def delay(self, rng: random.Random) -> float:
+        if not self.latency:
+            return 0.0
+        delay = max(0.0, self.latency * (1 + rng.uniform(-self.jitter, self.jitter)))
+        if self.slow_rate > 0 and rng.random() < self.slow_rate:
+            delay *= self.slow_factor
+        return delay
+
+    def fails(self, rng: random.Random) -> bool:
+        return self.error_rate > 0 and rng.random() < self.error_rate
+
+
+class ReplayBackend(FakeBackend):
+    """LLM backend that replays recorded Groq completions.
+
+    The fixture is chosen from the system prompt (address validation, E.164
+    normaliser or the risk assessment); latency and errors follow the model's
+    profile, and failures are raised as retryable 503s like the real API."""
+
+    def __init__(self, profiles: Dict[str, UpstreamProfile], default: UpstreamProfile, seed: int = 0, fixtures: Optional[Dict[str, str]] = None):
+        super().__init__(responder=self._respond)
+        self._fixtures = fixtures or load_fixture("groq")
+        self._profiles = profiles
+        self._default = default
+        self._rng = random.Random(seed)
+
+    def _respond(self, model: str, messages: List[Dict[str, str]], params: Dict[str, Any]) -> str:
+        system = messages[0]["content"] if messages else ""
+        if system.startswith(ADDRESS_VALIDATION_SYSTEM_PROMPT):
+            # Addresses without a house number are the ones the real model rejects
+            address = messages[-1]["content"]
+            if not any(ch.isdigit() for ch in address.split(",")[0]):
+                return self._fixtures["address_validation_invalid"]
+            return self._fixtures["address_validation"]
+        if system == E164_SYSTEM_PROMPT:
+            return self._fixtures["e164"]
+        return self._fixtures["assessment"]
+
+    async def complete(self, model: str, messages: List[Dict[str, str]], **params: Any):
+        profile = self._profiles.get(model, self._default)
+        await asyncio.sleep(profile.delay(self._rng))
+        if profile.fails(self._rng):
+            raise LLMError(f"{model}: simulated 503", status_code=503)
+        return await super().complete(model, messages, **params)
+
+
+def geo_transport(profiles: Dict[str, UpstreamProfile], default: UpstreamProfile, seed: int = 0) -> httpx.MockTransport:
+    """httpx transport answering ZipcodeStack / Nominatim searches from the recorded fixtures."""
+    zipcodestack = load_fixture("zipcodestack")
+    nominatim = load_fixture("nominatim")
+    rng = random.Random(seed)
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        profile = profiles.get(host, default)
+        await asyncio.sleep(profile.delay(rng))
+        if profile.fails(rng):
+            return httpx.Response(503, json={"error": "simulated outage"})
+
+        params = request.url.params
+        iso2 = resolve_iso2(params.get("country", "")) or ""
+        if host == "nominatim.openstreetmap.org":
+            return httpx.Response(200, json=nominatim.get(f"{iso2}|{params.get('city', '')}", []))
+        if "codes" in params:
+            code = params["codes"]
+            return httpx.Response(200, json={"query": {"codes": [code]}, "results": zipcodestack["postal"].get(f"{iso2}|{code}", [])})
+        return httpx.Response(200, json={"query": {"city": params.get("city")}, "results": zipcodestack["cities"].get(f"{iso2}|{params.get('city', '')}", [])})
+
+    return httpx.MockTransport(handler)
@@ -0,0 +1,110 @@
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+# (street, city, state, postal code, country) — a mix of clean addresses, a postcode
+# from another city, cities only Nominatim knows and an undeliverable address, so
+# both the fast path and the LLM path are exercised.
+ADDRESSES = [
+    ("House 12, Street 5, Gulberg III", "Lahore", "Punjab", "54000", "Pakistan"),
+    ("Flat 4B, Block 7, Clifton", "Karachi", "Sindh", "74200", "Pakistan"),
+    ("House 221, Street 14, F-10/2", "Islamabad", "Islamabad Capital Territory", "44000", "Pakistan"),
+    ("P-45 Peoples Colony No 1", "Faisalabad", "Punjab", "38000", "Pakistan"),
+    ("House 9, Satellite Town", "Rawalpindi", "Punjab", "46000", "Pakistan"),
+    ("House 3, Gulgasht Colony", "Multan", "Punjab", "", "Pakistan"),
+    ("Plot 18, Cantt", "Sialkot", "Punjab", "", "Pakistan"),
+    ("House 77, University Town", "Peshawar", "Khyber Pakhtunkhwa", "54000", "Pakistan"),
+    ("near the big mosque", "Lahore", "Punjab", "54000", "Pakistan"),
+    ("742 Evergreen Terrace", "Springfield", "Illinois", "62704", "United States"),
+    ("350 5th Ave", "New York", "New York", "10001", "United States"),
+    ("10 Downing Street", "London", "England", "SW1A 1AA", "United Kingdom"),
+    ("Building 5, Connaught Place", "New Delhi", "Delhi", "110001", "India"),
+    ("Villa 21, Jumeirah 1", "Dubai", "Dubai", "00000", "United Arab Emirates"),
+]
+
+PHONES = {
+    "Pakistan": ["0300{:07d}", "+92 321 {:07d}", "92345{:07d}", "0300{:05d}"],
+    "United States": ["(217) 555-{:04d}", "+1 212 555 {:04d}"],
+    "United Kingdom": ["07700 9{:05d}", "+44 20 7946 {:04d}"],
+    "India": ["98{:08d}", "+91 70{:08d}"],
+    "United Arab Emirates": ["050{:07d}", "+971 55 {:07d}"],
+}
+
+FIRST_NAMES = ["Ali", "Ayesha", "Usman", "Fatima", "Bilal", "Sara", "Hamza", "Zainab", "John", "Emma", "Raj", "Omar"]
+LAST_NAMES = ["Khan", "Ahmed", "Malik", "Hussain", "Butt", "Smith", "Sharma", "Iqbal", "Qureshi", "Sheikh"]
+IP_LOCATIONS = [("Lahore", "Punjab"), ("Karachi", "Sindh"), ("Islamabad", "Islamabad Capital Territory"), ("Dubai", "Dubai")]
+
+
+def _phone(rng: random.Random, country: str) -> str:
+    pattern = rng.choice(PHONES.get(country, ["+{:010d}"]))
+    width = int(pattern.split("{:0")[1].split("d")[0])
+    return pattern.format(rng.randrange(10 ** width))
+
+
+def _history(rng: random.Random) -> Optional[Dict[str, Any]]:
+    """Roughly a third of orders arrive with historical context, like repeat customers."""
+    if rng.random() > 0.35:
+        return None
+    name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+    return {
+        "same_person_orders": {
+            "minutes_since_last_order": rng.choice([3, 45, 600, 4000]),
+            "orders_last_24h": rng.randint(0, 4),
+            "orders_last_7d": rng.randint(1, 16),
+        },
+        "address_history": {"other_names_at_this_address": [name] if rng.random() < 0.2 else []},
+        "duplicate_email_matches": [{"name": name, "email": "other@example.com"}] if rng.random() < 0.1 else [],
+        "duplicate_phone_matches": [],
+    }
+
+
+def generate_order(rng: random.Random, index: int, address_pool: int = len(ADDRESSES)) -> Dict[str, Any]:
+    """One order in the OrderPayload shape the NestJS API and the store page send."""
+    street, city, state, postal_code, country = ADDRESSES[rng.randrange(address_pool)]
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    ip_city, ip_region = rng.choice(IP_LOCATIONS)
+    now = datetime.now(timezone.utc)
+    payload = {
+        "user_profile": {
+            "user_id": f"CUST-BENCH-{index:06d}",
+            "full_name": f"{first} {last}",
+            "created_at": (now - timedelta(days=rng.randint(0, 900))).strftime("%Y-%m-%dT00:00:00Z"),
+            "email": f"{first.lower()}.{last.lower()}{rng.randint(1, 999)}@example.com",
+            "phone": _phone(rng, country),
+            "country": country,
+        },
+        "order_details": {
+            "order_id": f"ORD-BENCH-{index:06d}",
+            "total_amount": round(rng.uniform(5, 900), 2),
+            "item_count": rng.randint(1, 6),
+            "created_at": now.isoformat(),
+            "items": [],
+            "method": rng.choice(["COD", "Card"]),
+        },
+        "address": {
+            "street": street,
+            "city": city,
+            "state": state,
+            "postal_code": postal_code,
+            "country": country,
+        },
+        "ip_info": {
+            "ip_address": f"39.{rng.randint(32, 63)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+            "ip_country": "Pakistan",
+            "ip_region": ip_region,
+            "ip_city": ip_city,
+            "latitude": 0,
+            "longitude": 0,
+        },
+        "history": {"past_orders": rng.randint(0, 12), "account_flags": 0, "failed_deliveries": rng.randint(0, 2), "blacklist_info": False},
+    }
+    history = _history(rng)
+    if history is not None:
+        payload["historical_context"] = history
+    return payload
+
+
+def generate_orders(n: int, seed: int = 0, address_pool: int = len(ADDRESSES)) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    return [generate_order(rng, i, address_pool) for i in range(n)]
+
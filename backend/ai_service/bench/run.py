@@ -0,0 +1,170 @@
+import argparse
+import asyncio
+import json
+import math
+import sys
+import time
+from typing import Any, Dict, List
+
+import httpx
+
+from bench.fakes import ReplayBackend, UpstreamProfile, geo_transport
+from bench.orders import ADDRESSES, generate_orders
+from address_model import load_address_model_from_env
+from cache import TieredCache
+from cascade import LARGE_MODEL, SMALL_MODEL, ModelCascade
+from feature_store import FeatureStore
+from geo_client import GeoClient
+from llm_gateway import LLMGateway
+from settings import create_settings_from_env
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def install_fakes(app: Any, args: argparse.Namespace, keep_state: bool = False) -> ReplayBackend:
+    """Point the service at the local stand-ins (what the lifespan would otherwise build).
+
+    With `keep_state`, the caches and feature store the lifespan built (e.g. the
+    shared files of serve.py) stay in place and only the upstreams are replaced."""
+    llm_profile = UpstreamProfile(args.llm_latency, args.jitter, args.llm_error_rate)
+    backend = ReplayBackend(
+        {SMALL_MODEL: UpstreamProfile(args.llm_small_latency, args.jitter, args.llm_error_rate)},
+        default=llm_profile,
+        seed=args.seed,
+    )
+    app.state.llm = LLMGateway(backend, default_concurrency=args.llm_concurrency, base_delay=0.05, max_delay=0.5)
+    app.state.cascade = ModelCascade(args.cascade, args.cascade_threshold)
+    geo_profile = UpstreamProfile(args.geo_latency, args.jitter, args.geo_error_rate, args.geo_slow_rate)
+    app.state.geo = GeoClient("bench", transport=geo_transport({}, default=geo_profile, seed=args.seed))
+    app.state.gazetteer = None
+    app.state.address_model = load_address_model_from_env()
+    if not keep_state:
+        app.state.settings = create_settings_from_env()
+        app.state.features = FeatureStore()
+        reset_caches(app)
+    return backend
+
+
+def reset_caches(app: Any) -> None:
+    app.state.geo_cache = TieredCache("geo", maxsize=20000, ttl=3600, negative_ttl=600)
+    app.state.address_cache = TieredCache("address", maxsize=50000, ttl=3600, negative_ttl=600)
+
+
+async def run_level(app: Any, orders: List[Dict[str, Any]], concurrency: int) -> Dict[str, Any]:
+    """Send every order through POST /api/v1/analyze with `concurrency` clients in flight."""
+    latencies: List[float] = []
+    errors = 0
+    queue: asyncio.Queue = asyncio.Queue()
+    for order in orders:
+        queue.put_nowait(order)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=120) as client:
+        async def worker() -> None:
+            nonlocal errors
+            while True:
+                try:
+                    order = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                started = time.perf_counter()
+                resp = await client.post("/api/v1/analyze", json=order)
+                latencies.append(time.perf_counter() - started)
+                if resp.status_code != 200:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "orders": len(orders),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(orders) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "max_ms": round(latencies[-1] * 1000, 1) if latencies else 0.0,
+    }
+
+
+async def run(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    import main
+
+    app = main.app
+    backend = install_fakes(app, args)
+    orders = generate_orders(args.orders, seed=args.seed, address_pool=args.address_pool)
+    results = []
+    try:
+        for concurrency in args.concurrency:
+            if not args.warm:
+                reset_caches(app)
+            # Every level re-sends the same orders; stored verdicts would answer them all
+            app.state.verdict_cache = TieredCache("verdict", maxsize=10000, ttl=3600, negative_ttl=3600)
+            calls_before = len(backend.calls)
+            result = await run_level(app, orders, concurrency)
+            result["llm_calls"] = len(backend.calls) - calls_before
+            result["geo_cache_hit_ratio"] = app.state.geo_cache.snapshot()["hit_ratio"]
+            result["address_cache_hit_ratio"] = app.state.address_cache.snapshot()["hit_ratio"]
+            results.append(result)
+            backend.calls.clear()
+    finally:
+        await app.state.geo.aclose()
+        await app.state.llm.aclose()
+    return results
+
+
+COLUMNS = ["concurrency", "orders", "errors", "throughput_rps", "p50_ms", "p95_ms", "p99_ms", "max_ms", "llm_calls", "geo_cache_hit_ratio", "address_cache_hit_ratio"]
+
+
+def print_table(results: List[Dict[str, Any]]) -> None:
+    widths = [max(len(c), *(len(str(r[c])) for r in results)) for c in COLUMNS]
+    print("  ".join(c.rjust(w) for c, w in zip(COLUMNS, widths)))
+    for r in results:
+        print("  ".join(str(r[c]).rjust(w) for c, w in zip(COLUMNS, widths)))
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Offline load test of /api/v1/analyze against recorded Groq / geo fixtures.")
+    parser.add_argument("--orders", type=int, default=200, help="orders sent per concurrency level")
+    parser.add_argument("--concurrency", default="1,8,32,64", help="comma-separated concurrency levels")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--address-pool", type=int, default=len(ADDRESSES), help="distinct addresses to draw from (lower = more cache hits)")
+    parser.add_argument("--warm", action="store_true", help="keep caches between levels instead of starting each level cold")
+    parser.add_argument("--llm-latency", type=float, default=0.8, help=f"seconds per {LARGE_MODEL} call")
+    parser.add_argument("--llm-small-latency", type=float, default=0.15, help=f"seconds per {SMALL_MODEL} call")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="fraction of LLM calls failing with 503")
+    parser.add_argument("--llm-concurrency", type=int, default=8, help="in-flight LLM calls per model")
+    parser.add_argument("--cascade", default="off", choices=["off", "cascade", "shadow"], help="model cascade mode (CASCADE_MODE)")
+    parser.add_argument("--cascade-threshold", type=float, default=0.85, help="small-model confidence needed to skip the large model")
+    parser.add_argument("--geo-latency", type=float, default=0.12, help="seconds per ZipcodeStack / Nominatim call")
+    parser.add_argument("--geo-error-rate", type=float, default=0.0, help="fraction of geo calls failing with 503")
+    parser.add_argument("--geo-slow-rate", type=float, default=0.0, help="fraction of geo calls stalling for 20x the latency")
+    parser.add_argument("--jitter", type=float, default=0.3, help="latency jitter as a fraction of the latency")
+    parser.add_argument("--json", action="store_true", help="print one JSON object per level instead of a table")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    args.concurrency = [int(c) for c in args.concurrency.split(",") if c.strip()]
+
+    results = asyncio.run(run(args))
+    if args.json:
+        for r in results:
+            print(json.dumps(r))
+    else:
+        print_table(results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
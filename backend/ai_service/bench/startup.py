@@ -0,0 +1,167 @@
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List
+
+import httpx
+
+from bench.orders import generate_orders
+from bench.run import percentile
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+READY_LINE = "Application startup complete"
+# Upstreams answer instantly, so throughput measures the service's own CPU cost
+DEFAULT_BENCH_ARGS = "--llm-latency 0 --llm-small-latency 0 --geo-latency 0 --jitter 0"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def start_server(workers: int, port: int, shared_dir: str, bench_args: str) -> asyncio.subprocess.Process:
+    env = {**os.environ, "BENCH_ARGS": bench_args, "PYTHONPATH": SERVICE_DIR}
+    return await asyncio.create_subprocess_exec(
+        sys.executable, "serve.py",
+        "--app", "bench.app:app", "--host", "127.0.0.1", "--port", str(port),
+        "--workers", str(workers), "--shared-dir", shared_dir, "--log-level", "info",
+        cwd=SERVICE_DIR, env=env,
+        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE,
+    )
+
+
+async def wait_ready(proc: asyncio.subprocess.Process, workers: int, timeout: float) -> float:
+    """Seconds until every worker has finished its lifespan startup."""
+    started = time.perf_counter()
+    ready = 0
+
+    async def read() -> None:
+        nonlocal ready
+        while ready < workers:
+            line = await proc.stderr.readline()
+            if not line:
+                raise RuntimeError("server exited during startup")
+            if READY_LINE in line.decode(errors="replace"):
+                ready += 1
+
+    await asyncio.wait_for(read(), timeout=timeout)
+    return time.perf_counter() - started
+
+
+async def _drain(proc: asyncio.subprocess.Process) -> None:
+    # Keep reading the server's log so a full pipe never blocks its workers
+    while await proc.stderr.readline():
+        pass
+
+
+async def _load(port: int, orders: List[Dict[str, Any]], concurrency: int) -> List[float]:
+    latencies: List[float] = []
+    queue: asyncio.Queue = asyncio.Queue()
+    for order in orders:
+        queue.put_nowait(order)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=120) as client:
+        async def worker() -> None:
+            while True:
+                try:
+                    order = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                started = time.perf_counter()
+                resp = await client.post("/api/v1/analyze", json=order)
+                latencies.append(time.perf_counter() - started if resp.status_code == 200 else -1.0)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies
+
+
+def _load_process(port: int, orders: List[Dict[str, Any]], concurrency: int) -> List[float]:
+    return asyncio.run(_load(port, orders, concurrency))
+
+
+def run_load(port: int, orders: List[Dict[str, Any]], concurrency: int, clients: int) -> Dict[str, Any]:
+    """Send the orders from `clients` load-generator processes (so the client side
+    is not what saturates first) and summarise latency and throughput."""
+    chunks = [orders[i::clients] for i in range(clients)]
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=clients) as pool:
+        results = list(pool.map(_load_process, [port] * clients, chunks, [max(1, concurrency // clients)] * clients))
+    elapsed = time.perf_counter() - started
+    latencies = sorted(l for part in results for l in part if l >= 0)
+    errors = sum(1 for part in results for l in part if l < 0)
+    return {
+        "errors": errors,
+        "throughput_rps": round(len(orders) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+    }
+
+
+async def run_level(args: argparse.Namespace, workers: int, orders: List[Dict[str, Any]]) -> Dict[str, Any]:
+    port = _free_port()
+    # Fresh shared files per level: stored verdicts from the last run would answer every order
+    shared_dir = tempfile.mkdtemp(prefix="riskguard-bench-", dir="/dev/shm" if os.path.isdir("/dev/shm") else None)
+    proc = await start_server(workers, port, shared_dir, args.bench_args)
+    drain = None
+    try:
+        startup = await wait_ready(proc, workers, timeout=max(30.0, args.budget * 5))
+        drain = asyncio.ensure_future(_drain(proc))
+        result = {"workers": workers, "startup_s": round(startup, 3), "within_budget": startup <= args.budget}
+        if orders:
+            result.update(await asyncio.get_running_loop().run_in_executor(
+                None, run_load, port, orders, args.concurrency, args.clients,
+            ))
+        return result
+    finally:
+        if proc.returncode is None:
+            proc.terminate()
+            await proc.wait()
+        if drain is not None:
+            drain.cancel()
+        shutil.rmtree(shared_dir, ignore_errors=True)
+
+
+async def run(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    orders = generate_orders(args.orders, seed=args.seed) if args.orders else []
+    results = []
+    for workers in args.workers:
+        result = await run_level(args, workers, orders)
+        if results and "throughput_rps" in result and results[0].get("throughput_rps"):
+            speedup = result["throughput_rps"] / results[0]["throughput_rps"] * results[0]["workers"]
+            result["scaling_efficiency"] = round(speedup / workers, 2)
+        results.append(result)
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Cold-start time and multi-worker throughput of serve.py against the offline upstream stand-ins.",
+    )
+    parser.add_argument("--workers", default=f"1,{os.cpu_count() or 1}", help="comma-separated worker counts")
+    parser.add_argument("--budget", type=float, default=3.0, help="cold-start budget in seconds (spawn until every worker is ready)")
+    parser.add_argument("--orders", type=int, default=400, help="orders sent per worker count (0 = startup only)")
+    parser.add_argument("--concurrency", type=int, default=64, help="requests in flight across all clients")
+    parser.add_argument("--clients", type=int, default=2, help="load-generator processes")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--bench-args", default=DEFAULT_BENCH_ARGS, help="upstream options passed to every worker (see bench.run)")
+    parser.add_argument("--json", action="store_true", help="print one JSON object per worker count")
+    args = parser.parse_args(argv)
+    args.workers = sorted({int(w) for w in args.workers.split(",") if w.strip()})
+
+    results = asyncio.run(run(args))
+    for r in results:
+        print(json.dumps(r) if args.json else "  ".join(f"{k}={v}" for k, v in r.items()))
+    # Non-zero exit when any configuration missed its cold-start budget
+    return 0 if all(r["within_budget"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
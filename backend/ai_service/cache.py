@@ -0,0 +1,196 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger("ai_service.cache")
+
+_MISSING = object()
+
+
+def sqlite_busy_timeout() -> float:
+    """How long a SQLite call waits for another worker's write lock (SQLITE_BUSY_TIMEOUT,
+    seconds). Lookups run inline on the event loop, so this stays short: past it a
+    read is a miss, a write is dropped."""
+    return float(os.getenv("SQLITE_BUSY_TIMEOUT", "0.05"))
+
+
+class TTLCache:
+    """Size-bounded in-process LRU cache where every entry carries its own expiry."""
+
+    def __init__(self, maxsize: int, ttl: float, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key, _MISSING)
+        if entry is _MISSING:
+            return default
+        value, expires_at = entry
+        if expires_at <= self._clock():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def remaining_ttl(self, key: Hashable) -> float:
+        entry = self._data.get(key)
+        return max(0.0, entry[1] - self._clock()) if entry else 0.0
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        self._data[key] = (value, self._clock() + (self.ttl if ttl is None else ttl))
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+class SqliteStore:
+    """File-backed key/value tier that survives restarts.
+
+    Values are stored as JSON with an absolute (wall-clock) expiry. Lookups are
+    single indexed reads against a local file, cheap enough to run inline. The
+    file may be shared by several worker processes: a call that cannot get the
+    database within `busy_timeout` seconds (or fails otherwise) counts as a miss
+    or a skipped write, never as an error for the order being scored."""
+
+    def __init__(self, path: str, namespace: str, busy_timeout: Optional[float] = None):
+        self.namespace = namespace
+        self.errors = 0
+        self._lock = threading.Lock()
+        # Setup waits as long as sqlite's default: every worker opens the file at once
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires_at REAL NOT NULL,"
+            " PRIMARY KEY (namespace, key))"
+        )
+        busy_timeout = sqlite_busy_timeout() if busy_timeout is None else busy_timeout
+        self._conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout * 1000)}")
+
+    def get(self, key: str) -> Tuple[Any, float]:
+        """Return `(value, remaining_ttl)`, or `(_MISSING, 0)` when absent, expired
+        or the database is unavailable."""
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?",
+                    (self.namespace, key),
+                ).fetchone()
+        except sqlite3.OperationalError as e:
+            self._failed("read", e)
+            return _MISSING, 0.0
+        if row is None:
+            return _MISSING, 0.0
+        remaining = row[1] - time.time()
+        if remaining <= 0:
+            return _MISSING, 0.0
+        return json.loads(row[0]), remaining
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                    (self.namespace, key, json.dumps(value), time.time() + ttl),
+                )
+        except sqlite3.OperationalError as e:
+            self._failed("write", e)
+
+    def purge_expired(self) -> int:
+        """Delete this namespace's expired rows; returns how many were removed."""
+        try:
+            with self._lock:
+                cur = self._conn.execute(
+                    "DELETE FROM cache WHERE namespace = ? AND expires_at <= ?", (self.namespace, time.time())
+                )
+        except sqlite3.OperationalError as e:
+            self._failed("purge", e)
+            return 0
+        return cur.rowcount
+
+    def _failed(self, op: str, error: sqlite3.OperationalError) -> None:
+        self.errors += 1
+        logger.debug("%s cache %s skipped: %s", self.namespace, op, error)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class TieredCache:
+    """Two-tier cache: in-process LRU in front of an optional persistent store.
+
+    Negative results (lookups that found nothing) are kept for `negative_ttl`,
+    usually much shorter than `ttl`, so a newly added city is picked up quickly."""
+
+    def __init__(
+        self,
+        name: str,
+        maxsize: int,
+        ttl: float,
+        negative_ttl: float,
+        store: Optional[SqliteStore] = None,
+    ):
+        self.name = name
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.memory = TTLCache(maxsize, ttl)
+        self.store = store
+        self.stats: Dict[str, int] = {"memory_hits": 0, "store_hits": 0, "misses": 0, "sets": 0, "negative_sets": 0}
+
+    def get(self, key: str) -> Any:
+        value = self.memory.get(key, _MISSING)
+        if value is not _MISSING:
+            self.stats["memory_hits"] += 1
+            return value
+        if self.store is not None:
+            value, remaining = self.store.get(key)
+            if value is not _MISSING:
+                self.stats["store_hits"] += 1
+                self.memory.set(key, value, ttl=remaining)
+                return value
+        self.stats["misses"] += 1
+        return None
+
+    def set(self, key: str, value: Any, negative: bool = False) -> None:
+        ttl = self.negative_ttl if negative else self.ttl
+        self.stats["negative_sets" if negative else "sets"] += 1
+        self.memory.set(key, value, ttl=ttl)
+        if self.store is not None:
+            self.store.set(key, value, ttl)
+
+    def purge_expired(self) -> int:
+        """Drop expired rows from the persistent tier (the LRU expires entries on read)."""
+        return self.store.purge_expired() if self.store is not None else 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        hits = self.stats["memory_hits"] + self.stats["store_hits"]
+        lookups = hits + self.stats["misses"]
+        return {
+            **self.stats,
+            "size": len(self.memory),
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "persistent": self.store is not None,
+            "store_errors": self.store.errors if self.store is not None else 0,
+        }
+
+    def close(self) -> None:
+        if self.store is not None:
+            self.store.close()
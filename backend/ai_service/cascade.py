@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import os
+import re
+from typing import Any, Awaitable, Callable, Optional, Tuple, TypeVar
+
+from metrics import METRICS
+
+logger = logging.getLogger("ai_service.cascade")
+
+SMALL_MODEL = "llama-3.1-8b-instant"
+LARGE_MODEL = "llama-3.3-70b-versatile"
+
+MODES = ("off", "cascade", "shadow")
+
+METRICS.describe("ai_cascade_decisions_total", "counter", "Cascaded LLM tasks by the tier that answered and why.")
+METRICS.describe("ai_cascade_shadow_total", "counter", "Shadow comparisons of the small and large tier, by agreement and small-tier confidence band.")
+
+T = TypeVar("T")
+
+_LONG_NUMBER = re.compile(r"\d{8,}")
+_CONSONANT_RUN = re.compile(r"[bcdfghjklmnpqrstvwxz]{6,}", re.IGNORECASE)
+_REPEATED_CHAR = re.compile(r"(\w)\1{4,}")
+
+
+def confidence_band(confidence: float) -> str:
+    """Lower edge of the 0.05-wide band `confidence` falls in, e.g. 0.87 -> "0.85"."""
+    return f"{min(int(confidence * 20), 19) / 20:.2f}"
+
+
+def address_red_flags(address: str) -> bool:
+    """Cheap signs of a junk address (unnaturally long numbers, keyboard mashes,
+    no letters at all); a small-tier VALID on such an address is escalated."""
+    if not re.search(r"[^\W\d_]", address):
+        return True
+    return bool(_LONG_NUMBER.search(address) or _CONSONANT_RUN.search(address) or _REPEATED_CHAR.search(address))
+
+
+class ModelCascade:
+    """Answer an LLM task with the small model first and escalate when unsure.
+
+    Modes (CASCADE_MODE):
+    - off: always the large model (previous behaviour)
+    - cascade: the small model's answer is used when its confidence is at least
+      `threshold` and it does not contradict the deterministic signals; anything
+      else (low confidence, contradiction, error) goes to the large model
+    - shadow: the large model's answer is used, and the small model runs next to
+      it; agreement is counted per 0.05 confidence band so the threshold can
+      be tuned from /metrics before the cascade is switched on"""
+
+    def __init__(self, mode: str = "off", threshold: float = 0.85):
+        if mode not in MODES:
+            raise ValueError(f"CASCADE_MODE must be one of {', '.join(MODES)}, got {mode!r}")
+        self.mode = mode
+        self.threshold = threshold
+
+    async def run(
+        self,
+        task: str,
+        small: Callable[[], Awaitable[Tuple[T, float]]],
+        large: Callable[[], Awaitable[T]],
+        agree: Callable[[T, T], bool],
+        contradicts: Optional[Callable[[T], bool]] = None,
+    ) -> T:
+        """`small` returns (answer, confidence in 0-1); `contradicts` says whether a
+        small-tier answer disagrees with what the deterministic checks found."""
+        if self.mode == "off":
+            return await large()
+        if self.mode == "shadow":
+            return await self._shadow(task, small, large, agree, contradicts)
+
+        try:
+            answer, confidence = await small()
+        except Exception as e:
+            logger.debug("Cascade %s: small tier failed (%s), escalating", task, e)
+            METRICS.inc("ai_cascade_decisions_total", task=task, tier="large", reason="small_error")
+            return await large()
+        if confidence < self.threshold:
+            reason = "low_confidence"
+        elif contradicts is not None and contradicts(answer):
+            reason = "contradiction"
+        else:
+            METRICS.inc("ai_cascade_decisions_total", task=task, tier="small", reason="confident")
+            return answer
+        METRICS.inc("ai_cascade_decisions_total", task=task, tier="large", reason=reason)
+        return await large()
+
+    async def _shadow(self, task, small, large, agree, contradicts):
+        shadow = asyncio.ensure_future(small())
+        try:
+            answer = await large()
+        except BaseException:
+            shadow.cancel()
+            raise
+        METRICS.inc("ai_cascade_decisions_total", task=task, tier="large", reason="shadow")
+        try:
+            small_answer, confidence = await shadow
+        except Exception as e:
+            METRICS.inc("ai_cascade_shadow_total", task=task, outcome="small_error")
+            logger.debug("Cascade %s: shadow small tier failed: %s", task, e)
+            return answer
+
+        would_use = confidence >= self.threshold and not (contradicts is not None and contradicts(small_answer))
+        agreed = agree(small_answer, answer)
+        METRICS.inc(
+            "ai_cascade_shadow_total",
+            task=task,
+            outcome="agree" if agreed else "disagree",
+            confidence=confidence_band(confidence),
+            would_use_small=str(would_use).lower(),
+        )
+        if would_use and not agreed:
+            logger.info("Cascade %s: small tier disagreed with confidence %.2f (threshold %.2f)", task, confidence, self.threshold)
+        return answer
+
+
+def create_cascade_from_env() -> ModelCascade:
+    return ModelCascade(
+        mode=os.getenv("CASCADE_MODE", "off").strip().lower(),
+        threshold=float(os.getenv("CASCADE_THRESHOLD", "0.85")),
+    )
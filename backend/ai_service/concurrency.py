@@ -0,0 +1,58 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from metrics import record_span
+
+logger = logging.getLogger("ai_service.stages")
+
+
+async def run_stage(name: str, coro: Awaitable[Any], timeout: float, fallback: Callable[[Exception], Any]) -> Any:
+    """Await a single enrichment stage under its own timeout.
+
+    Any failure (including the timeout) is converted into the stage's fallback
+    result so that one slow or broken upstream never fails the whole order."""
+    started = time.perf_counter()
+    try:
+        result = await asyncio.wait_for(coro, timeout=timeout)
+        record_span(name, time.perf_counter() - started, "ok")
+        return result
+    except asyncio.TimeoutError as e:
+        record_span(name, time.perf_counter() - started, "timeout")
+        logger.warning("Stage '%s' timed out after %.1fs", name, timeout)
+        return fallback(e)
+    except Exception as e:
+        record_span(name, time.perf_counter() - started, "error")
+        logger.warning("Stage '%s' failed: %s", name, e)
+        return fallback(e)
+
+
+async def run_stages(stages: Dict[str, Tuple[Awaitable[Any], float, Callable[[Exception], Any]]]) -> Dict[str, Any]:
+    """Run independent stages concurrently and return their results by name.
+
+    `stages` maps a stage name to `(coroutine, timeout_seconds, fallback)`.
+    Total latency is bounded by the slowest stage instead of their sum."""
+    names = list(stages)
+    results = await asyncio.gather(*(run_stage(name, *stages[name]) for name in names))
+    return dict(zip(names, results))
+
+
+class SingleFlight:
+    """Coalesce identical in-flight calls: concurrent callers with the same key
+    share one underlying task and all receive its result (or exception)."""
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, "asyncio.Task[Any]"] = {}
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _t, k=key: self._inflight.pop(k, None))
+        # Shield so one cancelled waiter doesn't cancel the call for everyone else
+        return await asyncio.shield(task)
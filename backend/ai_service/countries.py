@@ -0,0 +1,90 @@
+import unicodedata
+from typing import Dict, Optional, Tuple
+
+# ISO 3166-1 alpha-2 code -> (display name, extra aliases customers commonly type)
+COUNTRIES: Dict[str, Tuple[str, Tuple[str, ...]]] = {
+    "AE": ("United Arab Emirates", ("UAE", "Emirates")),
+    "AR": ("Argentina", ()),
+    "AT": ("Austria", ()),
+    "AU": ("Australia", ()),
+    "BD": ("Bangladesh", ()),
+    "BE": ("Belgium", ()),
+    "BH": ("Bahrain", ()),
+    "BR": ("Brazil", ("Brasil",)),
+    "CA": ("Canada", ()),
+    "CH": ("Switzerland", ()),
+    "CL": ("Chile", ()),
+    "CN": ("China", ("PRC", "People's Republic of China")),
+    "CO": ("Colombia", ()),
+    "CZ": ("Czechia", ("Czech Republic",)),
+    "DE": ("Germany", ("Deutschland",)),
+    "DK": ("Denmark", ()),
+    "EG": ("Egypt", ()),
+    "ES": ("Spain", ("Espana",)),
+    "FI": ("Finland", ()),
+    "FR": ("France", ()),
+    "GB": ("United Kingdom", ("UK", "Great Britain", "Britain", "England", "Scotland", "Wales")),
+    "GR": ("Greece", ()),
+    "HK": ("Hong Kong", ()),
+    "ID": ("Indonesia", ()),
+    "IE": ("Ireland", ()),
+    "IL": ("Israel", ()),
+    "IN": ("India", ("Bharat",)),
+    "IQ": ("Iraq", ()),
+    "IR": ("Iran", ()),
+    "IT": ("Italy", ("Italia",)),
+    "JP": ("Japan", ()),
+    "KE": ("Kenya", ()),
+    "KR": ("South Korea", ("Korea", "Republic of Korea")),
+    "KW": ("Kuwait", ()),
+    "LK": ("Sri Lanka", ()),
+    "MA": ("Morocco", ()),
+    "MX": ("Mexico", ()),
+    "MY": ("Malaysia", ()),
+    "NG": ("Nigeria", ()),
+    "NL": ("Netherlands", ("Holland", "The Netherlands")),
+    "NO": ("Norway", ()),
+    "NP": ("Nepal", ()),
+    "NZ": ("New Zealand", ()),
+    "OM": ("Oman", ()),
+    "PH": ("Philippines", ()),
+    "PK": ("Pakistan", ()),
+    "PL": ("Poland", ()),
+    "PT": ("Portugal", ()),
+    "QA": ("Qatar", ()),
+    "RU": ("Russia", ("Russian Federation",)),
+    "SA": ("Saudi Arabia", ("KSA",)),
+    "SE": ("Sweden", ()),
+    "SG": ("Singapore", ()),
+    "TH": ("Thailand", ()),
+    "TR": ("Turkey", ("Turkiye",)),
+    "UA": ("Ukraine", ()),
+    "US": ("United States", ("USA", "United States of America", "America")),
+    "VN": ("Vietnam", ("Viet Nam",)),
+    "ZA": ("South Africa", ()),
+}
+
+
+def fold(text: str) -> str:
+    """Case-, accent- and whitespace-insensitive form used for every lookup key."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join(stripped.casefold().replace(".", "").split())
+
+
+_BY_NAME: Dict[str, str] = {}
+for _iso, (_name, _aliases) in COUNTRIES.items():
+    for _label in (_iso, _name, *_aliases):
+        _BY_NAME[fold(_label)] = _iso
+
+
+def resolve_iso2(country: Optional[str]) -> Optional[str]:
+    """Map 'PK', 'pakistan', 'U.S.A.' etc. to an ISO alpha-2 code, or None if unknown."""
+    if not country:
+        return None
+    return _BY_NAME.get(fold(country))
+
+
+def country_name(iso2: str) -> str:
+    entry = COUNTRIES.get(iso2.upper())
+    return entry[0] if entry else iso2
@@ -0,0 +1,301 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from cache import sqlite_busy_timeout
+from phone_numbers import check_phone
+from similarity import MinHashIndex, canonical_email, normalize_address, similar_names
+
+logger = logging.getLogger("ai_service.features")
+
+DAY = 24 * 3600
+WINDOW = 7 * DAY
+# How often windows of emails without an order in the last WINDOW are dropped
+EVICT_INTERVAL = 3600
+
+
+def email_key(email: Optional[str]) -> str:
+    return canonical_email(email)
+
+
+def phone_key(phone: Optional[str], country: Optional[str] = None) -> str:
+    """E.164 when the number can be classified locally, otherwise its bare digits,
+    so '0300 1234567' and '+92 300 1234567' link to the same identity."""
+    if not phone:
+        return ""
+    check = check_phone(phone, country)
+    if check is not None and check.e164:
+        return check.e164
+    return "".join(ch for ch in str(phone) if ch.isdigit())
+
+
+def address_key(street: Optional[str], city: Optional[str], postal_code: Optional[str]) -> str:
+    return "|".join(normalize_address(part) for part in (street, city, postal_code))
+
+
+def _identity(name: Any, email: Any) -> Tuple[str, str]:
+    return str(name or "").strip().lower(), canonical_email(str(email or ""))
+
+
+def _labelled_identity(label: str) -> Tuple[str, str]:
+    """Key of a "Name (email)" entry of other_names_at_this_address."""
+    name, paren, email = str(label).rpartition(" (")
+    if not paren or not email.endswith(")"):
+        return _identity(label, "")
+    return _identity(name, email[:-1])
+
+
+def merge_identity_context(context: Dict[str, Any], extra: Dict[str, Any]) -> Dict[str, Any]:
+    """Add the store's (near-duplicate) identity matches to a context built
+    elsewhere, e.g. the exact-match one from the NestJS API, without repeats.
+    Entries are compared on lower-cased name and canonical email, as the API
+    keeps emails as entered."""
+    merged = dict(context)
+    names = list((context.get("address_history", {}) or {}).get("other_names_at_this_address", []) or [])
+    seen = {_labelled_identity(n) for n in names}
+    for label in extra["address_history"]["other_names_at_this_address"]:
+        key = _labelled_identity(label)
+        if key not in seen:
+            seen.add(key)
+            names.append(label)
+    merged["address_history"] = {**(context.get("address_history", {}) or {}), "other_names_at_this_address": names}
+    for field in ("duplicate_email_matches", "duplicate_phone_matches"):
+        matches = list(context.get(field, []) or [])
+        seen = {_identity(m.get("name"), m.get("email")) for m in matches}
+        for match in extra[field]:
+            key = _identity(match.get("name"), match.get("email"))
+            if key not in seen:
+                seen.add(key)
+                matches.append(match)
+        merged[field] = matches
+    return merged
+
+
+def _timestamp(value: Any) -> float:
+    if isinstance(value, (int, float)):
+        return float(value)
+    parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+class FeatureStore:
+    """Velocity and identity-linkage features, updated as each order is committed.
+
+    - per-email sliding windows of order timestamps (last 7 days, kept sorted as
+      commits can arrive out of order) plus the total count and latest order
+      time, so Rule 3 needs no history scan; windows idle for 7 days are dropped
+    - an identity graph: who ordered to each address, which user ids / names use
+      each email, and which emails / names use each phone (Rules 4, 6 and 7)
+
+    Emails are canonicalised (case, '+tags', Gmail dots) and addresses
+    normalised (abbreviations, punctuation) before keying; addresses are also
+    indexed with MinHash/LSH so near-identical spellings of the same delivery
+    address share their identities. Lookups are dictionary reads, one index
+    probe and pruning of expired window entries. With a `path`, every commit is
+    also written to SQLite and replayed on startup; worker processes sharing the
+    file pick up each other's commits (rows past the last one applied) before
+    every lookup. When the file is locked past SQLITE_BUSY_TIMEOUT, a lookup
+    uses the features applied so far and a commit is applied to this process
+    only."""
+
+    def __init__(self, path: Optional[str] = None, clock=time.time):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._windows: Dict[str, List[float]] = {}
+        self._last_evict = clock()
+        self._totals: Dict[str, Tuple[int, float]] = {}
+        # address -> {email: full_name}
+        self._address_identities: Dict[str, Dict[str, str]] = {}
+        # email -> {user_id: (full_name, phone)}
+        self._email_identities: Dict[str, Dict[str, Tuple[str, str]]] = {}
+        # phone -> {email: full_name}
+        self._phone_identities: Dict[str, Dict[str, str]] = {}
+        self._address_index = MinHashIndex()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._last_rowid = 0
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS order_events ("
+                "email TEXT NOT NULL, phone TEXT NOT NULL, address TEXT NOT NULL, user_id TEXT NOT NULL,"
+                "full_name TEXT NOT NULL, raw_phone TEXT NOT NULL, committed_at REAL NOT NULL)"
+            )
+            self._replay()
+            # Startup may wait for other workers; lookups and commits on the event loop may not
+            self._conn.execute(f"PRAGMA busy_timeout = {int(sqlite_busy_timeout() * 1000)}")
+
+    def _replay(self) -> None:
+        rows = self._conn.execute(
+            "SELECT rowid, email, phone, address, user_id, full_name, raw_phone, committed_at FROM order_events ORDER BY committed_at"
+        )
+        for rowid, email, phone, address, *rest in rows:
+            # Re-key rows written before the current normalisation
+            address = "|".join(normalize_address(part) for part in address.split("|")) if address else address
+            self._apply(email_key(email), phone, address, *rest)
+            self._last_rowid = max(self._last_rowid, rowid)
+
+    def _sync(self) -> None:
+        """Apply commits written to the shared file since the last sync (by this or
+        another process); the caller holds the lock."""
+        if self._conn is None:
+            return
+        try:
+            rows = self._conn.execute(
+                "SELECT rowid, email, phone, address, user_id, full_name, raw_phone, committed_at FROM order_events WHERE rowid > ? ORDER BY rowid",
+                (self._last_rowid,),
+            ).fetchall()
+        except sqlite3.OperationalError as e:
+            # Picked up by the next sync; _last_rowid has not moved
+            logger.debug("Feature store sync skipped: %s", e)
+            return
+        for rowid, *row in rows:
+            self._apply(*row)
+            self._last_rowid = rowid
+
+    def _apply(self, email: str, phone: str, address: str, user_id: str, full_name: str, raw_phone: str, at: float) -> None:
+        # Sorted insert: a worker's commits (or a bulk re-score) can land out of order
+        window = self._windows.setdefault(email, [])
+        insort(window, at)
+        del window[:bisect_left(window, window[-1] - WINDOW)]
+        self._evict_idle()
+        total, last = self._totals.get(email, (0, 0.0))
+        self._totals[email] = (total + 1, max(last, at))
+        if address:
+            if address not in self._address_identities:
+                self._address_index.add(address, address.replace("|", " "))
+            self._address_identities.setdefault(address, {})[email] = full_name
+        self._email_identities.setdefault(email, {})[user_id] = (full_name, raw_phone)
+        if phone:
+            self._phone_identities.setdefault(phone, {})[email] = full_name
+
+    def _evict_idle(self) -> None:
+        """Drop the windows of emails with no order in the last WINDOW (their counts
+        are zero anyway); totals stay for Rule 3's first-order check."""
+        now = self._clock()
+        if now - self._last_evict < EVICT_INTERVAL:
+            return
+        self._last_evict = now
+        for email in [e for e, window in self._windows.items() if not window or window[-1] < now - WINDOW]:
+            del self._windows[email]
+
+    def record_order(self, payload: Dict[str, Any], committed_at: Any = None) -> None:
+        """Fold one committed order (OrderPayload shape) into the features."""
+        profile = payload.get("user_profile", {}) or {}
+        address = payload.get("address", {}) or {}
+        at = _timestamp(committed_at) if committed_at is not None else self._clock()
+        row = (
+            email_key(profile.get("email")),
+            phone_key(profile.get("phone"), profile.get("country")),
+            address_key(address.get("street"), address.get("city"), address.get("postal_code")),
+            str(profile.get("user_id") or ""),
+            (profile.get("full_name") or "").strip(),
+            str(profile.get("phone") or ""),
+            at,
+        )
+        with self._lock:
+            if self._conn is None:
+                self._apply(*row)
+            else:
+                try:
+                    self._conn.execute("INSERT INTO order_events VALUES (?, ?, ?, ?, ?, ?, ?)", row)
+                except sqlite3.OperationalError as e:
+                    logger.warning("Feature store commit not persisted, applied to this worker only: %s", e)
+                    self._apply(*row)
+                    return
+                self._sync()
+
+    def historical_context(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Features for an order about to be scored, in the `historical_context`
+        shape the NestJS API sends (the order itself is not yet recorded)."""
+        profile = payload.get("user_profile", {}) or {}
+        email = email_key(profile.get("email"))
+        now = self._clock()
+
+        with self._lock:
+            self._sync()
+            self._evict_idle()
+            window = self._windows.get(email) or []
+            del window[:bisect_left(window, now - WINDOW)]
+            orders_7d = len(window)
+            orders_24h = orders_7d - bisect_left(window, now - DAY)
+            total, last = self._totals.get(email, (0, 0.0))
+
+        return {
+            "same_person_orders": {
+                "email": profile.get("email"),
+                "full_name": (profile.get("full_name") or "").strip(),
+                "orders_last_24h": orders_24h,
+                "orders_last_7d": orders_7d,
+                "total_past_orders": total,
+                "last_order_timestamp": datetime.fromtimestamp(last, timezone.utc).isoformat() if total else None,
+                "minutes_since_last_order": round((now - last) / 60) if total else None,
+            },
+            **self.identity_matches(payload),
+        }
+
+    def identity_matches(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Rules 4, 6 and 7 inputs: other identities at this (or a near-identical)
+        address, behind this canonical email and behind this phone number.
+        Names that differ only in order, accents or a typo are the same person."""
+        profile = payload.get("user_profile", {}) or {}
+        address = payload.get("address", {}) or {}
+        email = email_key(profile.get("email"))
+        user_id = str(profile.get("user_id") or "")
+        full_name = (profile.get("full_name") or "").strip()
+        phone = phone_key(profile.get("phone"), profile.get("country"))
+        addr = address_key(address.get("street"), address.get("city"), address.get("postal_code"))
+
+        with self._lock:
+            self._sync()
+            at_address: Dict[str, str] = {}
+            if addr.strip("|"):
+                for key, _ in self._address_index.query(addr.replace("|", " ")):
+                    at_address.update(self._address_identities.get(key, {}))
+                at_address.update(self._address_identities.get(addr, {}))
+            by_email = dict(self._email_identities.get(email, {}))
+            by_phone = dict(self._phone_identities.get(phone, {})) if phone else {}
+
+        different_name = lambda name: not similar_names(name, full_name)
+        return {
+            "address_history": {
+                "other_names_at_this_address": [
+                    f"{name} ({other})" for other, name in at_address.items() if other and other != email and different_name(name)
+                ],
+            },
+            "duplicate_email_matches": [
+                {"name": name, "email": profile.get("email"), "phone": raw_phone}
+                for uid, (name, raw_phone) in by_email.items() if uid != user_id and different_name(name)
+            ],
+            "duplicate_phone_matches": [
+                {"name": name, "email": other, "phone": profile.get("phone")}
+                for other, name in by_phone.items() if other != email and different_name(name)
+            ],
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "emails": len(self._totals),
+            "windows": len(self._windows),
+            "addresses": len(self._address_identities),
+            "phones": len(self._phone_identities),
+            "indexed_addresses": len(self._address_index),
+            "persistent": self._conn is not None,
+        }
+
+    def close(self) -> None:
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+
+
+def create_feature_store_from_env() -> FeatureStore:
+    """In-memory feature store; set FEATURE_STORE_PATH to persist and replay commits."""
+    return FeatureStore(os.getenv("FEATURE_STORE_PATH") or None)
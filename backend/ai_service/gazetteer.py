@@ -0,0 +1,203 @@
+"""Offline city / postal-code gazetteer.
+
+The index is a single binary file built ahead of time from GeoNames-style dumps
+and memory-mapped at startup, so lookups never touch the network:
+
+    python gazetteer.py build --postal allCountries.txt --cities cities500.txt --out data/gazetteer.idx
+    python gazetteer.py query --index data/gazetteer.idx --country PK --city Lahore --postal 54000
+
+File layout (little-endian):
+    header   : magic b"GZIX", version, n_cities, n_postal, strings_len, padding (u32 each)
+    cities   : u64[n_cities]   sorted hashes of "CC|city"
+    postal   : u64[n_postal]   sorted hashes of "CC|POSTCODE"
+    offsets  : u32[n_postal]   byte offset of each postcode's record in `strings`
+    strings  : "city\\tstate\\tCC\\n" records
+"""
+import argparse
+import bisect
+import csv
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from typing import Dict, Iterable, Optional, Tuple
+
+from countries import fold
+
+MAGIC = b"GZIX"
+VERSION = 1
+_HEADER = struct.Struct("<4sIIIII")
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def city_key(city: str, iso2: str) -> int:
+    return _hash(f"{iso2.upper()}|{fold(city)}")
+
+
+def normalize_postal(postal_code: str) -> str:
+    return "".join(postal_code.upper().split()).replace("-", "")
+
+
+def postal_key(postal_code: str, iso2: str) -> int:
+    return _hash(f"{iso2.upper()}|{normalize_postal(postal_code)}")
+
+
+class Gazetteer:
+    """Read-only view over a memory-mapped gazetteer index."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, n_cities, n_postal, strings_len, _ = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a gazetteer index (version {VERSION})")
+        view = memoryview(self._mmap)
+        pos = _HEADER.size
+        self._cities = view[pos:pos + 8 * n_cities].cast("Q")
+        pos += 8 * n_cities
+        self._postal = view[pos:pos + 8 * n_postal].cast("Q")
+        pos += 8 * n_postal
+        self._offsets = view[pos:pos + 4 * n_postal].cast("I")
+        pos += 4 * n_postal
+        self._strings = view[pos:pos + strings_len]
+        self.n_cities = n_cities
+        self.n_postal = n_postal
+
+    @staticmethod
+    def _find(arr, h: int) -> int:
+        i = bisect.bisect_left(arr, h)
+        return i if i < len(arr) and arr[i] == h else -1
+
+    def has_city(self, city: str, iso2: str) -> bool:
+        return self._find(self._cities, city_key(city, iso2)) >= 0
+
+    def lookup_postal(self, postal_code: str, iso2: str) -> Optional[Tuple[str, str, str]]:
+        """Return `(city, state, country_code)` for a postcode, or None if not indexed.
+
+        Falls back to the outward part of the code (before the space) because the
+        GeoNames dumps only carry e.g. the UK outward code / Canadian FSA."""
+        candidates = [postal_code]
+        if " " in postal_code.strip():
+            candidates.append(postal_code.split()[0])
+        for candidate in candidates:
+            i = self._find(self._postal, postal_key(candidate, iso2))
+            if i >= 0:
+                start = self._offsets[i]
+                end = bytes(self._strings[start:start + 512]).index(b"\n")
+                city, state, cc = bytes(self._strings[start:start + end]).decode("utf-8").split("\t")
+                return city, state, cc
+        return None
+
+    def close(self) -> None:
+        self._cities.release()
+        self._postal.release()
+        self._offsets.release()
+        self._strings.release()
+        self._mmap.close()
+        self._file.close()
+
+
+def load_gazetteer_from_env() -> Optional[Gazetteer]:
+    """Open the index named by GAZETTEER_PATH, if configured and present."""
+    path = os.getenv("GAZETTEER_PATH", os.path.join(os.path.dirname(__file__), "data", "gazetteer.idx"))
+    if not os.path.exists(path):
+        return None
+    return Gazetteer(path)
+
+
+def _read_tsv(path: str) -> Iterable[list]:
+    csv.field_size_limit(sys.maxsize)
+    with open(path, encoding="utf-8", newline="") as f:
+        yield from csv.reader(f, delimiter="\t", quoting=csv.QUOTE_NONE)
+
+
+def build_index(out_path: str, postal_path: Optional[str], cities_path: Optional[str], alternate_names: bool = False) -> Tuple[int, int]:
+    """Build an index from a GeoNames postal dump (allCountries.txt layout:
+    CC, postcode, place, admin1 name, ...) and/or a cities dump (cities500.txt
+    layout: id, name, asciiname, alternatenames, ..., CC at column 8)."""
+    city_hashes = set()
+    postal_records: Dict[int, bytes] = {}
+
+    if postal_path:
+        for row in _read_tsv(postal_path):
+            if len(row) < 4 or not row[0] or not row[1]:
+                continue
+            cc, code, place, admin1 = row[0], row[1], row[2], row[3]
+            city_hashes.add(city_key(place, cc))
+            # GeoNames lists several places per postcode; keep the first, like results[0] upstream
+            postal_records.setdefault(postal_key(code, cc), f"{place}\t{admin1}\t{cc}\n".encode("utf-8"))
+
+    if cities_path:
+        for row in _read_tsv(cities_path):
+            if len(row) < 9 or not row[8]:
+                continue
+            cc = row[8]
+            names = {row[1], row[2]}
+            if alternate_names and row[3]:
+                names.update(row[3].split(","))
+            for name in names:
+                if name:
+                    city_hashes.add(city_key(name, cc))
+
+    cities = sorted(city_hashes)
+    postal = sorted(postal_records)
+    strings = bytearray()
+    offsets = []
+    for h in postal:
+        offsets.append(len(strings))
+        strings += postal_records[h]
+
+    tmp_path = out_path + ".tmp"
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, len(cities), len(postal), len(strings), 0))
+        f.write(struct.pack(f"<{len(cities)}Q", *cities))
+        f.write(struct.pack(f"<{len(postal)}Q", *postal))
+        f.write(struct.pack(f"<{len(offsets)}I", *offsets))
+        f.write(strings)
+    os.replace(tmp_path, out_path)
+    return len(cities), len(postal)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Build or query the offline geo gazetteer index.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="build an index file from GeoNames dumps")
+    build.add_argument("--postal", help="GeoNames postal codes dump (allCountries.txt or <CC>.txt)")
+    build.add_argument("--cities", help="GeoNames cities dump (e.g. cities500.txt)")
+    build.add_argument("--alternate-names", action="store_true", help="also index alternate city names")
+    build.add_argument("--out", required=True, help="output index path")
+
+    query = sub.add_parser("query", help="look up a city and/or postcode")
+    query.add_argument("--index", required=True)
+    query.add_argument("--country", required=True, help="ISO alpha-2 country code")
+    query.add_argument("--city")
+    query.add_argument("--postal")
+
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        if not args.postal and not args.cities:
+            parser.error("build needs --postal and/or --cities")
+        n_cities, n_postal = build_index(args.out, args.postal, args.cities, args.alternate_names)
+        print(f"Wrote {args.out}: {n_cities} city keys, {n_postal} postal codes")
+        return 0
+
+    gaz = Gazetteer(args.index)
+    try:
+        if args.city:
+            print(f"city {args.city!r} in {args.country}: {gaz.has_city(args.city, args.country)}")
+        if args.postal:
+            print(f"postal {args.postal!r} in {args.country}: {gaz.lookup_postal(args.postal, args.country)}")
+    finally:
+        gaz.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,186 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from cache import SqliteStore, TieredCache
+from concurrency import SingleFlight
+from metrics import METRICS
+from resilience import Upstream, breaker_from_env
+
+logger = logging.getLogger("ai_service.geo")
+
+ZIPCODESTACK_SEARCH_URL = "https://api.zipcodestack.com/v1/search"
+NOMINATIM_SEARCH_URL = "https://nominatim.openstreetmap.org/search"
+GEO_USER_AGENT = "RiskGuard-Fraud-Detection-System/1.0"
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _server_error(result: Tuple[int, Any]) -> bool:
+    """5xx and 429 answers count against the host's circuit; 4xx do not."""
+    status = result[0]
+    return status >= 500 or status == 429
+
+
+class GeoClient:
+    """Long-lived HTTP client for the ZipcodeStack / Nominatim lookups.
+
+    One keep-alive pool is shared by every order (HTTP/2 when `h2` is installed),
+    each upstream host gets its own concurrency cap, and identical lookups that
+    are already in flight are coalesced into a single upstream request.
+
+    Every host also sits behind an Upstream policy: a lookup must answer within
+    `deadline` seconds, a host that keeps failing is skipped (CircuitOpenError)
+    until its breaker resets, and with `hedge` a duplicate request is sent once
+    the first has taken longer than the host's recent p95.
+
+    Without a ZipcodeStack key, ZipcodeStack lookups are not available
+    (`zipcodestack_enabled` is False); Nominatim still is."""
+
+    def __init__(
+        self,
+        zipcodestack_api_key: Optional[str],
+        max_connections: int = 50,
+        per_host_limit: int = 10,
+        timeout: float = 5.0,
+        connect_timeout: float = 2.0,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        deadline: float = 3.0,
+        hedge: bool = True,
+        hedge_max_delay: float = 1.0,
+        breaker_factory=breaker_from_env,
+    ):
+        self._zipcodestack_api_key = zipcodestack_api_key
+        self._http = httpx.AsyncClient(
+            headers={"User-Agent": GEO_USER_AGENT},
+            http2=_http2_available() and transport is None,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            transport=transport,
+        )
+        self._per_host_limit = per_host_limit
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._inflight = SingleFlight()
+        self._deadline = deadline
+        self._hedge = hedge
+        self._hedge_max_delay = hedge_max_delay
+        self._breaker_factory = breaker_factory
+        self.upstreams: Dict[str, Upstream] = {}
+
+    @property
+    def zipcodestack_enabled(self) -> bool:
+        return bool(self._zipcodestack_api_key)
+
+    def _zipcodestack_params(self, **params: str) -> Dict[str, str]:
+        if not self.zipcodestack_enabled:
+            raise RuntimeError("ZipcodeStack lookups need ZIPCODESTACK_API_KEY")
+        return {"apikey": self._zipcodestack_api_key, **params}
+
+    def _host_semaphore(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        sem = self._host_semaphores.get(host)
+        if sem is None:
+            sem = asyncio.Semaphore(self._per_host_limit)
+            self._host_semaphores[host] = sem
+        return sem
+
+    def _upstream(self, url: str) -> Upstream:
+        host = urlsplit(url).netloc
+        upstream = self.upstreams.get(host)
+        if upstream is None:
+            upstream = Upstream(
+                host,
+                timeout=self._deadline,
+                breaker=self._breaker_factory(host),
+                hedge=self._hedge,
+                hedge_max_delay=self._hedge_max_delay,
+            )
+            self.upstreams[host] = upstream
+        return upstream
+
+    async def _fetch(self, url: str, params: Dict[str, str]) -> Tuple[int, Any]:
+        host = urlsplit(url).netloc
+        async with self._host_semaphore(url):
+            started = time.perf_counter()
+            try:
+                resp = await self._http.get(url, params=params)
+            except httpx.TimeoutException:
+                METRICS.inc("ai_upstream_requests_total", host=host, outcome="timeout")
+                raise
+            except httpx.HTTPError:
+                METRICS.inc("ai_upstream_requests_total", host=host, outcome="error")
+                raise
+            finally:
+                METRICS.observe("ai_upstream_duration_seconds", time.perf_counter() - started, host=host)
+        METRICS.inc("ai_upstream_requests_total", host=host, outcome=str(resp.status_code))
+        try:
+            data = resp.json()
+        except ValueError:
+            data = None
+        return resp.status_code, data
+
+    async def get_json(self, url: str, params: Dict[str, str]) -> Tuple[int, Any]:
+        """GET `url` and return `(status_code, parsed_json_or_None)`, sharing the
+        upstream call with any identical request already in flight.
+
+        Raises CircuitOpenError while the host's breaker is open and
+        DeadlineExceeded when it does not answer in time."""
+        key = (url, tuple(sorted(params.items())))
+        upstream = self._upstream(url)
+        return await self._inflight.do(key, lambda: upstream.call(lambda: self._fetch(url, params), is_failure=_server_error))
+
+    async def zipcodestack_city(self, city: str, country: str) -> Tuple[int, Any]:
+        return await self.get_json(ZIPCODESTACK_SEARCH_URL, self._zipcodestack_params(city=city, country=country))
+
+    async def zipcodestack_postal(self, postal_code: str, country: str) -> Tuple[int, Any]:
+        return await self.get_json(ZIPCODESTACK_SEARCH_URL, self._zipcodestack_params(codes=postal_code, country=country))
+
+    async def nominatim_city(self, city: str, country: str) -> Tuple[int, Any]:
+        return await self.get_json(
+            NOMINATIM_SEARCH_URL,
+            {"city": city, "country": country, "format": "json", "limit": "1"},
+        )
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+
+
+def create_geo_client_from_env() -> GeoClient:
+    """Geo client configured from GEO_* settings; ZipcodeStack needs ZIPCODESTACK_API_KEY."""
+    zipcodestack_api_key = os.getenv("ZIPCODESTACK_API_KEY") or None
+    if zipcodestack_api_key is None:
+        logger.warning("ZIPCODESTACK_API_KEY is not set: ZipcodeStack lookups are skipped (cities fall back to Nominatim, postal codes to the LLM)")
+    return GeoClient(
+        zipcodestack_api_key=zipcodestack_api_key,
+        max_connections=int(os.getenv("GEO_MAX_CONNECTIONS", "50")),
+        per_host_limit=int(os.getenv("GEO_PER_HOST_LIMIT", "10")),
+        timeout=float(os.getenv("GEO_TIMEOUT", "5")),
+        connect_timeout=float(os.getenv("GEO_CONNECT_TIMEOUT", "2")),
+        deadline=float(os.getenv("GEO_DEADLINE", "3")),
+        hedge=os.getenv("GEO_HEDGE", "1") == "1",
+        hedge_max_delay=float(os.getenv("GEO_HEDGE_MAX_DELAY", "1")),
+    )
+
+
+def create_geo_cache_from_env() -> TieredCache:
+    """Cache for city / postal verification results. Set GEO_CACHE_PATH to add the
+    persistent SQLite tier so warm entries survive restarts."""
+    path = os.getenv("GEO_CACHE_PATH")
+    return TieredCache(
+        "geo",
+        maxsize=int(os.getenv("GEO_CACHE_SIZE", "20000")),
+        ttl=float(os.getenv("GEO_CACHE_TTL", str(7 * 24 * 3600))),
+        negative_ttl=float(os.getenv("GEO_CACHE_NEGATIVE_TTL", "3600")),
+        store=SqliteStore(path, namespace="geo") if path else None,
+    )
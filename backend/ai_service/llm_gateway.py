@@ -0,0 +1,320 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from metrics import METRICS
+from resilience import CircuitBreaker, Deadline, DeadlineExceeded, breaker_from_env
+
+logger = logging.getLogger("ai_service.llm")
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Receives each streamed content delta as it arrives
+DeltaCallback = Callable[[str], Awaitable[None]]
+
+
+@dataclass
+class Completion:
+    """The parts of a chat completion the service actually uses."""
+    content: str
+    model: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+class LLMError(Exception):
+    """Raised by backends for upstream failures; `status_code` drives retry decisions."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class GroqBackend:
+    """Async Groq client sharing one pooled HTTP connection pool across all models."""
+
+    def __init__(self, api_key: Optional[str], max_connections: int = 20, timeout: float = 30.0):
+        import httpx
+        from groq import AsyncGroq
+
+        self._http = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=httpx.Timeout(timeout, connect=5.0),
+        )
+        # Retries are handled by the gateway so they share the per-model concurrency limit
+        self._client = AsyncGroq(api_key=api_key, http_client=self._http, max_retries=0)
+
+    async def complete(self, model: str, messages: List[Dict[str, str]], **params: Any) -> Completion:
+        resp = await self._client.chat.completions.create(model=model, messages=messages, **params)
+        usage = getattr(resp, "usage", None)
+        return Completion(
+            content=resp.choices[0].message.content or "",
+            model=model,
+            prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+            completion_tokens=getattr(usage, "completion_tokens", 0) or 0,
+        )
+
+    async def stream(self, model: str, messages: List[Dict[str, str]], on_delta: DeltaCallback, **params: Any) -> Completion:
+        response = await self._client.chat.completions.create(model=model, messages=messages, stream=True, **params)
+        parts: List[str] = []
+        usage = None
+        async for chunk in response:
+            if chunk.choices:
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    await on_delta(delta)
+            # Groq reports usage on the final chunk
+            usage = getattr(getattr(chunk, "x_groq", None), "usage", None) or usage
+        return Completion(
+            content="".join(parts),
+            model=model,
+            prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+            completion_tokens=getattr(usage, "completion_tokens", 0) or 0,
+        )
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+
+
+class FakeBackend:
+    """Local stand-in for tests and offline runs.
+
+    `responder(model, messages, params)` returns the completion text; by default
+    canned responses are looked up per model and fall back to an empty JSON object."""
+
+    def __init__(
+        self,
+        responder: Optional[Callable[[str, List[Dict[str, str]], Dict[str, Any]], str]] = None,
+        responses: Optional[Dict[str, str]] = None,
+        latency: float = 0.0,
+    ):
+        self._responder = responder
+        self._responses = responses or {}
+        self._latency = latency
+        self.stream_chunk_size = 16
+        self.calls: List[Dict[str, Any]] = []
+
+    async def complete(self, model: str, messages: List[Dict[str, str]], **params: Any) -> Completion:
+        self.calls.append({"model": model, "messages": messages, "params": params})
+        if self._latency:
+            await asyncio.sleep(self._latency)
+        if self._responder is not None:
+            content = self._responder(model, messages, params)
+        else:
+            content = self._responses.get(model, "{}")
+        prompt_chars = sum(len(m.get("content", "")) for m in messages)
+        return Completion(content=content, model=model, prompt_tokens=prompt_chars // 4, completion_tokens=len(content) // 4)
+
+    async def stream(self, model: str, messages: List[Dict[str, str]], on_delta: DeltaCallback, **params: Any) -> Completion:
+        completion = await self.complete(model, messages, **params)
+        for i in range(0, len(completion.content), self.stream_chunk_size):
+            await on_delta(completion.content[i:i + self.stream_chunk_size])
+        return completion
+
+    async def aclose(self) -> None:
+        return None
+
+
+def _status_code(exc: Exception) -> Optional[int]:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_retryable(exc: Exception) -> bool:
+    """Upstream failures (5xx, 429, connection errors) as opposed to bad requests."""
+    status = _status_code(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+    # Connection resets / timeouts from the SDK carry no status code
+    return type(exc).__name__ in ("APIConnectionError", "APITimeoutError", "ConnectError", "ReadTimeout")
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    if getattr(exc, "retry_after", None) is not None:
+        return exc.retry_after
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMGateway:
+    """Single entry point for every LLM call in the service.
+
+    - bounds in-flight requests per model so one model cannot starve the others
+    - retries 429/5xx/connection errors with full-jitter exponential backoff
+    - gives every call a latency budget (`deadline` seconds, retries included)
+      and raises DeadlineExceeded when it runs out
+    - keeps a circuit breaker per model: once a model keeps failing, calls are
+      rejected at once with CircuitOpenError instead of waiting on it
+    - delegates the transport to a pluggable backend (Groq or a local fake)"""
+
+    def __init__(
+        self,
+        backend: Any,
+        model_concurrency: Optional[Dict[str, int]] = None,
+        default_concurrency: int = 8,
+        max_retries: int = 3,
+        base_delay: float = 0.25,
+        max_delay: float = 4.0,
+        deadline: float = 20.0,
+        breaker_factory: Callable[[str], CircuitBreaker] = breaker_from_env,
+    ):
+        self.backend = backend
+        self._model_concurrency = model_concurrency or {}
+        self._default_concurrency = default_concurrency
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self._breaker_factory = breaker_factory
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def _semaphore(self, model: str) -> asyncio.Semaphore:
+        sem = self._semaphores.get(model)
+        if sem is None:
+            sem = asyncio.Semaphore(self._model_concurrency.get(model, self._default_concurrency))
+            self._semaphores[model] = sem
+        return sem
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        breaker = self._breakers.get(model)
+        if breaker is None:
+            breaker = self._breaker_factory(f"llm:{model}")
+            self._breakers[model] = breaker
+        return breaker
+
+    def _backoff(self, attempt: int, exc: Exception) -> float:
+        retry_after = _retry_after(exc)
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    async def _attempt(self, model: str, call: Callable[[], Awaitable[Completion]], budget: Deadline) -> Completion:
+        async with self._semaphore(model):
+            # Time spent queueing for a slot uses up the budget but is not the model's fault
+            if budget.expired:
+                raise DeadlineExceeded(f"LLM call to {model} spent its {budget.seconds:.1f}s budget waiting for a slot")
+            started = time.perf_counter()
+            try:
+                completion = await asyncio.wait_for(call(), timeout=budget.remaining())
+            except asyncio.TimeoutError:
+                self.breaker(model).record_failure()
+                raise DeadlineExceeded(f"LLM call to {model} did not finish within its {budget.seconds:.1f}s budget") from None
+        METRICS.observe("ai_llm_duration_seconds", time.perf_counter() - started, model=model)
+        METRICS.inc("ai_llm_requests_total", model=model, outcome="ok")
+        METRICS.inc("ai_llm_tokens_total", completion.prompt_tokens, model=model, kind="prompt")
+        METRICS.inc("ai_llm_tokens_total", completion.completion_tokens, model=model, kind="completion")
+        return completion
+
+    async def _run(
+        self,
+        model: str,
+        call: Callable[[], Awaitable[Completion]],
+        deadline: Optional[float],
+        may_retry: Callable[[], bool],
+        what: str,
+    ) -> Completion:
+        budget = Deadline(self.deadline if deadline is None else deadline)
+        breaker = self.breaker(model)
+        attempt = 0
+        while True:
+            breaker.check()
+            try:
+                completion = await self._attempt(model, call, budget)
+            except DeadlineExceeded:
+                METRICS.inc("ai_llm_requests_total", model=model, outcome="timeout")
+                raise
+            except Exception as e:
+                retryable = is_retryable(e)
+                # 4xx answers mean the model is up (the request was bad)
+                if retryable:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                delay = self._backoff(attempt, e)
+                retry = retryable and may_retry() and attempt < self.max_retries and delay < budget.remaining()
+                METRICS.inc("ai_llm_requests_total", model=model, outcome="retry" if retry else "error")
+                if not retry:
+                    raise
+                logger.warning("LLM %s %s failed (%s); retry %d in %.2fs", what, model, e, attempt + 1, delay)
+                attempt += 1
+                # Sleep outside the semaphore so waiting retries don't hold a slot
+                await asyncio.sleep(delay)
+            else:
+                breaker.record_success()
+                return completion
+
+    async def complete(self, model: str, messages: List[Dict[str, str]], deadline: Optional[float] = None, **params: Any) -> Completion:
+        """One chat completion; `deadline` (seconds, default self.deadline) bounds
+        the whole call including retries."""
+        return await self._run(model, lambda: self.backend.complete(model, messages, **params), deadline, lambda: True, "call to")
+
+    async def stream(self, model: str, messages: List[Dict[str, str]], on_delta: DeltaCallback, deadline: Optional[float] = None, **params: Any) -> Completion:
+        """Like complete(), but forwards content deltas to `on_delta` as they arrive.
+
+        A failed attempt is only retried while nothing has been forwarded yet;
+        once the caller has seen part of the answer the error is raised."""
+        forwarded = False
+
+        async def forward(delta: str) -> None:
+            nonlocal forwarded
+            forwarded = True
+            await on_delta(delta)
+
+        return await self._run(
+            model,
+            lambda: self.backend.stream(model, messages, forward, **params),
+            deadline,
+            lambda: not forwarded,
+            "stream from",
+        )
+
+    async def aclose(self) -> None:
+        await self.backend.aclose()
+
+
+def _parse_concurrency(spec: str) -> Dict[str, int]:
+    """Parse "model=N,model=N" into a per-model concurrency map."""
+    limits: Dict[str, int] = {}
+    for part in spec.split(","):
+        if "=" in part:
+            model, value = part.split("=", 1)
+            limits[model.strip()] = int(value)
+    return limits
+
+
+def create_gateway_from_env() -> LLMGateway:
+    """Build the gateway from environment variables (LLM_BACKEND=groq|fake)."""
+    backend_name = os.getenv("LLM_BACKEND", "groq").lower()
+    if backend_name == "fake":
+        responses_path = os.getenv("LLM_FAKE_RESPONSES")
+        responses = None
+        if responses_path:
+            with open(responses_path) as f:
+                responses = json.load(f)
+        backend = FakeBackend(responses=responses, latency=float(os.getenv("LLM_FAKE_LATENCY", "0")))
+    else:
+        backend = GroqBackend(
+            api_key=os.getenv("GROQ_API_KEY"),
+            max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "20")),
+            timeout=float(os.getenv("LLM_TIMEOUT", "30")),
+        )
+    return LLMGateway(
+        backend,
+        model_concurrency=_parse_concurrency(os.getenv("LLM_MODEL_CONCURRENCY", "")),
+        default_concurrency=int(os.getenv("LLM_DEFAULT_CONCURRENCY", "8")),
+        max_retries=int(os.getenv("LLM_MAX_RETRIES", "3")),
+        deadline=float(os.getenv("LLM_DEADLINE", "20")),
+    )
@@ -1,42 +1,129 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional, Any, Dict
+from typing import List, Optional, Any, Dict, AsyncIterator, Awaitable, Callable, Set, Tuple, Union
+import asyncio
+import hashlib
+import json
+import logging
 import os
-from groq import Groq
+import re
+import time
 from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
-
-app = FastAPI(title="Risk Analysis AI Service")
-
-# Setup Groq client
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-client = Groq(api_key=GROQ_API_KEY)
-
-
-E164_SYSTEM_PROMPT = """You are a phone number validation and formatting assistant.
-Your task is to only accept and output phone numbers in strict E.164 international format.
-
-Rules:
-1. A valid phone number must start with a single plus sign '+'.
-2. After '+', it must contain only digits.
-3. The next 1 to 3 digits must be a valid ITU country calling code.
-4. After the country code must follow valid national number digits (area code + subscriber number)
-   with no local trunk prefixes (e.g., drop any leading 0 from local numbers).
-5. The total number of digits (excluding the '+') must be between 2 and 15.
-6. No spaces, hyphens, parentheses, letters, or other symbols are allowed in the output.
-7. If the input number is invalid or does not match the E.164 rules, respond exactly with: Invalid phone number
-
-Do not add any additional text or explanation.
-Only output a valid E.164 phone number (e.g. +14155552671) or the exact string: Invalid phone number"""
+from address_model import load_address_model_from_env
+from cache import SqliteStore, TieredCache
+from cascade import LARGE_MODEL, SMALL_MODEL, address_red_flags, create_cascade_from_env
+from concurrency import SingleFlight, run_stages
+from countries import resolve_iso2
+from feature_store import create_feature_store_from_env, merge_identity_context
+from gazetteer import load_gazetteer_from_env
+from geo_client import create_geo_cache_from_env, create_geo_client_from_env
+from llm_gateway import create_gateway_from_env, is_retryable
+from metrics import METRICS, annotate, request_trace, span
+from phone_numbers import check_phone
+from prompts import ADDRESS_VALIDATION_CASCADE_PROMPT, ADDRESS_VALIDATION_SYSTEM_PROMPT, ASSESSMENT_SYSTEM_PROMPT, E164_SYSTEM_PROMPT, build_order_block, prompt_size_report
+from resilience import CircuitOpenError, DeadlineExceeded
+from settings import create_settings_from_env
+from rules import OrderFacts, build_assessment, deterministic_hints, evaluate_deterministic, make_flag, pending_rules, score_flags
+from schemas import RiskAssessment, coerce_confidence, dumps, extract_json_object, parse_llm_assessment, validate_assessment
+
+logger = logging.getLogger("ai_service")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Configuration is read here, not at import: serve.py workers, the bench and
+    # tests set their environment after this module is imported
+    load_dotenv()
+    app.state.settings = create_settings_from_env()
+    # Shared async LLM gateway (pooled connections, per-model limits, retries)
+    app.state.llm = create_gateway_from_env()
+    # Small-model-first cascade for the address and assessment calls (CASCADE_MODE)
+    app.state.cascade = create_cascade_from_env()
+    # Shared keep-alive client for ZipcodeStack / Nominatim lookups
+    app.state.geo = create_geo_client_from_env()
+    # Tiered cache of city / postal verification results (LRU + optional SQLite)
+    app.state.geo_cache = create_geo_cache_from_env()
+    # Offline gazetteer index (optional) answers most geo lookups without the network
+    app.state.gazetteer = load_gazetteer_from_env()
+    # Local plausibility model answering clearly valid / invalid addresses without the LLM
+    app.state.address_model = load_address_model_from_env()
+    # Address-validation verdicts keyed on the normalised address (never caches ERROR)
+    address_cache_path = os.getenv("ADDRESS_CACHE_PATH")
+    app.state.address_cache = TieredCache(
+        "address",
+        maxsize=int(os.getenv("ADDRESS_CACHE_SIZE", "50000")),
+        ttl=float(os.getenv("ADDRESS_CACHE_TTL", str(30 * 24 * 3600))),
+        negative_ttl=float(os.getenv("ADDRESS_CACHE_INVALID_TTL", str(24 * 3600))),
+        store=SqliteStore(address_cache_path, namespace="address") if address_cache_path else None,
+    )
+    # Velocity / identity features maintained from committed orders (Rules 3, 4, 6, 7)
+    app.state.features = create_feature_store_from_env()
+    # Whole-order verdicts keyed on order id + input fingerprint, so retries are idempotent
+    verdict_cache_path = os.getenv("VERDICT_CACHE_PATH")
+    verdict_ttl = float(os.getenv("VERDICT_CACHE_TTL", str(3600)))
+    app.state.verdict_cache = TieredCache(
+        "verdict",
+        maxsize=int(os.getenv("VERDICT_CACHE_SIZE", "10000")),
+        ttl=verdict_ttl,
+        negative_ttl=verdict_ttl,
+        store=SqliteStore(verdict_cache_path, namespace="verdict") if verdict_cache_path else None,
+    )
+    # Expired rows of the SQLite tiers are deleted in the background; lookups only skip them
+    purger = asyncio.create_task(_purge_expired_periodically(app.state.settings.cache_purge_interval))
+    try:
+        yield
+    finally:
+        purger.cancel()
+        app.state.verdict_cache.close()
+        app.state.features.close()
+        if app.state.gazetteer is not None:
+            app.state.gazetteer.close()
+        app.state.address_cache.close()
+        app.state.geo_cache.close()
+        await app.state.geo.aclose()
+        await app.state.llm.aclose()
+
+
+app = FastAPI(title="Risk Analysis AI Service", lifespan=lifespan)
+
+async def _purge_expired_periodically(interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        for attr in ("geo_cache", "address_cache", "verdict_cache"):
+            try:
+                # Off the event loop: a purge of a large file can take a while
+                removed = await asyncio.to_thread(getattr(app.state, attr).purge_expired)
+            except Exception as e:
+                logger.warning("Purging expired %s entries failed: %s", attr, e)
+                continue
+            if removed:
+                logger.info("Purged %d expired %s entries", removed, attr)
+
+
+# Explanation of pending rules when the assessment LLM is skipped (circuit open or
+# budget spent); such verdicts are returned but never cached (see _cache_verdict)
+LLM_UNAVAILABLE_EXPLANATION = "Rule was not evaluated: the LLM is currently unavailable."
+
+
+METRICS.describe("ai_gazetteer_lookups_total", "counter", "Offline gazetteer lookups by kind and result.")
+METRICS.describe("ai_address_model_total", "counter", "Local address model verdicts (borderline ones go to the LLM).")
+METRICS.describe("ai_llm_unavailable_total", "counter", "Assessments finished without the LLM because it was unavailable.")
+METRICS.describe("ai_verdicts_uncached_total", "counter", "Verdicts not cached because a stage ran degraded, by stage.")
+
+# Identical geo / address lookups already in flight (e.g. within a batch) share one call
+_geo_inflight = SingleFlight()
+_address_inflight = SingleFlight()
+_verdict_inflight = SingleFlight()
 
 
 async def normalize_phone_e164(raw_phone: str, country: str) -> str:
-    """Pre-process the raw phone input through a dedicated LLM call to
-    produce a clean E.164 number before the main fraud analysis."""
+    """Fallback for numbers phone_numbers.check_phone can't classify: normalise the
+    raw phone input through a dedicated LLM call to produce a clean E.164 number."""
     try:
-        resp = client.chat.completions.create(
+        resp = await app.state.llm.complete(
             model="llama-3.1-8b-instant",   # fast, cheap model for this simple task
             messages=[
                 {"role": "system", "content": E164_SYSTEM_PROMPT},
@@ -51,8 +138,9 @@ async def normalize_phone_e164(raw_phone: str, country: str) -> str:
             ],
             temperature=0,
             max_tokens=30,
+            deadline=app.state.settings.phone_llm_deadline,
         )
-        normalised = resp.choices[0].message.content.strip()
+        normalised = resp.content.strip()
         # Safety guard: if the model starts explaining instead of just the number, fall back
         if normalised.startswith('+') or normalised == 'Invalid phone number':
             return normalised
@@ -61,98 +149,248 @@ async def normalize_phone_e164(raw_phone: str, country: str) -> str:
         return raw_phone   # on any error, pass original value through
 
 
-ADDRESS_VALIDATION_SYSTEM_PROMPT = """You are a Global Delivery Address Validation Expert.
-
-Your task:
-Analyze the input text to determine if it is a plausible, real-world delivery address. You must use your extensive geographic knowledge to identify street names, city patterns, and regional address structures.
-
-Core Validation Rules:
-1. NO STATIC REGEX: Use your AI knowledge to determine if a pattern is a valid delivery address for that region.
-2. COMPONENT REQUIREMENTS: A valid address SHOULD contain:
-   - City Name
-   - Street Number
-   - Street Name
-   - Town Number (Town No.)
-   - Town Name
-   - Block Number (Block No.)
-   - Block Name
-   (Note: These are ideal components. In some international contexts, "Town" or "Block" may not be used, but for regions where they are standard, they are required. The key is structural completeness for the region.)
-3. FLEXIBILITY: Do NOT reject if the following are missing:
-   - Customer Name (the user's own name)
-   - State Name
-   - Postal Code / Zip Code
-4. STRICT GIBBERISH REJECTION: Immediately reject (INVALID) any input containing non-understandable strings, random characters (e.g., 'asdfgh'), or keyboard mashes.
-5. NO IRRELEVANT DATA: Reject if the string contains any irrelevant or not understandable strings, characters, integers, or float numbers mixed into the address.
-6. TYPOS: A single minor typo is acceptable, but multiple garbled words make it INVALID.
-7. FINDABILITY: If a local delivery person could likely find the location based on the provided text, and it meets the structural requirements of that country, it is VALID.
-
-Output must be a JSON object:
-{
-  "input": "original input text",
-  "status": "VALID" or "INVALID",
-  "normalized_address": "Standardized address (excluding Customer Name)",
-  "reason": "Clear explanation if INVALID"
-}
-
-Golden Examples (VALID):
-- "United States: 123 Main Street, Los Angeles CA 90012"
-- "Canada: 456 Maple Ave, Toronto ON M5H 2N2"
-- "United Kingdom: 78 High Street, London SW1A 1AA"
-- "Australia: 12 Pitt Street, Sydney NSW 2000"
-- "Germany: Berliner Strasse 33, 10117 Berlin"
-- "France: 15 Rue de Rivoli, 75001 Paris"
-- "Italy: Via Roma 22, 00184 Roma RM"
-- "Spain: Calle Mayor 8, 28013 Madrid"
-- "Netherlands: Keizersgracht 456, 1017 ET Amsterdam"
-- "Sweden: Drottninggatan 57, 111 21 Stockholm"
-- "Brazil: Rua das Flores 144, São Paulo SP 01001-000"
-- "Mexico: Av. Insurgentes Sur 501, Ciudad de México 03100"
-- "Japan: 1-2-3 Shinjuku, Shinjuku-ku, Tokyo 160-0022"
-- "South Korea: 23 Gangnam-daero, Seocho-gu, Seoul 06612"
-- "India: Plot 56, MG Road, Bengaluru KA 560001"
-- "Pakistan: House #11, Street 5, Gulberg III, Lahore 54660"
-- "South Africa: 109 Long Street, Cape Town 8001"
-- "Nigeria: 24 Broad Street, Lagos 100001"
-
-Valid even if missing non-essential data:
-- "123 Main St, Los Angeles" (Valid: missing state/zip)
-- "House 11, Street 5, Gulberg III, Lahore" (Valid: missing zip)
-
-Negative Examples (INVALID):
-- "8998sfgdfs bvbb - Block , Military Ahghsfhgccount , lahore" (Gibberish strings 'sfgdfs')
-- "Office 111111111111111111111111, Karachi" (Irrelevant/Unnaturally long numbers)
-- "kjhgfds 12.345.678 !! New York" (Nonsensical/Irrelevant floats/characters)
-
-Respond ONLY with the JSON object."""
+def address_cache_key(address_str: str) -> str:
+    """Content address for a delivery address: case, whitespace and punctuation are
+    folded so '123 Main St., Lahore' and '123 main st lahore' share one entry."""
+    folded = re.sub(r"[^\w\s]", " ", address_str.casefold())
+    return hashlib.sha256(" ".join(folded.split()).encode("utf-8")).hexdigest()
 
 
 async def validate_address_with_llm(address_str: str) -> dict:
-    """Validate a delivery address using the LLM. Returns {'status': 'VALID'|'INVALID'|'ERROR', 'detail': str}"""
+    """Validate a delivery address using the LLM. Returns {'status': 'VALID'|'INVALID'|'ERROR', 'detail': str}
+
+    Addresses the local model is sure about are answered without the LLM."""
+    key = address_cache_key(address_str)
+    cached = app.state.address_cache.get(key)
+    if cached is not None:
+        return cached
+    model = app.state.address_model
+    if model is not None:
+        verdict, score = model.verdict(address_str)
+        METRICS.inc("ai_address_model_total", verdict=(verdict or "borderline").lower())
+        if verdict == "VALID":
+            return {"status": "VALID", "detail": f"VALIDATED: Local address model rates the address as deliverable (score {score:.2f})."}
+        if verdict == "INVALID":
+            return {
+                "status": "INVALID",
+                "detail": f"INVALID: The address contains gibberish, keyboard mashing or unnatural numbers (local address model score {score:.2f}).",
+            }
+    return await _address_inflight.do(key, lambda: _validate_and_cache_address(key, address_str))
+
+
+async def _validate_and_cache_address(key: str, address_str: str) -> dict:
+    result = await _validate_address(address_str)
+    # ERROR means the call failed, not that the address is bad — never cache it
+    if result["status"] != "ERROR":
+        app.state.address_cache.set(key, result, negative=result["status"] == "INVALID")
+    return result
+
+
+async def _validate_address(address_str: str) -> dict:
+    async def large_tier() -> dict:
+        result, _ = await _ask_address_model(LARGE_MODEL, ADDRESS_VALIDATION_SYSTEM_PROMPT, address_str)
+        return result
+
     try:
-        resp = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[
-                {"role": "system", "content": ADDRESS_VALIDATION_SYSTEM_PROMPT},
-                {"role": "user", "content": address_str}
-            ],
-            temperature=0,
-            max_tokens=250,
-            response_format={"type": "json_object"}
+        return await app.state.cascade.run(
+            "address",
+            small=lambda: _ask_address_model(SMALL_MODEL, ADDRESS_VALIDATION_CASCADE_PROMPT, address_str),
+            large=large_tier,
+            agree=lambda a, b: a["status"] == b["status"],
+            # Accepting a junk-looking address needs the large model's word
+            contradicts=lambda result: result["status"] == "VALID" and address_red_flags(address_str),
         )
-        import json as _json
-        raw = resp.choices[0].message.content.strip()
-        parsed = _json.loads(raw)
-        status = parsed.get("status", "INVALID").upper()
-        if status == "VALID":
-            normalized = parsed.get("normalized_address", address_str)
-            return {"status": "VALID", "detail": f"VALIDATED: LLM confirmed deliverable address. Normalized: '{normalized}'"}
-        else:
-            reason = parsed.get("reason", "Address could not be validated.")
-            return {"status": "INVALID", "detail": f"INVALID: {reason}"}
     except Exception as e:
         return {"status": "ERROR", "detail": f"API_ERROR: Address validation LLM call failed — {str(e)}"}
 
 
+async def _ask_address_model(model: str, system_prompt: str, address_str: str) -> Tuple[dict, float]:
+    """One address-validation completion as (result, self-reported confidence or 0)."""
+    resp = await app.state.llm.complete(
+        model=model,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": address_str}
+        ],
+        temperature=0,
+        max_tokens=250,
+        response_format={"type": "json_object"},
+        deadline=app.state.settings.address_llm_deadline,
+    )
+    parsed = extract_json_object(resp.content)
+    status = parsed.get("status", "INVALID").upper()
+    if status == "VALID":
+        normalized = parsed.get("normalized_address", address_str)
+        result = {"status": "VALID", "detail": f"VALIDATED: LLM confirmed deliverable address. Normalized: '{normalized}'"}
+    else:
+        reason = parsed.get("reason", "Address could not be validated.")
+        result = {"status": "INVALID", "detail": f"INVALID: {reason}"}
+    try:
+        confidence = coerce_confidence(parsed.get("confidence"))
+    except ValueError:
+        confidence = None
+    return result, confidence if isinstance(confidence, float) else 0.0
+
+
+def _geo_cache_key(kind: str, value: str, country: str) -> str:
+    return f"{kind}:{value.strip().lower()}:{country.strip().lower()}"
+
+
+def _cache_geo_result(key: str, result: Any) -> None:
+    """Store a lookup result; found/not-found answers are cached (not-found with the
+    shorter negative TTL), API errors are never cached."""
+    summary = result["summary"] if isinstance(result, dict) else result
+    if summary.startswith(("VERIFIED", "API DATA FOUND")):
+        app.state.geo_cache.set(key, result)
+    elif summary.startswith(("NOT FOUND", "API DATA NOT FOUND")):
+        app.state.geo_cache.set(key, result, negative=True)
+
+
+def postal_result(summary: str, city: Optional[str] = None, state: Optional[str] = None, country: Optional[str] = None, source: Optional[str] = None) -> Dict[str, Any]:
+    """Postal check result: the prompt line plus the matched place (if any) for the rule engine."""
+    match = {"city": city, "state": state, "country": country, "source": source} if city is not None else None
+    return {"summary": summary, "match": match}
+
+
+async def verify_city(addr_city: str, user_country: str) -> str:
+    """CHECK 1: City geo-verification (gazetteer -> cache -> ZipcodeStack -> Nominatim fallback).
+    Returns the city lookup line used in the GEO-VERIFICATION RESULTS prompt section."""
+    gazetteer = app.state.gazetteer
+    iso2 = resolve_iso2(user_country)
+    if gazetteer is not None and iso2:
+        found = gazetteer.has_city(addr_city, iso2)
+        METRICS.inc("ai_gazetteer_lookups_total", kind="city", result="hit" if found else "miss")
+        if found:
+            return f"VERIFIED (GeoNames gazetteer): City '{addr_city}' exists in '{user_country}'."
+
+    key = _geo_cache_key("city", addr_city, user_country)
+    cached = app.state.geo_cache.get(key)
+    if cached is not None:
+        return cached
+    return await _geo_inflight.do(key, lambda: _lookup_city(key, addr_city, user_country))
+
+
+async def _lookup_city(key: str, addr_city: str, user_country: str) -> str:
+    result = await _query_city(addr_city, user_country)
+    _cache_geo_result(key, result)
+    return result
+
+
+async def _query_city(addr_city: str, user_country: str) -> str:
+    geo = app.state.geo
+    # Try ZipcodeStack first (skipped while its circuit is open or without an API key)
+    status, zip_city_data = None, None
+    if geo.zipcodestack_enabled:
+        try:
+            status, zip_city_data = await geo.zipcodestack_city(addr_city, user_country)
+        except Exception as e:
+            logger.debug("ZipcodeStack city lookup failed (%s), trying Nominatim", e)
+    if status == 200 and zip_city_data and zip_city_data.get("results"):
+        return f"VERIFIED (ZipcodeStack): City '{addr_city}' exists in '{user_country}'."
+
+    # If ZipcodeStack fails, fallback to Nominatim (OpenStreetMap)
+    status, osm_results = await geo.nominatim_city(addr_city, user_country)
+    if status != 200:
+        # An API error is not a "not found" answer: neither cached nor trusted
+        return f"Geo-verification error: Nominatim returned HTTP {status}"
+    if osm_results:
+        osm_data = osm_results[0]
+        return f"VERIFIED (Nominatim/OSM): City '{addr_city}' was found. Details: {osm_data.get('display_name')}"
+    return f"NOT FOUND: City '{addr_city}' was not found in geo databases for country '{user_country}'. LLM MUST VERIFY IF THIS IS A REAL CITY."
+
+
+async def verify_postal_code(postal_code: str, user_country: str) -> Dict[str, Any]:
+    """CHECK 2: Postal code validation (gazetteer -> cache -> ZipcodeStack).
+    Returns a postal_result() whose summary is the GEO-VERIFICATION RESULTS prompt line."""
+    if not postal_code:
+        return postal_result("No postal code provided.")
+    gazetteer = app.state.gazetteer
+    iso2 = resolve_iso2(user_country)
+    if gazetteer is not None and iso2:
+        match = gazetteer.lookup_postal(postal_code, iso2)
+        METRICS.inc("ai_gazetteer_lookups_total", kind="postal", result="hit" if match is not None else "miss")
+        if match is not None:
+            gz_city, gz_state, gz_country = match
+            return postal_result(
+                f"API DATA FOUND: Postal code '{postal_code}' strictly belongs to City: '{gz_city}', State/Province: '{gz_state}', Country: '{gz_country}' according to the GeoNames gazetteer.",
+                gz_city, gz_state, gz_country, "GeoNames gazetteer",
+            )
+
+    key = _geo_cache_key("postal", postal_code, user_country)
+    cached = app.state.geo_cache.get(key)
+    if cached is not None:
+        return cached
+    return await _geo_inflight.do(key, lambda: _lookup_postal_code(key, postal_code, user_country))
+
+
+async def _lookup_postal_code(key: str, postal_code: str, user_country: str) -> Dict[str, Any]:
+    result = await _query_postal_code(postal_code, user_country)
+    _cache_geo_result(key, result)
+    return result
+
+
+async def _query_postal_code(postal_code: str, user_country: str) -> Dict[str, Any]:
+    if not app.state.geo.zipcodestack_enabled:
+        # Not an outage (the verdict may still be cached), just no lookup to do
+        return postal_result("NO POSTAL API CONFIGURED. Fallback to LLM internal knowledge verification.")
+    status, data = await app.state.geo.zipcodestack_postal(postal_code, user_country)
+    if status != 200:
+        return postal_result(f"API ERROR ({status}). Fallback to LLM internal knowledge verification.")
+    results = (data or {}).get("results", {})
+    if postal_code in results and len(results[postal_code]) > 0:
+        pc_data = results[postal_code][0]
+        zc_city = pc_data.get("city", "Unknown")
+        zc_state = pc_data.get("state", "Unknown")
+        zc_country = pc_data.get("country_code", "Unknown")
+        return postal_result(
+            f"API DATA FOUND: Postal code '{postal_code}' strictly belongs to City: '{zc_city}', State/Province: '{zc_state}', Country: '{zc_country}' according to ZipcodeStack API.",
+            zc_city, zc_state, zc_country, "ZipcodeStack API",
+        )
+    return postal_result(f"API DATA NOT FOUND: Postal code '{postal_code}' not found in ZipcodeStack for '{user_country}'. The LLM MUST use its internal knowledge to verify if this postal code matches the city, state, and country.")
+
+
+@app.get("/api/v1/cache/stats")
+async def cache_stats():
+    return {
+        "geo": app.state.geo_cache.snapshot(),
+        "address": app.state.address_cache.snapshot(),
+        "verdict": app.state.verdict_cache.snapshot(),
+    }
+
+
+def _cache_samples():
+    """Expose the TieredCache counters as Prometheus samples at scrape time."""
+    for attr in ("geo_cache", "address_cache", "verdict_cache"):
+        cache = getattr(app.state, attr, None)
+        if cache is None:
+            continue
+        for result in ("memory_hits", "store_hits", "misses"):
+            yield "ai_cache_lookups_total", "counter", "Cache lookups by cache and result.", {"cache": cache.name, "result": result}, cache.stats[result]
+        yield "ai_cache_entries", "gauge", "Entries held in the in-memory cache tier.", {"cache": cache.name}, len(cache.memory)
+    # Each serve.py worker keeps its own counters; this tells their scrapes apart
+    yield "ai_worker_info", "gauge", "Worker process that answered this scrape.", {"pid": os.getpid()}, 1
+
+
+METRICS.register_collector(_cache_samples)
+
+
+@app.get("/health")
+async def health():
+    """Liveness / readiness probe; `pid` tells the worker processes of serve.py apart."""
+    return {"status": "ok", "pid": os.getpid()}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus scrape endpoint: stage latencies, LLM / upstream calls, cache hit rates.
+
+    Counters live in the worker process, so under serve.py each scrape returns
+    the numbers of whichever worker took the connection (ai_worker_info has its
+    pid), not totals for the service. Run a single worker, or one port per
+    worker, for complete figures."""
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4")
+
+
 class OrderPayload(BaseModel):
     user_profile: Dict[str, Any]
     order_details: Dict[str, Any]
@@ -161,447 +399,482 @@ class OrderPayload(BaseModel):
     history: Dict[str, Any]
     historical_context: Optional[Dict[str, Any]] = None
 
-@app.post("/api/v1/analyze")
+
+class FastJSONResponse(Response):
+    """JSON response serialised with schemas.dumps (orjson when installed), skipping
+    FastAPI's generic encoder for payloads that are already plain JSON types."""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class CommittedOrder(BaseModel):
+    user_profile: Dict[str, Any]
+    address: Dict[str, Any]
+    order_details: Dict[str, Any] = {}
+    committed_at: Optional[str] = None
+
+
+@app.post("/api/v1/features/orders", status_code=202)
+async def record_committed_orders(orders: Union[CommittedOrder, List[CommittedOrder]]):
+    """Fold committed orders into the feature store (one order, or a list for backfills)."""
+    orders = orders if isinstance(orders, list) else [orders]
+    for order in orders:
+        app.state.features.record_order(order.model_dump(), order.committed_at)
+    return {"recorded": len(orders)}
+
+
+@app.post("/api/v1/features/lookup")
+async def lookup_features(payload: OrderPayload):
+    """Historical context for an order as the feature store sees it."""
+    return app.state.features.historical_context(payload.model_dump())
+
+
+@app.get("/api/v1/features/stats")
+async def feature_stats():
+    return app.state.features.snapshot()
+
+
+# No response_model: assess_order already checks the result with validate_assessment,
+# so FastAPI would only validate it twice. The schema is still published in OpenAPI.
+@app.post("/api/v1/analyze", responses={200: {"model": RiskAssessment}})
 async def analyze_risk(payload: OrderPayload):
-    # Build historical context section for the prompt
-    hist_ctx = ""
-    if payload.historical_context:
-        hc = payload.historical_context
-
-        # Same person order history
-        sp = hc.get('same_person_orders', {})
-        orders_last_24h = sp.get('orders_last_24h', 0)
-        orders_last_7d = sp.get('orders_last_7d', 0)
-        total_past = sp.get('total_past_orders', 0)
-        last_ts = sp.get('last_order_timestamp', None)
-        mins_since_last = sp.get('minutes_since_last_order', None)
-
-        # Address history
-        addr_hist = hc.get('address_history', {})
-        other_names = addr_hist.get('other_names_at_this_address', [])
-
-        # Duplicate email matches
-        dup_email = hc.get('duplicate_email_matches', [])
-        if dup_email:
-            dup_email_str = "\n".join([
-                f"  - Name: {m.get('name')}, Email: {m.get('email')}, Phone: {m.get('phone')}"
-                for m in dup_email
-            ])
-        else:
-            dup_email_str = "  None found — this email is unique in the database."
-
-        # Duplicate phone matches
-        dup_phone = hc.get('duplicate_phone_matches', [])
-        if dup_phone:
-            dup_phone_str = "\n".join([
-                f"  - Name: {m.get('name')}, Email: {m.get('email')}, Phone: {m.get('phone')}"
-                for m in dup_phone
-            ])
-        else:
-            dup_phone_str = "  None found — this phone number is unique in the database."
+    return FastJSONResponse(await assess_order(payload))
+
+
+async def _iter_ndjson(body: bytes) -> AsyncIterator[Tuple[int, str]]:
+    """Yield (index, line) for each non-empty line of an NDJSON body."""
+    index = 0
+    for line in body.split(b"\n"):
+        if line.strip():
+            yield index, line.decode("utf-8")
+            index += 1
+
+
+async def _iter_list(items: List[Any]) -> AsyncIterator[Tuple[int, Any]]:
+    for index, item in enumerate(items):
+        yield index, item
+
+
+@app.post("/api/v1/analyze/batch")
+async def analyze_batch(request: Request):
+    """Score many orders in one request.
+
+    Accepts a JSON array of OrderPayload objects, or NDJSON (one payload per line,
+    Content-Type: application/x-ndjson). At most BATCH_CONCURRENCY orders are
+    scored at once; results are streamed back as NDJSON lines
+    `{"index", "order_id", "assessment"}` (or `{"index", "error"}`) in completion
+    order. Input that cannot be read ends the batch with an `{"index": null,
+    "error"}` line, after the results of every order read before it. Scoring
+    still in flight is cancelled when the client disconnects.
+
+    The body is read in full before the response starts: once it has, the server
+    may be listening for a disconnect on the same receive channel (ASGI < 2.4)
+    and would swallow body chunks read later."""
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonl" in content_type:
+        items = _iter_ndjson(await request.body())
+    else:
+        try:
+            body = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body must be a JSON array of orders or NDJSON.")
+        if not isinstance(body, list):
+            raise HTTPException(status_code=400, detail="Body must be a JSON array of orders or NDJSON.")
+        items = _iter_list(body)
+
+    results: asyncio.Queue = asyncio.Queue()
+    budget = asyncio.Semaphore(app.state.settings.batch_concurrency)
+    running: Set[asyncio.Task] = set()
+
+    async def score(index: int, raw: Any) -> None:
+        try:
+            if isinstance(raw, (str, bytes)):
+                payload = OrderPayload.model_validate_json(raw)
+            else:
+                payload = OrderPayload.model_validate(raw)
+            assessment = await assess_order(payload)
+            result = {"index": index, "order_id": payload.order_details.get("order_id"), "assessment": assessment}
+        except HTTPException as e:
+            result = {"index": index, "error": e.detail}
+        except Exception as e:
+            result = {"index": index, "error": str(e)}
+        finally:
+            budget.release()
+        await results.put(result)
+
+    async def produce() -> None:
+        try:
+            async for index, raw in items:
+                # Backpressure: stop reading input until a scoring slot is free
+                await budget.acquire()
+                task = asyncio.create_task(score(index, raw))
+                running.add(task)
+                task.add_done_callback(running.discard)
+            if running:
+                await asyncio.gather(*running)
+        except Exception as e:
+            # Orders read before the bad input still get their result lines
+            await asyncio.gather(*running, return_exceptions=True)
+            await results.put({"index": None, "error": f"Batch input error: {e}"})
+        finally:
+            await results.put(None)
+
+    async def stream() -> AsyncIterator[bytes]:
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                result = await results.get()
+                if result is None:
+                    break
+                yield dumps(result) + b"\n"
+        finally:
+            # Client gone (or done): stop reading and drop the orders still scoring
+            producer.cancel()
+            for task in list(running):
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
 
-        hist_ctx = f"""
-### DATABASE HISTORICAL CONTEXT (real data from PostgreSQL)
-Use this data to evaluate the rules below. These are FACTS — do not hallucinate or invent data.
 
-**Same Person Order History (email: {sp.get('email', 'unknown')}, name: {sp.get('full_name', 'unknown')}):**
-- Total past orders by this email: {total_past}
-- Orders in last 24 hours: {orders_last_24h}
-- Orders in last 7 days: {orders_last_7d}
-- Last order timestamp: {last_ts if last_ts else 'No previous orders'}
-- Minutes since last order: {mins_since_last if mins_since_last is not None else 'N/A — first order'}
+# Receives the intermediate (event, data) results of a streamed assessment
+EmitFn = Callable[[str, Dict[str, Any]], Awaitable[None]]
 
-**Delivery Address History (for: {payload.address.get('street', '')}, {payload.address.get('city', '')}):**
-- Other customers (different email) who ordered to this exact address: {other_names if other_names else '[]'}
 
-**Duplicate Email Check (same email, different person name in DB):**
-{dup_email_str}
+@app.post("/api/v1/analyze/stream")
+async def analyze_stream(payload: OrderPayload, request: Request):
+    """Streamed variant of /api/v1/analyze.
 
-**Duplicate Phone Check (same phone, different person name in DB):**
-{dup_phone_str}
-"""
+    Events, in order: `enrichment` (geo / phone / address results), `preliminary`
+    (flags decided without the LLM and the rules still pending), `llm_delta`
+    (raw chunks of the LLM's JSON, only when rules are pending) and finally
+    `assessment` (the validated result, same schema as /api/v1/analyze) or
+    `error`. Sent as Server-Sent Events when the client accepts
+    text/event-stream, otherwise as NDJSON lines `{"event", "data"}`.
 
+    The verdict cache is not read here: a repeat of a cached order is assessed
+    again, so every call produces the full event sequence above."""
+    sse = "text/event-stream" in request.headers.get("accept", "")
+    events: asyncio.Queue = asyncio.Queue()
+
+    async def emit(event: str, data: Dict[str, Any]) -> None:
+        await events.put((event, data))
+
+    async def run() -> None:
+        try:
+            await emit("assessment", await assess_order(payload, emit=emit))
+        except HTTPException as e:
+            await emit("error", {"detail": e.detail})
+        except Exception as e:
+            await emit("error", {"detail": str(e)})
+        finally:
+            await events.put(None)
+
+    async def stream() -> AsyncIterator[str]:
+        task = asyncio.create_task(run())
+        try:
+            while True:
+                item = await events.get()
+                if item is None:
+                    break
+                event, data = item
+                if sse:
+                    yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+                else:
+                    yield json.dumps({"event": event, "data": data}) + "\n"
+        finally:
+            task.cancel()
+
+    media_type = "text/event-stream" if sse else "application/x-ndjson"
+    return StreamingResponse(stream(), media_type=media_type, headers={"Cache-Control": "no-cache"})
+
+
+def verdict_cache_key(payload: OrderPayload) -> str:
+    """Order id plus a SHA-256 of the canonical payload (sorted keys, compact
+    separators), historical context included: a retry of the same order maps to
+    the same key, while any change to its data or history does not."""
+    canonical = json.dumps(payload.model_dump(), sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    digest = hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+    return f"{payload.order_details.get('order_id')}:{digest}"
+
+
+async def assess_order(payload: OrderPayload, emit: Optional[EmitFn] = None) -> Dict[str, Any]:
+    """Run the full enrichment + rule evaluation pipeline for one order.
+
+    With `emit`, intermediate results are reported as they become available and
+    the LLM answer is streamed (see analyze_stream). A repeat of a recently
+    assessed order gets the stored verdict back, and identical orders in flight
+    at the same time share one run. Streamed calls always run the pipeline, so
+    they emit the same events whatever the cache holds, and only store their
+    verdict."""
+    with request_trace(order_id=payload.order_details.get('order_id'), streamed=emit is not None):
+        payload = payload.model_copy(update={"historical_context": resolve_historical_context(payload)})
+        key = verdict_cache_key(payload)
+        if emit is not None:
+            annotate(verdict_cache="bypass")
+            return _cache_verdict(key, *await _assess_order(payload, emit))
+        cached = app.state.verdict_cache.get(key)
+        if cached is not None:
+            annotate(verdict_cache="hit")
+            return cached
+        return await _verdict_inflight.do(key, lambda: _assess_and_cache(key, payload))
+
+
+async def _assess_and_cache(key: str, payload: OrderPayload) -> Dict[str, Any]:
+    return _cache_verdict(key, *await _assess_order(payload, None))
+
+
+def _cache_verdict(key: str, assessment: Dict[str, Any], degraded: List[str]) -> Dict[str, Any]:
+    # A verdict built on a fallback (failed lookup, skipped address check, LLM
+    # unavailable) is returned but re-assessed next time instead of being replayed
+    assessment = validate_assessment(assessment)
+    if degraded:
+        annotate(verdict_cache="skipped", degraded=degraded)
+        for stage in degraded:
+            METRICS.inc("ai_verdicts_uncached_total", stage=stage)
+    else:
+        app.state.verdict_cache.set(key, assessment)
+    return assessment
+
+
+def degraded_stages(stage_results: Dict[str, Any]) -> List[str]:
+    """Enrichment stages whose result is an error placeholder rather than an answer:
+    the geo or postal API failed, or address validation could not run."""
+    degraded = []
+    if stage_results["city"].startswith("Geo-verification error"):
+        degraded.append("city")
+    if stage_results["postal"]["summary"].startswith(("API ERROR", "Postal API error")):
+        degraded.append("postal")
+    if stage_results["address"]["status"] == "ERROR":
+        degraded.append("address")
+    return degraded
+
+
+def resolve_historical_context(payload: OrderPayload) -> Dict[str, Any]:
+    """Callers without database access (batch, stream, direct) get the context from
+    the feature store; a context from the API (exact matches only) gets the
+    store's near-duplicate identities merged in."""
+    if payload.historical_context is None:
+        annotate(historical_context="feature_store")
+        return app.state.features.historical_context(payload.model_dump())
+    return merge_identity_context(payload.historical_context, app.state.features.identity_matches(payload.model_dump()))
+
+
+async def _assess_order(payload: OrderPayload, emit: Optional[EmitFn]) -> Tuple[Dict[str, Any], List[str]]:
+    """The assessment plus the stages that ran degraded (see degraded_stages), if any."""
+    settings = app.state.settings
     # Build explicit geographic comparison fields
     ip_city = payload.ip_info.get('ip_city', 'unknown')
-    ip_country = payload.ip_info.get('ip_country', 'unknown')
     addr_street = payload.address.get('street', 'unknown')
     addr_city = payload.address.get('city', 'unknown')
+    addr_state = payload.address.get('state', '')
     user_country = payload.user_profile.get('country', 'unknown')
     postal_code = payload.address.get('postal_code', '')
     phone_number = payload.user_profile.get('phone', 'unknown')
-
-    # --- PRE-PROCESS: Normalise phone to strict E.164 before Rule 9 validation ---
-    phone_number = await normalize_phone_e164(phone_number, user_country)
-
-    # --- CHECK 1: City geo-verification (ZipcodeStack -> Nominatim Fallback) ---
-    city_data_str = "City verification pending."
-    city_verified = False
-    try:
-        import httpx
-        headers = {"User-Agent": "RiskGuard-Fraud-Detection-System/1.0"}
-        async with httpx.AsyncClient(headers=headers) as client_geo:
-            # Try ZipcodeStack first
-            zip_city_resp = await client_geo.get(
-                f"https://api.zipcodestack.com/v1/search?apikey=zip_live_Quw1FSmI0uSvINXqdv0yvSCklfcAjbTG9U3adZ4f&city={addr_city}&country={user_country}"
+    order_id = payload.order_details.get('order_id')
+
+    addr_parts = [
+        payload.address.get('street', ''),
+        payload.address.get('city', ''),
+        payload.address.get('state', ''),
+        postal_code,
+        user_country,
+    ]
+    addr_for_validation = ", ".join(p for p in addr_parts if p)
+
+    # Resolved by assess_order (feature store and/or API context) before fingerprinting
+    historical_context = payload.historical_context
+
+    # --- PRE-PROCESS: local E.164 normalisation + Rule 9 verdict (no network) ---
+    phone_check = check_phone(phone_number, user_country)
+    if phone_check is not None and phone_check.e164:
+        phone_number = phone_check.e164
+
+    # --- ENRICHMENT STAGES: city, postal code and address checks (and the phone LLM
+    # fallback) are independent, so they run concurrently; each stage has its own
+    # timeout and fallback result ---
+    stages = {
+        "city": (
+            verify_city(addr_city, user_country),
+            settings.city_stage_timeout,
+            lambda e: f"Geo-verification error: {str(e) or type(e).__name__}",
+        ),
+        "postal": (
+            verify_postal_code(postal_code, user_country),
+            settings.postal_stage_timeout,
+            lambda e: postal_result(f"Postal API error: {str(e) or type(e).__name__}. Fallback to LLM internal knowledge verification."),
+        ),
+        "address": (
+            validate_address_with_llm(addr_for_validation),
+            settings.address_stage_timeout,
+            lambda e: {"status": "ERROR", "detail": f"API_ERROR: Address validation failed — {str(e) or type(e).__name__}"},
+        ),
+    }
+    phone_failed = False
+    if phone_check is None and settings.phone_llm_fallback:
+        def phone_fallback(e: Exception) -> str:
+            nonlocal phone_failed
+            phone_failed = True
+            return phone_number   # pass original value through
+
+        stages["phone"] = (
+            normalize_phone_e164(phone_number, user_country),
+            settings.phone_stage_timeout,
+            phone_fallback,
+        )
+    stage_results = await run_stages(stages)
+    degraded = degraded_stages(stage_results) + (["phone"] if phone_failed else [])
+    phone_number = stage_results.get("phone", phone_number)
+    city_data_str = stage_results["city"]
+    postal_check = stage_results["postal"]
+    zip_data_str = postal_check["summary"]
+
+    # --- FAST PATH: decide every rule that is a plain data check without the LLM ---
+    facts = OrderFacts(
+        addr_street=addr_street,
+        addr_city=addr_city,
+        addr_state=addr_state,
+        postal_code=postal_code,
+        user_country=user_country,
+        city_check=city_data_str,
+        postal_check=postal_check,
+        address_status=stage_results["address"]["status"],
+        address_detail=stage_results["address"]["detail"],
+        historical_context=historical_context,
+        phone_check=phone_check.to_dict() if phone_check is not None else None,
+    )
+    if emit is not None:
+        await emit("enrichment", {
+            "phone": facts.phone_check or {"e164": phone_number},
+            "city": city_data_str,
+            "postal": postal_check,
+            "address": stage_results["address"],
+        })
+
+    decided = evaluate_deterministic(facts)
+    pending = pending_rules(decided)
+    if emit is not None:
+        await emit("preliminary", {
+            "order_id": order_id,
+            "decided_flags": sorted(decided.values(), key=lambda f: f["rule_id"]),
+            "pending_rules": pending,
+            "risk_score_so_far": score_flags(list(decided.values())),
+        })
+    annotate(decided_rules=sorted(decided), pending_rules=pending)
+    if not pending:
+        METRICS.inc("ai_orders_total", llm="skipped")
+        return build_assessment(order_id, list(decided.values())), degraded
+    METRICS.inc("ai_orders_total", llm="called")
+
+    # Static rules/schema prefix (cacheable upstream) + small per-order data block
+    order_block = build_order_block(
+        payload.model_dump_json(exclude={"historical_context"}),
+        {
+            "Delivery Address": addr_street,
+            "Delivery City": addr_city,
+            "Delivery State": addr_state or "unknown",
+            "Postal Code": postal_code,
+            "Customer Country": user_country,
+            "Phone": phone_number,
+            "IP City": ip_city,
+            "IP Province": payload.ip_info.get('ip_region', 'unknown'),
+        },
+        city_lookup=city_data_str,
+        postal_lookup=zip_data_str,
+        decided_flags=list(decided.values()),
+        evaluate=pending,
+    )
+    report = prompt_size_report(ASSESSMENT_SYSTEM_PROMPT, order_block)
+
+    messages = [
+        {"role": "system", "content": ASSESSMENT_SYSTEM_PROMPT},
+        {"role": "user", "content": order_block}
+    ]
+
+    async def small_tier():
+        with span("assessment_llm_small"):
+            completion = await app.state.llm.complete(
+                model=SMALL_MODEL,
+                messages=messages,
+                temperature=0,
+                response_format={"type": "json_object"},
+                deadline=settings.assessment_small_llm_deadline,
             )
-            if zip_city_resp.status_code == 200:
-                zip_city_data = zip_city_resp.json()
-                if zip_city_data.get("results"):
-                    city_data_str = f"VERIFIED (ZipcodeStack): City '{addr_city}' exists in '{user_country}'."
-                    city_verified = True
-            
-            # If ZipcodeStack fails, fallback to Nominatim (OpenStreetMap)
-            if not city_verified:
-                osm_resp = await client_geo.get(
-                    f"https://nominatim.openstreetmap.org/search?city={addr_city}&country={user_country}&format=json&limit=1"
+        verdict = parse_llm_assessment(completion.content, pending)
+        return verdict, verdict.confidence(pending)
+
+    async def large_tier():
+        started = time.perf_counter()
+        with span("assessment_llm"):
+            if emit is None:
+                completion = await app.state.llm.complete(
+                    model=LARGE_MODEL,
+                    messages=messages,
+                    temperature=0,
+                    response_format={"type": "json_object"},
+                    deadline=settings.assessment_llm_deadline,
                 )
-                if osm_resp.status_code == 200 and osm_resp.json():
-                    osm_data = osm_resp.json()[0]
-                    city_data_str = f"VERIFIED (Nominatim/OSM): City '{addr_city}' was found. Details: {osm_data.get('display_name')}"
-                    city_verified = True
-                else:
-                    city_data_str = f"NOT FOUND: City '{addr_city}' was not found in geo databases for country '{user_country}'. LLM MUST VERIFY IF THIS IS A REAL CITY."
-    except Exception as e:
-        city_data_str = f"Geo-verification error: {str(e)}"
-
-    # --- CHECK 2: Postal code validation ---
-    zip_data_str = "No postal code provided."
-    if postal_code:
-        try:
-            import httpx
-            async with httpx.AsyncClient() as ac:
-                resp = await ac.get(
-                    f"https://api.zipcodestack.com/v1/search?apikey=zip_live_Quw1FSmI0uSvINXqdv0yvSCklfcAjbTG9U3adZ4f&codes={postal_code}&country={user_country}"
+            else:
+                completion = await app.state.llm.stream(
+                    LARGE_MODEL,
+                    messages,
+                    lambda delta: emit("llm_delta", {"delta": delta}),
+                    deadline=settings.assessment_llm_deadline,
+                    temperature=0,
                 )
-                if resp.status_code == 200:
-                    data = resp.json()
-                    results = data.get("results", {})
-                    if postal_code in results and len(results[postal_code]) > 0:
-                        pc_data = results[postal_code][0]
-                        zc_city = pc_data.get("city", "Unknown")
-                        zc_state = pc_data.get("state", "Unknown")
-                        zc_country = pc_data.get("country_code", "Unknown")
-                        
-                        zip_data_str = f"API DATA FOUND: Postal code '{postal_code}' strictly belongs to City: '{zc_city}', State/Province: '{zc_state}', Country: '{zc_country}' according to ZipcodeStack API."
-                    else:
-                        zip_data_str = f"API DATA NOT FOUND: Postal code '{postal_code}' not found in ZipcodeStack for '{user_country}'. The LLM MUST use its internal knowledge to verify if this postal code matches the city, state, and country."
-                else:
-                    zip_data_str = f"API ERROR ({resp.status_code}). Fallback to LLM internal knowledge verification."
-        except Exception as e:
-            zip_data_str = f"Postal API error: {str(e)}. Fallback to LLM internal knowledge verification."
-
-    # --- CHECK 3: Full delivery address validation via LLM ---
-    geocode_status = "PENDING"
-    geocode_detail = "Address validation not attempted."
-    try:
-        addr_parts = [
-            payload.address.get('street', ''),
-            payload.address.get('city', ''),
-            payload.address.get('state', ''),
-            postal_code,
-            user_country,
-        ]
-        addr_for_validation = ", ".join(p for p in addr_parts if p)
-        llm_result = await validate_address_with_llm(addr_for_validation)
-        geocode_status = llm_result["status"]
-        geocode_detail = llm_result["detail"]
-    except Exception as e:
-        geocode_status = "ERROR"
-        geocode_detail = f"API_ERROR: Address validation failed — {str(e)}"
-
-    geo_comparison = f"""
-### GEOGRAPHIC LOCATION COMPARISON
-| Field                 | Value                                              |
-|-----------------------|----------------------------------------------------|
-| IP City               | {ip_city}                                          |
-| IP Province           | {payload.ip_info.get('ip_region', 'unknown')}      |
-| Delivery City         | {addr_city}                                        |
-| Delivery State/Prov   | {payload.address.get('state', 'unknown')}          |
-| Delivery Postal Code  | {postal_code}                                      |
-| Delivery Country      | {user_country}                                     |
-
----
-### GEO-VERIFICATION RESULTS
-- **City Lookup:** {city_data_str}
-- **Postal Code Lookup:** {zip_data_str}
-
----
-### GEOCODING RESULT (OpenCage — Full Address Lookup)
-- **Status:** {geocode_status}
-- **Detail:** {geocode_detail}
-
-### CRITICAL GEO-RISK INSTRUCTIONS (Rules 5 & 6):
-1. **Rule #5 (City Verification):**
-   - If city lookup says VERIFIED (ZipcodeStack or Nominatim) → Rule #5 triggered: false.
-   - If city lookup says NOT FOUND → USE YOUR (LLM) KNOWLEDGE. If '{addr_city}' is a real city in '{user_country}' (e.g., Faisalabad in Pakistan), Rule #5 should be TRIGGERED: FALSE. Only trigger if the city is clearly fake or in the wrong country.
-   
-2. **Rule #6 (Postal Code Verification):**
-   - **Scenario 1 - API DATA FOUND:** Compare the ZipcodeStack API's City, State, and Country against the delivery address CASE-INSENSITIVELY (ignore letter casing, e.g., 'punjab' == 'Punjab', 'lahore' == 'Lahore'). Also accept common abbreviations ('PK' == 'Pakistan', 'PB' == 'Punjab').
-     - If all three match (case-insensitive, accounting for abbreviations): Rule #6 triggered: false. Explanation must say: "The postal code '{postal_code}' is confirmed to match city '{addr_city}', state '{payload.address.get('state', 'unknown')}', and country '{user_country}' — verified by ZipcodeStack API."
-     - If City and Country match but State mismatches: USE YOUR KNOWLEDGE. You have the flexibility to accept it if the postal code is logically related to the known correct state or if it's a known formatting issue. In this case, Rule #6 triggered: false.
-     - If the postal code is TOTALLY OPPOSITE to the provided city '{addr_city}', state '{payload.address.get('state', 'unknown')}', and country '{user_country}': Rule #6 triggered: true. Add a severe explanation highlighting the total mismatch.
-   - **Scenario 2 - API DATA NOT FOUND or API ERROR:** Use your internal LLM knowledge to verify. Check:
-      1. Is the city '{addr_city}' actually in country '{user_country}'?
-      2. Is postal code '{postal_code}' a known/real postal code for '{addr_city}' in '{user_country}'?
-      - **If your knowledge confirms BOTH are correct -> Rule #6 MUST be triggered: false. Explanation: "Postal code '{postal_code}' confirmed for '{addr_city}', '{user_country}' via LLM knowledge (API data unavailable)."**
-      - The API being unavailable is NEVER by itself a reason to trigger Rule #6. Only trigger if your knowledge says the postal code is CLEARLY WRONG for the given city/country.
-      - Comparisons are case-insensitive. Minor differences ('punjab' vs 'Punjab') are NOT mismatches.
-      - If the postal code is obviously wrong for the city/country based on your knowledge: Rule #6 triggered: true. Explain the mismatch clearly.
-"""
-
-    # Serialize order data without historical_context to avoid sending it twice
-    order_data_json = payload.model_dump_json(exclude={"historical_context"})
-
-    prompt = f"""
-You are an enterprise-grade Fraud Detection and Risk Scoring assistant.
-
-Your job is to analyze incoming e-commerce orders and produce a structured, precise JSON result.
-
-### INPUT DATA
-{order_data_json}
-
-{hist_ctx}
-
-{geo_comparison}
-
-### OUTPUT JSON FORMAT (MANDATORY)
-Your output MUST be valid JSON only, NOTHING else.
-
-Provide exactly these fields:
-{{
-"order_id": "<string>",
-"risk_score": <number 0-40>,
-"risk_flags": [
-{{
-"rule_id": <number>,
-"rule_name": "<string>",
-"triggered": <boolean>,
-"confidence": <0-1 float>,
-"explanation": "<string>"
-}}
-],
-"recommended_action": "<ship | manual_review>",
-"verification_suggestions": [
-"<string>"
-],
-"summary": "<string concise summary>"
-}}
-
-### RISK SCORING RULES (10 rules total)
-You MUST evaluate ALL 10 rules and include ALL 10 in the `risk_flags` array.
-
---- PASSED CHECKS (informational, always triggered: false, +0 points) ---
-
-1. Specific Email and Phone: +0 (PASSED CHECK — always triggered: false)
-   - This confirms: one customer = one unique email + one unique phone.
-   - Explanation: "This customer has a specific email and phone number associated with their account."
-
-2. Delivery City Verification: +0 (PASSED CHECK — always triggered: false)
-   - USE the GEO-VERIFICATION RESULTS above. Compare CASE-INSENSITIVELY.
-   - If city is verified by API or LLM knowledge -> triggered: false. Specify the source.
-   - If city is NOT found -> USE YOUR KNOWLEDGE. If '{addr_city}' is a real city in '{user_country}', then triggered: false.
-   - Only fail this check if the city is CLEARLY FAKE or in the WRONG COUNTRY.
-
---- RISK RULES (triggered: true adds score) ---
-
-3. Hurry Order Booking: +5 (USE `same_person_orders` data from DATABASE)
-   - This rule checks if the same person (same email) is ordering too fast.
-   - Check these THREE conditions (ANY one triggers the rule):
-     a) Minutes since last order < 10 (too fast — must wait at least 10 minutes between orders)
-     b) Orders in last 24 hours > 2 (maximum 2 orders per 24 hours)
-     c) Orders in last 7 days > 14 (maximum 14 orders per 7 days)
-   - IF `minutes_since_last_order` is null or 'N/A' -> this is the first order, triggered: false.
-   - IF any of conditions a/b/c is true -> triggered: true. Explain which condition failed.
-   - IF all conditions are within limits -> triggered: false. State the actual values.
-
-4. Different Name with Same Address: +5 (USE `address_history.other_names_at_this_address` from DATABASE)
-   - Check if a DIFFERENT-named customer has previously ordered to the same delivery address.
-   - IF the list is NOT empty -> triggered: true. Name the other customer(s).
-   - IF the list IS empty -> triggered: false. Say: "No other customers have ordered to this address."
-   - NOTE: Multiple customers at the same address is allowed — this is just a mild flag for awareness.
-
-5. Postal Code Validation: +5 (USE GEO-VERIFICATION RESULTS)
-   - Evaluate the postal code using the API result or LLM knowledge.
-   - MANDATORY COUNTRY CHECK: First, compare the provided country against the API/LLM country for this postal code. If they do NOT match, Rule 5 is triggered: true (+5 pts).
-   - OPTIONAL STATE/PROVINCE CHECK: 
-     - If the user explicitly provided a state/province (not blank/unknown/None), compare it to the API/LLM state. If there is a clear mismatch, Rule 5 is triggered: true (+5 pts).
-     - If the user left the state/province blank (or it is unknown), DO NOT assign any risk for the missing state. Skip the state check entirely!
-   - PASSED CHECK EXCEPTION: If the API data is missing/mismatched but your internal LLM knowledge confirms the postal code matches the city AND the country matches, THIS IS A PASSED CHECK. Set `triggered: false`.
-   - Treat Rule 5 as a single single rule that maxes at +5 pts if ANY of the above mismatches occur.
-   - IF country or explicit-state mismatches -> triggered: true (+5 pts). State the reason.
-   - IF country matches AND (explicit state matches OR state was left blank) -> triggered: false.
-
-6. Duplicate Email — Different Identity: +5 (USE `duplicate_email_matches` from DATABASE)
-   - MUST check the `duplicate_email_matches` list from the database.
-   - IF the list is NOT empty -> triggered: true. Name the other person using this email.
-   - IF the list IS empty -> triggered: false. Say: "This email is unique — no other person uses it."
-   - NEVER invent names. Only use names from the database list.
-
-7. Duplicate Phone — Different Identity: +5 (USE `duplicate_phone_matches` from DATABASE)
-   - MUST check the `duplicate_phone_matches` list from the database.
-   - IF the list is NOT empty -> triggered: true. Name the other person using this phone.
-   - IF the list IS empty -> triggered: false. Say: "This phone number is unique — no other person uses it."
-   - NEVER invent names. Only use names from the database list.
-
-8. City Name Mismatch (Delivery Address vs City Box): +5
-   - Compare the city explicitly entered in the 'City' field (`{addr_city}`) with the actual text inside the 'Delivery Address' (`{addr_street}`).
-   - Very often, users type their street address AND their city in the 'Delivery Address' box (e.g. '8998 b - Block, Military Account, lahore').
-   - If the text in the Delivery Address clearly indicates a DIFFERENT city than the one in the City box (e.g., Address says 'lahore', but City says 'peshawar'):
-     - Rule #8 triggered: true (+5 pts).
-     - Explanation MUST dynamically detail both cities: "City name is not matched. Delivery address implies city is [City from Address], but the explicitly provided city is {addr_city}."
-   - If they match, or if the Delivery Address doesn't explicitly mention a conflicting city:
-     - Rule #8 triggered: false. Say: "City implicitly matches or no contradictory city found in the delivery address."
-
-9. Phone Number VS Country Name: +5
-   - You are an expert international phone number formatter and validator.
-   - Raw input phone: `{phone_number}`
-   - **IMPORTANT: Do NOT compare the phone number's country code against the user's selected country.
-     Only validate that the phone number itself is structurally correct and well-formed.**
-
-   ─────────────────────────────────────────────────────────────────
-   STEP 0 — NORMALISE TO E.164 (ALWAYS do this first, before anything else)
-   ─────────────────────────────────────────────────────────────────
-   E.164 normalisation rules:
-     1. Output MUST start with a plus sign (+).
-     2. If the number already has a '+' prefix with a valid calling code, keep it as-is.
-     3. If the number has NO country code, use `{user_country}` only to determine the calling code to prepend.
-     4. Strip all spaces, hyphens, dots, parentheses, and other separators from the input.
-     5. Remove any local trunk / STD prefix (leading '0', '00') BEFORE adding the country code.
-     6. After the '+' there must be ONLY digits — no spaces or separators.
-     7. If the number is completely unparseable → triggered: true, explanation: 'Input phone number is invalid or ambiguous.'
-
-   Country calling code reference:
-     Pakistan=+92 | India=+91 | US/Canada=+1 | UK=+44 | Australia=+61 | UAE=+971
-     Saudi Arabia=+966 | Germany=+49 | France=+33 | Brazil=+55 | China=+86
-     Nigeria=+234 | South Africa=+27 | Bangladesh=+880 | Italy=+39 | Japan=+81
-     Turkey=+90 | Egypt=+20 | Argentina=+54 | Mexico=+52
-
-   After normalisation, use the resulting E.164 number for all further steps.
-
-   ─────────────────────────────────────────────────────────────────
-   STEP 1 — DETECT COUNTRY CODE from the normalised E.164 number
-   ─────────────────────────────────────────────────────────────────
-   Extract calling-code prefix from the normalised number to determine WHICH country's
-   pattern rules to apply to validate this number:
-     +92=Pakistan | +91=India | +1=US/Canada | +44=UK | +61=Australia
-     +971=UAE | +966=Saudi Arabia | +49=Germany | +33=France | +55=Brazil
-     +86=China | +234=Nigeria | +27=South Africa | +880=Bangladesh
-     +39=Italy | +81=Japan | +90=Turkey | +20=Egypt | +54=Argentina | +52=Mexico
-
-   ─────────────────────────────────────────────────────────────────
-   STEP 2 — NATIONAL FORMAT VALIDATION
-   ─────────────────────────────────────────────────────────────────
-   Validate the digit count and first-digit rules for the detected country code.
-   Count the digits AFTER the country code prefix in the normalised E.164 number.
-
-   Country       | Code | Digits after code | First digit rule
-   --------------|------|-------------------|---------------------------------
-   Pakistan      | +92  | EXACTLY 10        | MUST start with 3
-   India         | +91  | EXACTLY 10        | MUST start with 6, 7, 8, or 9
-   US / Canada   | +1   | EXACTLY 10        | No restriction
-   UK            | +44  | 9 or 10           | Mobile: starts with 7
-   Australia     | +61  | EXACTLY 9         | Mobile: starts with 4
-   UAE           | +971 | EXACTLY 9         | Mobile: starts with 5
-   Saudi Arabia  | +966 | EXACTLY 9         | Mobile: starts with 5
-   Bangladesh    | +880 | EXACTLY 10        | Mobile: starts with 1
-   Nigeria       | +234 | EXACTLY 10        | No restriction
-   South Africa  | +27  | EXACTLY 9         | No restriction
-   China         | +86  | EXACTLY 11        | Mobile prefix 130-199
-   Brazil        | +55  | 10 or 11          | No restriction
-   Unknown code  |  —   | 2–15 digits total  | No restriction (just check total length)
-
-   - E.164 total length (country code digits + national digits) must NEVER exceed 15.
-   - IF digit count OR starting digit fails -> triggered: true (+5 pts).
-   - IF all checks pass -> triggered: false. No further sub-checks required.
-
-   ─────────────────────────────────────────────────────────────────
-   WORKED EXAMPLES
-   ─────────────────────────────────────────────────────────────────
-
-   Ex 1 — Valid Pakistan number (+923217869933):
-     Input: '+923217869933'
-     Step 0: Already E.164 -> normalised: +923217869933
-     Step 1: Code = +92 -> Pakistan rules apply
-     Step 2: National = '3217869933' -> 10 digits, starts with 3 [OK]
-     Result: triggered=false, explanation='Phone number +923217869933 belongs to Pakistan (code +92). Phone number and customer country are matched.'
-
-   Ex 2 — Another valid Pakistan number (03012345678):
-     Input: '03012345678'
-     Step 0: Strip leading 0 -> '3012345678'; add +92 -> normalised: +923012345678
-     Step 1: Code = +92 -> Pakistan rules apply
-     Step 2: National = '3012345678' -> 10 digits, starts with 3 [OK]
-     Result: triggered=false, explanation='Phone number +923012345678 belongs to Pakistan (code +92). Phone number and customer country are matched.'
-
-   Ex 3 — Incomplete Pakistan number:
-     Input: '+9233'
-     Step 0: Already E.164 -> normalised: +9233
-     Step 1: Code = +92 -> Pakistan rules apply
-     Step 2: National = '33' -> only 2 digits; MUST be EXACTLY 10 [FAIL]
-     Result: triggered=true (+5 pts), explanation='Pakistani mobile numbers must be exactly 10 digits after +92, but only 2 found.'
-
-   Ex 4 — Valid UK mobile:
-     Input: '+44 7911-123 456'
-     Step 0: Strip separators -> normalised: +447911123456
-     Step 1: Code = +44 -> UK rules apply
-     Step 2: National = '7911123456' -> 10 digits, starts with 7 [OK]
-     Result: triggered=false, explanation='Phone number +447911123456 belongs to UK (code +44). Phone number and customer country are matched.'
-
-   Ex 5 — Valid India number on any order:
-     Input: '+919812345678'
-     Step 0: Already E.164 -> normalised: +919812345678
-     Step 1: Code = +91 -> India rules apply
-     Step 2: National = '9812345678' -> 10 digits, starts with 9 [OK]
-     Result: triggered=false, explanation='Phone number +919812345678 belongs to India (code +91). Phone number and customer country are matched.'
-
-   ─────────────────────────────────────────────────────────────────
-   DECISION:
-   - ANY failure in Steps 0 or 2 -> triggered: true (+5 pts).
-   - ALL steps pass -> triggered: false, +0 pts. Explanation MUST say: 'Phone number <E.164> belongs to <Country> (code <+XX>). Phone number and customer country are matched.'
-   - NEVER trigger this rule because of a country name mismatch — only structural pattern failures count.
-
-
-10. Delivery Address Details (LLM Validation): +5
-    - USE the **GEOCODING RESULT** section above (now powered by LLM address validation).
-    - If geocode_status = "VALID":
-      -> triggered: false.
-      -> Copy the detail string as the explanation: it contains the normalized address.
-    - If geocode_status = "INVALID":
-      -> triggered: true (+5 pts).
-      -> explanation: Use the detail string which explains exactly why the address is invalid.
-    - If geocode_status = "ERROR" (validation call failed):
-      -> triggered: false (benefit of the doubt — do not penalise on API/system failure).
-      -> explanation: "Address validation service unavailable — delivery address validation skipped for this order."
-
-### RISK BAND RULES (NEVER deviate):
-- If total risk score is EXACTLY 0 -> recommended_action MUST be "ship" (No Risk)
-- If total risk score is 1 to 40 -> recommended_action MUST be "manual_review" (Chances of Risk Delivery)
-
-### CRITICAL INSTRUCTIONS:
-1. You MUST include ALL 10 rules in the `risk_flags` array.
-2. The `risk_score` MUST be the exact sum of weights of triggered rules (each triggered risk rule = +5), with a maximum possible score of 40 (8 penalty rules × 5 pts).
-3. If 0 risk rules triggered -> risk_score = 0, action = "ship".
-4. NEVER hallucinate or invent data. Only use what is in the DATABASE CONTEXT and INPUT DATA.
-5. For Rule 3 (Hurry Order Booking): if minutes_since_last_order is null, it is a FIRST ORDER — do NOT trigger.
-6. For Rules 6 and 7: if the database list says "None found", the rule MUST be triggered: false.
-7. For Rule 10 (Delivery Address Details): ONLY use the GEOCODING RESULT section above. Do not decide based on your LLM knowledge — the API result is authoritative.
-8. SUMMARY: Write 2-3 sentences describing what was found and the recommended action.
-"""
-
+        logger.info(
+            "Prompt size for order %s: static ~%d tokens, order block ~%d tokens; usage prompt=%d completion=%d; %.0f ms",
+            order_id, report["static_tokens_est"], report["order_tokens_est"],
+            completion.prompt_tokens, completion.completion_tokens, (time.perf_counter() - started) * 1000,
+        )
+        return parse_llm_assessment(completion.content, pending)
 
+    hints = deterministic_hints(facts, pending)
     try:
-        completion = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[
-                {"role": "system", "content": "You are a fraud detection JSON API. Output strictly JSON."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0,
-            response_format={"type": "json_object"}
+        llm_result = await app.state.cascade.run(
+            "assessment",
+            small=small_tier,
+            large=large_tier,
+            agree=lambda a, b: all(a.triggered(r) == b.triggered(r) for r in pending),
+            contradicts=lambda v: any(v.triggered(r) is not expected for r, expected in hints.items()),
         )
-        return completion.choices[0].message.content
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        # An LLM that is down (circuit open, out of time, 5xx / 429 after the
+        # gateway's retries) gets the same benefit of the doubt as a rule the LLM
+        # left out: the pending rules count as not triggered and the decided ones
+        # still score the order. Anything else is a bug and fails the request.
+        if isinstance(e, CircuitOpenError):
+            reason = "circuit_open"
+        elif isinstance(e, DeadlineExceeded):
+            reason = "deadline"
+        elif is_retryable(e):
+            reason = "upstream_error"
+        else:
+            raise HTTPException(status_code=500, detail=str(e))
+        logger.warning("Order %s: assessed without the LLM (%s)", order_id, e)
+        METRICS.inc("ai_llm_unavailable_total", reason=reason)
+        annotate(llm_unavailable=str(e))
+        flags = list(decided.values()) + [make_flag(r, False, LLM_UNAVAILABLE_EXPLANATION, confidence=0.0) for r in pending]
+        return build_assessment(order_id, flags), degraded + ["llm"]
+    if llm_result.rejected:
+        logger.warning("Order %s: dropped %d LLM flag(s): %s", order_id, len(llm_result.rejected), "; ".join(llm_result.rejected))
+        METRICS.inc("ai_llm_flags_rejected_total", len(llm_result.rejected))
+
+    flags = list(decided.values())
+    for rule_id in pending:
+        flag = llm_result.flags.get(rule_id)
+        if flag is None:
+            flag = make_flag(rule_id, False, "Rule was not evaluated by the LLM.", confidence=0.0)
+        flags.append(flag)
+    return build_assessment(
+        order_id,
+        flags,
+        summary=llm_result.summary,
+        suggestions=llm_result.suggestions,
+    ), degraded
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Production run mode (worker processes, shared caches); see serve.py
+    from serve import main as serve
+    raise SystemExit(serve())
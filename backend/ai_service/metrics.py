@@ -0,0 +1,167 @@
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+trace_logger = logging.getLogger("ai_service.trace")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(key) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+class Metrics:
+    """Minimal in-process metrics registry rendered in the Prometheus text format."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self._lock = threading.Lock()
+        self._buckets = buckets
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, List[float]]] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, Dict[str, Any], float]]]] = []
+
+    def describe(self, name: str, kind: str, help_text: str) -> None:
+        self._help[name] = (kind, help_text)
+
+    def inc(self, name: str, value: float = 1.0, **labels: Any) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            # [bucket counts..., sum, count]
+            state = series.get(key)
+            if state is None:
+                state = series[key] = [0.0] * (len(self._buckets) + 2)
+            for i, bound in enumerate(self._buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def register_collector(self, collector: Callable[[], Iterable[Tuple[str, str, str, Dict[str, Any], float]]]) -> None:
+        """`collector()` yields `(name, kind, help, labels, value)` samples at scrape time."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                kind, help_text = self._help.get(name, ("counter", name))
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+                for key, value in series.items():
+                    lines.append(f"{name}{_format_labels(key)} {value:g}")
+            for name, series in sorted(self._histograms.items()):
+                _, help_text = self._help.get(name, ("histogram", name))
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+                for key, state in series.items():
+                    for i, bound in enumerate(self._buckets):
+                        lines.append(f"{name}_bucket{_format_labels(key, ('le', f'{bound:g}'))} {state[i]:g}")
+                    lines.append(f"{name}_bucket{_format_labels(key, ('le', '+Inf'))} {state[-1]:g}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {state[-2]:.6f}")
+                    lines.append(f"{name}_count{_format_labels(key)} {state[-1]:g}")
+        described = set()
+        for collector in self._collectors:
+            for name, kind, help_text, labels, value in collector():
+                if name not in described:
+                    lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+                    described.add(name)
+                lines.append(f"{name}{_format_labels(_label_key(labels))} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+METRICS = Metrics()
+METRICS.describe("ai_stage_duration_seconds", "histogram", "Wall time of each pipeline stage.")
+METRICS.describe("ai_stage_calls_total", "counter", "Pipeline stage executions by outcome (ok, error, timeout).")
+METRICS.describe("ai_llm_requests_total", "counter", "LLM completion attempts by model and outcome.")
+METRICS.describe("ai_llm_duration_seconds", "histogram", "LLM completion latency by model.")
+METRICS.describe("ai_llm_tokens_total", "counter", "Tokens reported by the LLM provider, by model and kind.")
+METRICS.describe("ai_upstream_requests_total", "counter", "Geo API requests by host and outcome.")
+METRICS.describe("ai_upstream_duration_seconds", "histogram", "Geo API request latency by host.")
+METRICS.describe("ai_llm_flags_rejected_total", "counter", "LLM risk flags dropped by response validation.")
+METRICS.describe("ai_orders_total", "counter", "Orders assessed, by whether the main LLM call was needed.")
+
+
+# ---- per-request traces ----
+
+_current_trace: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar("ai_trace", default=None)
+TRACE_LOG = os.getenv("TRACE_LOG", "0") == "1"
+
+
+@contextmanager
+def request_trace(**attrs: Any):
+    """Collect the spans of one request; emitted as one JSON log line when TRACE_LOG=1."""
+    trace = {"trace_id": uuid.uuid4().hex, **attrs, "spans": []}
+    token = _current_trace.set(trace)
+    started = time.perf_counter()
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+        trace["duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        if TRACE_LOG:
+            trace_logger.info(json.dumps(trace, default=str))
+
+
+def record_span(stage: str, seconds: float, outcome: str, **attrs: Any) -> None:
+    """Record one finished stage in the histogram / counters and the current trace."""
+    METRICS.observe("ai_stage_duration_seconds", seconds, stage=stage)
+    METRICS.inc("ai_stage_calls_total", stage=stage, outcome=outcome)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace["spans"].append({"stage": stage, "ms": round(seconds * 1000, 2), "outcome": outcome, **attrs})
+
+
+@contextmanager
+def span(stage: str, **attrs: Any):
+    """Time a block as a pipeline stage; exceptions are counted as errors and re-raised."""
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except asyncio.TimeoutError:
+        outcome = "timeout"
+        raise
+    except Exception:
+        outcome = "error"
+        raise
+    finally:
+        record_span(stage, time.perf_counter() - started, outcome, **attrs)
+
+
+def annotate(**attrs: Any) -> None:
+    """Attach attributes (cache hits, fast-path decisions, ...) to the current trace."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.update(attrs)
@@ -0,0 +1,180 @@
+import re
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from countries import country_name, resolve_iso2
+
+# ISO2 -> (calling code, allowed national number lengths or None, required first digits or None, trunk prefix)
+# Lengths / first digits mirror the Rule 9 table; countries without an entry there only get the
+# generic E.164 check (2-15 digits in total).
+PHONE_PLANS: Dict[str, Tuple[str, Optional[Tuple[int, ...]], Optional[str], str]] = {
+    "PK": ("92", (10,), "3", "0"),
+    "IN": ("91", (10,), "6789", "0"),
+    "US": ("1", (10,), None, "1"),
+    "CA": ("1", (10,), None, "1"),
+    "GB": ("44", (9, 10), None, "0"),
+    "AU": ("61", (9,), None, "0"),
+    "AE": ("971", (9,), None, "0"),
+    "SA": ("966", (9,), None, "0"),
+    "BD": ("880", (10,), None, "0"),
+    "NG": ("234", (10,), None, "0"),
+    "ZA": ("27", (9,), None, "0"),
+    "CN": ("86", (11,), "1", "0"),
+    "BR": ("55", (10, 11), None, "0"),
+    "AR": ("54", None, None, "0"),
+    "AT": ("43", None, None, "0"),
+    "BE": ("32", None, None, "0"),
+    "BH": ("973", None, None, ""),
+    "CH": ("41", None, None, "0"),
+    "CL": ("56", None, None, ""),
+    "CO": ("57", None, None, ""),
+    "CZ": ("420", None, None, ""),
+    "DE": ("49", None, None, "0"),
+    "DK": ("45", None, None, ""),
+    "EG": ("20", None, None, "0"),
+    "ES": ("34", None, None, ""),
+    "FI": ("358", None, None, "0"),
+    "FR": ("33", None, None, "0"),
+    "GR": ("30", None, None, ""),
+    "HK": ("852", None, None, ""),
+    "ID": ("62", None, None, "0"),
+    "IE": ("353", None, None, "0"),
+    "IL": ("972", None, None, "0"),
+    "IQ": ("964", None, None, "0"),
+    "IR": ("98", None, None, "0"),
+    "IT": ("39", None, None, ""),
+    "JP": ("81", None, None, "0"),
+    "KE": ("254", None, None, "0"),
+    "KR": ("82", None, None, "0"),
+    "KW": ("965", None, None, ""),
+    "LK": ("94", None, None, "0"),
+    "MA": ("212", None, None, "0"),
+    "MX": ("52", None, None, ""),
+    "MY": ("60", None, None, "0"),
+    "NL": ("31", None, None, "0"),
+    "NO": ("47", None, None, ""),
+    "NP": ("977", None, None, "0"),
+    "NZ": ("64", None, None, "0"),
+    "OM": ("968", None, None, ""),
+    "PH": ("63", None, None, "0"),
+    "PL": ("48", None, None, ""),
+    "PT": ("351", None, None, ""),
+    "QA": ("974", None, None, ""),
+    "RU": ("7", None, None, "8"),
+    "SE": ("46", None, None, "0"),
+    "SG": ("65", None, None, ""),
+    "TH": ("66", None, None, "0"),
+    "TR": ("90", None, None, "0"),
+    "UA": ("380", None, None, "0"),
+    "VN": ("84", None, None, "0"),
+}
+
+# Calling code -> ISO2 codes sharing it (e.g. +1 is the whole NANP)
+_BY_CALLING_CODE: Dict[str, Tuple[str, ...]] = {}
+for _iso, (_code, _, _, _) in PHONE_PLANS.items():
+    _BY_CALLING_CODE[_code] = _BY_CALLING_CODE.get(_code, ()) + (_iso,)
+
+_SEPARATORS = re.compile(r"[\s\-().\/]")
+
+
+@dataclass
+class PhoneCheck:
+    """Local E.164 normalisation result plus the Rule 9 verdict."""
+    raw: str
+    e164: Optional[str]
+    iso2: Optional[str]
+    calling_code: Optional[str]
+    valid: bool
+    country_matches: Optional[bool]
+    explanation: str
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def _split_calling_code(digits: str, preferred_iso: Optional[str]) -> Optional[Tuple[str, str, str]]:
+    """Split international digits into (iso2, calling code, national number)."""
+    for size in (1, 2, 3):
+        code = digits[:size]
+        isos = _BY_CALLING_CODE.get(code)
+        if isos:
+            iso = preferred_iso if preferred_iso in isos else isos[0]
+            return iso, code, digits[size:]
+    return None
+
+
+def _drop_trunk(iso: str, national: str) -> str:
+    """Strip a national trunk prefix written after the calling code (+92 0300...,
+    +44 07911...). For plans with fixed lengths only when that makes the length fit;
+    without them only a "0" trunk, since e.g. Russian area codes may start with 8."""
+    _, lengths, _, trunk = PHONE_PLANS[iso]
+    if not trunk or not national.startswith(trunk):
+        return national
+    stripped = national[len(trunk):]
+    if lengths:
+        return stripped if len(national) not in lengths and len(stripped) in lengths else national
+    return stripped if trunk == "0" else national
+
+
+def _verdict(raw: str, iso: str, code: str, national: str, user_iso: Optional[str]) -> PhoneCheck:
+    _, lengths, first_digits, _ = PHONE_PLANS[iso]
+    e164 = f"+{code}{national}"
+    name = country_name(iso)
+    country_matches = (user_iso in _BY_CALLING_CODE[code]) if user_iso else None
+
+    failure = None
+    total = len(code) + len(national)
+    if total > 15 or total < 2:
+        failure = f"E.164 numbers must have 2-15 digits in total, but {e164} has {total}."
+    elif lengths and len(national) not in lengths:
+        expected = " or ".join(str(n) for n in lengths)
+        failure = f"{name} numbers must be exactly {expected} digits after +{code}, but {len(national)} found."
+    elif first_digits and not national.startswith(tuple(first_digits)):
+        failure = f"{name} numbers must start with {' / '.join(first_digits)} after +{code}, but {e164} does not."
+
+    if failure:
+        return PhoneCheck(raw, e164, iso, code, False, country_matches, failure)
+    if country_matches is False:
+        explanation = (
+            f"Phone number {e164} belongs to {name} (code +{code}) and is well-formed; "
+            f"the customer's country differs, which is informational only."
+        )
+    else:
+        explanation = f"Phone number {e164} belongs to {name} (code +{code}). Phone number and customer country are matched."
+    return PhoneCheck(raw, e164, iso, code, True, country_matches, explanation)
+
+
+def check_phone(raw_phone: str, country: Optional[str]) -> Optional[PhoneCheck]:
+    """Normalise `raw_phone` to E.164 and validate it against the national plan.
+
+    Returns None when the number cannot be classified locally (unknown calling
+    code, or a national-format number for an unknown customer country)."""
+    user_iso = resolve_iso2(country)
+    if raw_phone is None:
+        return None
+    cleaned = _SEPARATORS.sub("", str(raw_phone).strip())
+    if cleaned.startswith("00"):
+        cleaned = "+" + cleaned[2:]
+
+    if cleaned.startswith("+"):
+        digits = cleaned[1:]
+        if not digits.isdigit():
+            return PhoneCheck(raw_phone, None, None, None, False, None, "Input phone number is invalid or ambiguous.")
+        split = _split_calling_code(digits, user_iso)
+        if split is None:
+            return None
+        iso, code, national = split
+        return _verdict(raw_phone, iso, code, _drop_trunk(iso, national), user_iso)
+
+    if not cleaned.isdigit():
+        return PhoneCheck(raw_phone, None, None, None, False, None, "Input phone number is invalid or ambiguous.")
+    if user_iso is None or user_iso not in PHONE_PLANS:
+        return None
+
+    code, lengths, _, trunk = PHONE_PLANS[user_iso]
+    # Digits that already carry the country code without '+' (e.g. 923001234567)
+    if cleaned.startswith(code) and lengths and len(cleaned) - len(code) in lengths:
+        return _verdict(raw_phone, user_iso, code, cleaned[len(code):], user_iso)
+    national = cleaned[len(trunk):] if trunk and cleaned.startswith(trunk) else cleaned
+    return _verdict(raw_phone, user_iso, code, national, user_iso)
+
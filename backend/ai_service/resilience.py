@@ -0,0 +1,237 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+from metrics import METRICS
+
+logger = logging.getLogger("ai_service.resilience")
+
+T = TypeVar("T")
+
+METRICS.describe("ai_circuit_rejections_total", "counter", "Calls skipped because the dependency's circuit was open.")
+METRICS.describe("ai_circuit_transitions_total", "counter", "Circuit breaker state changes by dependency and new state.")
+METRICS.describe("ai_upstream_hedges_total", "counter", "Hedged duplicate geo requests, by which request answered first.")
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit is open."""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"{name} is unavailable (circuit open, retry in {retry_in:.0f}s)")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """The latency budget for a call ran out."""
+
+
+class Deadline:
+    """Absolute latency budget shared by every attempt of one logical call."""
+
+    def __init__(self, seconds: float, clock=time.monotonic):
+        self.seconds = seconds
+        self._clock = clock
+        self.expires_at = clock() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - self._clock())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker.
+
+    After `failure_threshold` failures in a row the circuit opens and calls are
+    rejected immediately for `reset_timeout` seconds; then one trial call is let
+    through (half-open) and its outcome closes or re-opens the circuit."""
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_started: Optional[float] = None
+        _BREAKERS[name] = self
+
+    def _transition(self, state: str) -> None:
+        if state != self.state:
+            self.state = state
+            METRICS.inc("ai_circuit_transitions_total", dependency=self.name, state=state)
+            log = logger.warning if state == OPEN else logger.info
+            log("Circuit for %s is now %s", self.name, state)
+
+    def allow(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._transition(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            now = self._clock()
+            # A trial whose caller was cancelled never reports back; let another through
+            if self._trial_started is None or now - self._trial_started >= self.reset_timeout:
+                self._trial_started = now
+                return True
+        return False
+
+    def retry_in(self) -> float:
+        return max(0.0, self.reset_timeout - (self._clock() - self._opened_at))
+
+    def check(self) -> None:
+        """Raise CircuitOpenError unless a call may go ahead now."""
+        if not self.allow():
+            METRICS.inc("ai_circuit_rejections_total", dependency=self.name)
+            raise CircuitOpenError(self.name, self.retry_in())
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._trial_started = None
+        self._transition(CLOSED)
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        self._trial_started = None
+        if self.state == HALF_OPEN or self._failures >= self.failure_threshold:
+            self._opened_at = self._clock()
+            self._transition(OPEN)
+
+
+# Latest breaker per dependency name, for the ai_circuit_state gauge
+_BREAKERS: Dict[str, CircuitBreaker] = {}
+
+
+def _breaker_samples():
+    for breaker in list(_BREAKERS.values()):
+        yield "ai_circuit_state", "gauge", "Circuit state per dependency (0 closed, 1 half-open, 2 open).", {"dependency": breaker.name}, _STATE_VALUES[breaker.state]
+
+
+METRICS.register_collector(_breaker_samples)
+
+
+class LatencyTracker:
+    """Rolling window of recent latencies for picking the hedge delay."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self._samples: Deque[float] = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+
+async def hedged(fn: Callable[[], Awaitable[T]], delay: float, on_hedge: Optional[Callable[[bool], None]] = None) -> T:
+    """Run `fn()`; if it has not answered after `delay` seconds, start a second
+    identical call and return whichever succeeds first (the other is cancelled).
+    Only for idempotent requests. `on_hedge(hedge_won)` reports hedged calls."""
+    primary = asyncio.ensure_future(fn())
+    backup: Optional[asyncio.Future] = None
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+        backup = asyncio.ensure_future(fn())
+        pending = {primary, backup}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if on_hedge is not None:
+                        on_hedge(task is backup)
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in (primary, backup):
+            if task is not None and not task.done():
+                task.cancel()
+
+
+class Upstream:
+    """Resilience policy for one dependency: circuit breaker, per-call deadline
+    and (optionally) a hedged duplicate after the recent p95 latency.
+
+    `is_failure(result)` lets answers such as HTTP 5xx count against the
+    circuit without being raised."""
+
+    def __init__(
+        self,
+        name: str,
+        timeout: float,
+        breaker: Optional[CircuitBreaker] = None,
+        hedge: bool = False,
+        hedge_min_delay: float = 0.05,
+        hedge_max_delay: float = 1.0,
+        hedge_default_delay: float = 0.5,
+    ):
+        self.name = name
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker(name)
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_max_delay = hedge_max_delay
+        self.hedge_default_delay = hedge_default_delay
+        self.latency = LatencyTracker()
+
+    def hedge_delay(self) -> float:
+        p95 = self.latency.percentile(95)
+        if p95 is None:
+            return self.hedge_default_delay
+        return min(max(p95, self.hedge_min_delay), self.hedge_max_delay)
+
+    async def _timed(self, fn: Callable[[], Awaitable[T]]) -> T:
+        started = time.perf_counter()
+        try:
+            return await fn()
+        finally:
+            # Attempts cut off by the deadline or by the winning hedge count too, at
+            # the time they had run: leaving them out would pull the p95 down
+            self.latency.record(time.perf_counter() - started)
+
+    def _hedge_outcome(self, hedge_won: bool) -> None:
+        METRICS.inc("ai_upstream_hedges_total", dependency=self.name, winner="hedge" if hedge_won else "primary")
+
+    async def call(self, fn: Callable[[], Awaitable[T]], is_failure: Optional[Callable[[T], bool]] = None, deadline: Optional[Deadline] = None) -> T:
+        self.breaker.check()
+        timeout = self.timeout if deadline is None else min(self.timeout, deadline.remaining())
+        attempt = (lambda: hedged(lambda: self._timed(fn), self.hedge_delay(), self._hedge_outcome)) if self.hedge else (lambda: self._timed(fn))
+        try:
+            result = await asyncio.wait_for(attempt(), timeout=timeout)
+        except asyncio.TimeoutError:
+            self.breaker.record_failure()
+            raise DeadlineExceeded(f"{self.name} did not answer within {timeout:.1f}s") from None
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        if is_failure is not None and is_failure(result):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return result
+
+
+def breaker_from_env(name: str) -> CircuitBreaker:
+    """Breaker using BREAKER_FAILURES consecutive failures / BREAKER_RESET_SECONDS."""
+    return CircuitBreaker(
+        name,
+        failure_threshold=int(os.getenv("BREAKER_FAILURES", "5")),
+        reset_timeout=float(os.getenv("BREAKER_RESET_SECONDS", "30")),
+    )
@@ -0,0 +1,275 @@
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from countries import fold, resolve_iso2
+
+# rule_id -> (rule_name, weight). Keep in sync with the prompt and the NestJS dashboard.
+RULES: Dict[int, tuple] = {
+    1: ("Specific Email and Phone", 0),
+    2: ("Delivery City Verification", 0),
+    3: ("Hurry Order Booking", 5),
+    4: ("Different Name with Same Address", 5),
+    5: ("Postal Code Validation", 5),
+    6: ("Duplicate Email — Different Identity", 5),
+    7: ("Duplicate Phone — Different Identity", 5),
+    8: ("City Name Mismatch", 5),
+    9: ("Phone Number VS Country Name", 5),
+    10: ("Delivery Address Details", 5),
+}
+RULE_WEIGHTS: Dict[int, int] = {rule_id: weight for rule_id, (_, weight) in RULES.items()}
+MAX_RISK_SCORE = 40
+
+# Hurry Order Booking limits (Rule 3)
+MIN_MINUTES_BETWEEN_ORDERS = 10
+MAX_ORDERS_24H = 2
+MAX_ORDERS_7D = 14
+
+VERIFICATION_SUGGESTIONS: Dict[int, str] = {
+    3: "Confirm the rapid repeat orders with the customer before shipping.",
+    4: "Verify the customer's relationship to the other recipients at this address.",
+    5: "Confirm the postal code, city and state with the customer.",
+    6: "Verify the customer's identity; this email is linked to another name.",
+    7: "Verify the customer's identity; this phone number is linked to another name.",
+    8: "Confirm the correct delivery city with the customer.",
+    9: "Call the customer to confirm the phone number is reachable and correct.",
+    10: "Ask the customer for a complete, deliverable address.",
+}
+
+
+def make_flag(rule_id: int, triggered: bool, explanation: str, confidence: float = 1.0) -> Dict[str, Any]:
+    return {
+        "rule_id": rule_id,
+        "rule_name": RULES[rule_id][0],
+        "triggered": triggered,
+        "confidence": confidence,
+        "explanation": explanation,
+    }
+
+
+@dataclass
+class OrderFacts:
+    """Everything the deterministic evaluators read, gathered after enrichment."""
+    addr_street: str
+    addr_city: str
+    addr_state: str
+    postal_code: str
+    user_country: str
+    city_check: str
+    postal_check: Dict[str, Any]
+    address_status: str
+    address_detail: str
+    historical_context: Dict[str, Any] = field(default_factory=dict)
+    phone_check: Optional[Dict[str, Any]] = None
+
+
+def _rule_1(facts: OrderFacts) -> Dict[str, Any]:
+    return make_flag(1, False, "This customer has a specific email and phone number associated with their account.")
+
+
+def _rule_2(facts: OrderFacts) -> Dict[str, Any]:
+    return make_flag(2, False, f"Passed check. City lookup: {facts.city_check}")
+
+
+def _rule_3(facts: OrderFacts) -> Dict[str, Any]:
+    sp = facts.historical_context.get("same_person_orders", {}) or {}
+    mins = sp.get("minutes_since_last_order")
+    last_24h = sp.get("orders_last_24h", 0) or 0
+    last_7d = sp.get("orders_last_7d", 0) or 0
+    if mins is None:
+        return make_flag(3, False, "This is the customer's first order — no previous orders by this email.")
+    failures = []
+    if mins < MIN_MINUTES_BETWEEN_ORDERS:
+        failures.append(f"only {mins} minutes since the last order (minimum {MIN_MINUTES_BETWEEN_ORDERS})")
+    if last_24h > MAX_ORDERS_24H:
+        failures.append(f"{last_24h} orders in the last 24 hours (maximum {MAX_ORDERS_24H})")
+    if last_7d > MAX_ORDERS_7D:
+        failures.append(f"{last_7d} orders in the last 7 days (maximum {MAX_ORDERS_7D})")
+    if failures:
+        return make_flag(3, True, "Hurry order booking: " + "; ".join(failures) + ".")
+    return make_flag(
+        3, False,
+        f"Order pace is within limits: {mins} minutes since last order, {last_24h} orders in 24h, {last_7d} orders in 7 days.",
+    )
+
+
+def _rule_4(facts: OrderFacts) -> Dict[str, Any]:
+    other_names = (facts.historical_context.get("address_history", {}) or {}).get("other_names_at_this_address", []) or []
+    if other_names:
+        return make_flag(4, True, f"Other customers have ordered to this address: {', '.join(other_names)}.")
+    return make_flag(4, False, "No other customers have ordered to this address.")
+
+
+def _duplicate_rule(rule_id: int, matches: List[Dict[str, Any]], kind: str) -> Dict[str, Any]:
+    if matches:
+        names = ", ".join(f"{m.get('name')} ({m.get('email')})" for m in matches)
+        return make_flag(rule_id, True, f"This {kind} is also used by a different person in the database: {names}.")
+    if kind == "email":
+        return make_flag(rule_id, False, "This email is unique — no other person uses it.")
+    return make_flag(rule_id, False, "This phone number is unique — no other person uses it.")
+
+
+def _rule_6(facts: OrderFacts) -> Dict[str, Any]:
+    return _duplicate_rule(6, facts.historical_context.get("duplicate_email_matches", []) or [], "email")
+
+
+def _rule_7(facts: OrderFacts) -> Dict[str, Any]:
+    return _duplicate_rule(7, facts.historical_context.get("duplicate_phone_matches", []) or [], "phone number")
+
+
+def _rule_5(facts: OrderFacts) -> Optional[Dict[str, Any]]:
+    """Decided only when there is nothing to judge: no postcode given, or the lookup
+    matches the delivery city, country and (if given) state exactly. Mismatches and
+    missing lookup data are left to the LLM."""
+    if not facts.postal_code:
+        return make_flag(5, False, "No postal code provided — postal code validation skipped.")
+    match = facts.postal_check.get("match")
+    if not match:
+        return None
+    user_iso = resolve_iso2(facts.user_country)
+    state_ok = not facts.addr_state or fold(facts.addr_state) == fold(match.get("state") or "")
+    if fold(match.get("city") or "") == fold(facts.addr_city) and user_iso and user_iso == resolve_iso2(match.get("country") or "") and state_ok:
+        return make_flag(
+            5, False,
+            f"The postal code '{facts.postal_code}' is confirmed to match city '{facts.addr_city}', "
+            f"state '{facts.addr_state or 'not provided'}', and country '{facts.user_country}' — verified by {match.get('source', 'geo lookup')}.",
+        )
+    return None
+
+
+def _rule_8(facts: OrderFacts) -> Optional[Dict[str, Any]]:
+    """Decided as passed when the delivery address text itself names the city in the City box."""
+    city = fold(facts.addr_city)
+    if city and re.search(rf"(?<!\w){re.escape(city)}(?!\w)", fold(facts.addr_street)):
+        return make_flag(8, False, "City implicitly matches or no contradictory city found in the delivery address.")
+    return None
+
+
+def _rule_9(facts: OrderFacts) -> Optional[Dict[str, Any]]:
+    """Decided from the local E.164 check; numbers it could not classify go to the LLM."""
+    if facts.phone_check is None:
+        return None
+    return make_flag(9, not facts.phone_check["valid"], facts.phone_check["explanation"])
+
+
+def _rule_10(facts: OrderFacts) -> Dict[str, Any]:
+    # The address validation result is authoritative for Rule 10
+    if facts.address_status == "VALID":
+        return make_flag(10, False, facts.address_detail)
+    if facts.address_status == "INVALID":
+        return make_flag(10, True, facts.address_detail)
+    return make_flag(10, False, "Address validation service unavailable — delivery address validation skipped for this order.")
+
+
+_EVALUATORS = {
+    1: _rule_1,
+    2: _rule_2,
+    3: _rule_3,
+    4: _rule_4,
+    5: _rule_5,
+    6: _rule_6,
+    7: _rule_7,
+    8: _rule_8,
+    9: _rule_9,
+    10: _rule_10,
+}
+
+
+def evaluate_deterministic(facts: OrderFacts) -> Dict[int, Dict[str, Any]]:
+    """Evaluate every rule that can be decided from data alone.
+
+    Returns `{rule_id: flag}`; rules missing from the result still need the LLM."""
+    decided = {}
+    for rule_id, evaluator in _EVALUATORS.items():
+        result = evaluator(facts)
+        if result is not None:
+            decided[rule_id] = result
+    return decided
+
+
+def _abbreviates(short: str, full: str) -> bool:
+    """'PB' / 'Punjab', 'NSW' / 'New South Wales', 'Calif' / 'California': the
+    (folded) short form starts like the full one and its letters appear in it in order."""
+    short, full = short.replace(" ", ""), full.replace(" ", "")
+    if len(short) >= len(full) or not short or short[0] != full[0]:
+        return False
+    rest = iter(full)
+    return all(ch in rest for ch in short)
+
+
+def _same_region(a: str, b: str) -> bool:
+    a, b = fold(a), fold(b)
+    return a == b or _abbreviates(a, b) or _abbreviates(b, a)
+
+
+def _postal_match_disagrees(facts: OrderFacts, match: Dict[str, Any]) -> bool:
+    """The lookup names another city, country or state than the order. Fields the
+    lookup left empty and a state written as an abbreviation or short form of the
+    matched one are no disagreement."""
+    match_city = match.get("city") or ""
+    if match_city and fold(match_city) != fold(facts.addr_city):
+        return True
+    user_iso, match_iso = resolve_iso2(facts.user_country), resolve_iso2(match.get("country") or "")
+    if user_iso and match_iso and user_iso != match_iso:
+        return True
+    match_state = match.get("state") or ""
+    return bool(facts.addr_state and match_state) and not _same_region(facts.addr_state, match_state)
+
+
+def deterministic_hints(facts: OrderFacts, pending: List[int]) -> Dict[int, bool]:
+    """What the data already suggests for rules left to the LLM, without deciding
+    them. A cheaper model's answer that disagrees is escalated, not used."""
+    hints = {}
+    # Only a lookup match that really names another place suggests Rule 5 fires;
+    # differences the match does not contradict (state abbreviations) are left open
+    match = facts.postal_check.get("match")
+    if 5 in pending and match and _postal_match_disagrees(facts, match):
+        hints[5] = True
+    return hints
+
+
+def pending_rules(decided: Dict[int, Dict[str, Any]]) -> List[int]:
+    return [rule_id for rule_id in RULES if rule_id not in decided]
+
+
+def score_flags(flags: List[Dict[str, Any]]) -> int:
+    score = sum(RULE_WEIGHTS.get(f.get("rule_id"), 0) for f in flags if f.get("triggered") is True)
+    return min(score, MAX_RISK_SCORE)
+
+
+def action_for_score(score: int) -> str:
+    return "manual_review" if score >= 1 else "ship"
+
+
+def sync_summary_score(summary: str, score: int) -> str:
+    """Make the score quoted in an LLM-written summary agree with the computed one."""
+    summary = re.sub(r"(risk score (?:of|is) )\d+", rf"\g<1>{score}", summary, flags=re.IGNORECASE)
+    if f"score of {score}" not in summary and f"score is {score}" not in summary:
+        summary = f"(Score: {score}/{MAX_RISK_SCORE}) {summary}"
+    return summary
+
+
+def build_assessment(order_id: Any, flags: List[Dict[str, Any]], summary: Optional[str] = None, suggestions: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Assemble the response in the schema the NestJS API stores."""
+    flags = sorted(flags, key=lambda f: f["rule_id"])
+    score = score_flags(flags)
+    action = action_for_score(score)
+    triggered = [f for f in flags if f.get("triggered") is True]
+    if suggestions is None:
+        suggestions = [VERIFICATION_SUGGESTIONS[f["rule_id"]] for f in triggered if f["rule_id"] in VERIFICATION_SUGGESTIONS]
+    if summary is not None:
+        summary = sync_summary_score(summary, score)
+    else:
+        if triggered:
+            names = ", ".join(f["rule_name"] for f in triggered)
+            summary = f"{len(triggered)} risk rule(s) triggered: {names}. The order has a risk score of {score} and is sent to {action.replace('_', ' ')}."
+        else:
+            summary = "No risk rules were triggered. The order has a risk score of 0 and is safe to ship."
+    return {
+        "order_id": order_id,
+        "risk_score": score,
+        "risk_flags": flags,
+        "recommended_action": action,
+        "verification_suggestions": suggestions,
+        "summary": summary,
+    }
@@ -0,0 +1,154 @@
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Literal, Optional
+
+from pydantic import BaseModel, Field, ValidationError, field_validator
+
+from rules import RULES
+
+try:
+    import orjson
+except ImportError:  # optional speed-up; the stdlib parser gives identical results
+    orjson = None
+
+
+def loads(data: Any) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def coerce_confidence(value: Any) -> Any:
+    """0.85, "0.85", 85 and "85%" all mean 0.85; numbers are clamped to 0-1.
+    Anything else is returned unchanged for the caller to reject."""
+    if isinstance(value, str):
+        text = value.strip()
+        value = float(text[:-1]) / 100 if text.endswith("%") else float(text)
+    if isinstance(value, (int, float)):
+        value = float(value)
+        if 1.0 < value <= 100.0:
+            value /= 100
+        return min(max(value, 0.0), 1.0)
+    return value
+
+
+class RiskFlag(BaseModel):
+    rule_id: int = Field(ge=1, le=max(RULES))
+    rule_name: str
+    triggered: bool
+    confidence: float = Field(ge=0.0, le=1.0)
+    explanation: str
+
+
+class RiskAssessment(BaseModel):
+    """Response of /api/v1/analyze; the score and action are computed here, never taken from the LLM."""
+    order_id: Any
+    risk_score: int = Field(ge=0)
+    risk_flags: List[RiskFlag]
+    recommended_action: Literal["ship", "manual_review"]
+    verification_suggestions: List[str]
+    summary: str
+
+
+class _LLMFlag(BaseModel):
+    """One flag as the LLM wrote it, with the usual slips repaired: "Rule 5" ids,
+    "true"/"yes" strings, percentages and out-of-range confidences."""
+    rule_id: int
+    triggered: bool
+    confidence: float = 0.0
+    explanation: str = ""
+
+    @field_validator("rule_id", mode="before")
+    @classmethod
+    def _rule_id(cls, value: Any) -> Any:
+        if isinstance(value, str):
+            match = re.search(r"\d+", value)
+            return int(match.group()) if match else value
+        return value
+
+    @field_validator("confidence", mode="before")
+    @classmethod
+    def _confidence(cls, value: Any) -> Any:
+        return coerce_confidence(value)
+
+    @field_validator("explanation", mode="before")
+    @classmethod
+    def _explanation(cls, value: Any) -> Any:
+        return "" if value is None else str(value)
+
+
+@dataclass
+class LLMVerdict:
+    """What survives validation of the LLM's answer."""
+    flags: Dict[int, Dict[str, Any]] = field(default_factory=dict)
+    summary: Optional[str] = None
+    suggestions: Optional[List[str]] = None
+    rejected: List[str] = field(default_factory=list)
+
+    def confidence(self, rules: Iterable[int]) -> float:
+        """Lowest confidence over `rules`; a rule the LLM left out counts as 0."""
+        return min((self.flags[r]["confidence"] if r in self.flags else 0.0 for r in rules), default=1.0)
+
+    def triggered(self, rule_id: int) -> Optional[bool]:
+        flag = self.flags.get(rule_id)
+        return None if flag is None else flag["triggered"]
+
+
+def extract_json_object(text: str) -> Any:
+    """Parse the LLM's JSON answer, tolerating fences or prose around the object
+    (streamed completions can't use the provider's JSON mode)."""
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end < start:
+        raise ValueError("LLM response contains no JSON object")
+    return loads(text[start:end + 1])
+
+
+def parse_llm_assessment(text: str, pending: Iterable[int]) -> LLMVerdict:
+    """Parse and validate the assessment completion in one pass.
+
+    Only flags for `pending` rules are kept; each is repaired where the intent
+    is clear and rejected otherwise. Rule names come from the rule table, not
+    the LLM. Raises ValueError if the text is not a JSON object at all."""
+    data = extract_json_object(text)
+    if not isinstance(data, dict):
+        raise ValueError("LLM response is not a JSON object")
+    pending = set(pending)
+    verdict = LLMVerdict()
+
+    raw_flags = data.get("risk_flags")
+    for raw in raw_flags if isinstance(raw_flags, list) else []:
+        try:
+            flag = _LLMFlag.model_validate(raw)
+        except ValidationError as e:
+            verdict.rejected.append(f"malformed flag {str(raw)[:80]}: {e.errors()[0]['msg']}")
+            continue
+        if flag.rule_id not in pending:
+            # Already decided deterministically (or unknown); the decided flag is final
+            continue
+        verdict.flags[flag.rule_id] = {
+            "rule_id": flag.rule_id,
+            "rule_name": RULES[flag.rule_id][0],
+            "triggered": flag.triggered,
+            "confidence": flag.confidence,
+            "explanation": flag.explanation,
+        }
+
+    summary = data.get("summary")
+    if isinstance(summary, str) and summary.strip():
+        verdict.summary = summary.strip()
+    suggestions = data.get("verification_suggestions")
+    if isinstance(suggestions, list):
+        verdict.suggestions = [str(s) for s in suggestions if isinstance(s, (str, int, float)) and str(s).strip()]
+    return verdict
+
+
+def validate_assessment(assessment: Dict[str, Any]) -> Dict[str, Any]:
+    """Check an assembled assessment against the response schema before it leaves the service."""
+    return RiskAssessment.model_validate(assessment).model_dump()
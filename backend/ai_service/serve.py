@@ -0,0 +1,83 @@
+import argparse
+import logging
+import os
+import sys
+import tempfile
+from typing import Dict, Optional
+
+logger = logging.getLogger("ai_service.serve")
+
+SHARED_FILE_NAMES = {
+    # TieredCache persistent tiers share one file (each in its own namespace)
+    "GEO_CACHE_PATH": "cache.sqlite3",
+    "ADDRESS_CACHE_PATH": "cache.sqlite3",
+    "VERDICT_CACHE_PATH": "cache.sqlite3",
+    # Committed-order journal every worker replays and tails
+    "FEATURE_STORE_PATH": "features.sqlite3",
+}
+
+
+def default_shared_dir() -> str:
+    """RAM-backed /dev/shm when available (Linux), the temp directory otherwise."""
+    base = "/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else tempfile.gettempdir()
+    return os.path.join(base, "riskguard-ai")
+
+
+def configure_shared_state(shared_dir: str, environ=os.environ) -> Dict[str, str]:
+    """Point the caches and the feature store at SQLite files in `shared_dir`, so
+    every worker process reads and fills the same entries. Paths already set in
+    the environment (or .env) are left alone. Returns the paths in effect."""
+    os.makedirs(shared_dir, exist_ok=True)
+    for var, name in SHARED_FILE_NAMES.items():
+        environ.setdefault(var, os.path.join(shared_dir, name))
+    return {var: environ[var] for var in SHARED_FILE_NAMES}
+
+
+def load_env_file(path: Optional[str] = None) -> None:
+    """Load .env once in the supervisor; worker processes inherit the variables."""
+    from dotenv import load_dotenv
+
+    load_dotenv(path)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Run the AI service in production mode: several worker processes sharing one socket and one set of caches.",
+    )
+    parser.add_argument("--app", default="main:app", help="ASGI application to serve (module:attribute)")
+    parser.add_argument("--host", default=os.getenv("AI_SERVICE_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("AI_SERVICE_PORT", "8000")))
+    parser.add_argument(
+        "--workers", type=int, default=int(os.getenv("AI_SERVICE_WORKERS", str(os.cpu_count() or 1))),
+        help="worker processes (default AI_SERVICE_WORKERS or the number of CPUs); LLM/geo concurrency limits apply per worker",
+    )
+    parser.add_argument(
+        "--shared-dir", default=os.getenv("AI_SERVICE_SHARED_DIR", default_shared_dir()),
+        help="directory for the shared cache / feature files ('off' keeps every worker's state private)",
+    )
+    parser.add_argument("--env-file", default=None, help="dotenv file to load (default: .env lookup)")
+    parser.add_argument("--log-level", default=os.getenv("AI_SERVICE_LOG_LEVEL", "info"))
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    load_env_file(args.env_file)
+    if args.shared_dir != "off":
+        for var, path in configure_shared_state(args.shared_dir).items():
+            logger.info("%s=%s", var, path)
+
+    import uvicorn
+
+    logger.info("Serving %s on %s:%d with %d worker(s)", args.app, args.host, args.port, args.workers)
+    uvicorn.run(
+        args.app,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        log_level=args.log_level,
+        access_log=False,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
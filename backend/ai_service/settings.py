@@ -0,0 +1,44 @@
+import os
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class ServiceSettings:
+    """Per-request tunables of the scoring pipeline, read when the app starts (in
+    the lifespan, so variables set by serve.py, .env or a test are seen) and kept
+    on `app.state.settings`."""
+
+    # Per-stage timeouts (seconds) for the concurrent enrichment stages
+    phone_stage_timeout: float = 5.0
+    city_stage_timeout: float = 6.0
+    postal_stage_timeout: float = 6.0
+    address_stage_timeout: float = 10.0
+    # Latency budgets (seconds, retries included) for the LLM calls; they sit below
+    # the stage timeouts so a slow model is cut off by the gateway and counts
+    # against its circuit breaker instead of being cancelled by the stage
+    phone_llm_deadline: float = 4.0
+    address_llm_deadline: float = 4.5   # per tier
+    assessment_small_llm_deadline: float = 8.0
+    assessment_llm_deadline: float = 20.0
+    # Only numbers the local phone table can't classify fall back to the LLM normaliser
+    phone_llm_fallback: bool = True
+    # Max orders of one batch request scored at the same time
+    batch_concurrency: int = 16
+    # Seconds between purges of expired cache rows (every worker purges its namespaces)
+    cache_purge_interval: float = 600.0
+
+
+def create_settings_from_env() -> ServiceSettings:
+    return ServiceSettings(
+        phone_stage_timeout=float(os.getenv("PHONE_STAGE_TIMEOUT", "5")),
+        city_stage_timeout=float(os.getenv("CITY_STAGE_TIMEOUT", "6")),
+        postal_stage_timeout=float(os.getenv("POSTAL_STAGE_TIMEOUT", "6")),
+        address_stage_timeout=float(os.getenv("ADDRESS_STAGE_TIMEOUT", "10")),
+        phone_llm_deadline=float(os.getenv("PHONE_LLM_DEADLINE", "4")),
+        address_llm_deadline=float(os.getenv("ADDRESS_LLM_DEADLINE", "4.5")),
+        assessment_small_llm_deadline=float(os.getenv("ASSESSMENT_SMALL_LLM_DEADLINE", "8")),
+        assessment_llm_deadline=float(os.getenv("ASSESSMENT_LLM_DEADLINE", "20")),
+        phone_llm_fallback=os.getenv("PHONE_LLM_FALLBACK", "1") == "1",
+        batch_concurrency=int(os.getenv("BATCH_CONCURRENCY", "16")),
+        cache_purge_interval=float(os.getenv("CACHE_PURGE_INTERVAL", "600")),
+    )
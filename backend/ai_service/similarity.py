@@ -0,0 +1,135 @@
+import difflib
+import hashlib
+import random
+import re
+from typing import Dict, Hashable, List, Optional, Set, Tuple
+
+from countries import fold
+
+# Street-type and unit abbreviations expanded before comparison, so
+# "123 Main St." and "123 Main Street" normalise to the same text
+_ABBREVIATIONS = {
+    "st": "street", "str": "street", "rd": "road", "ave": "avenue", "av": "avenue",
+    "blvd": "boulevard", "ln": "lane", "dr": "drive", "ct": "court", "pl": "place",
+    "sq": "square", "hwy": "highway", "pkwy": "parkway", "cir": "circle", "ter": "terrace",
+    "apt": "apartment", "ste": "suite", "fl": "floor", "bldg": "building", "no": "number",
+    "n": "north", "s": "south", "e": "east", "w": "west",
+}
+_NON_WORD = re.compile(r"[^\w]+")
+_DIGITS = re.compile(r"\d+")
+# Mailbox providers that ignore dots in the local part
+_DOTLESS_DOMAINS = {"gmail.com", "googlemail.com"}
+
+
+def canonical_email(email: Optional[str]) -> str:
+    """Lower-cased address with any '+tag' removed (and dots, for Gmail), so
+    'John.Smith+shop@gmail.com' and 'johnsmith@gmail.com' are one mailbox."""
+    text = (email or "").strip().lower()
+    local, at, domain = text.partition("@")
+    if not at:
+        return text
+    local = local.split("+", 1)[0]
+    if domain in _DOTLESS_DOMAINS:
+        local = local.replace(".", "")
+        domain = "gmail.com"
+    return f"{local}@{domain}"
+
+
+def normalize_address(*parts: Optional[str]) -> str:
+    """Accent/case/punctuation-insensitive address text with abbreviations expanded."""
+    tokens = _NON_WORD.sub(" ", fold(" ".join(p for p in parts if p))).split()
+    return " ".join(_ABBREVIATIONS.get(t, t) for t in tokens)
+
+
+def normalize_name(name: Optional[str]) -> str:
+    """Name tokens in sorted order, so 'Smith, John' and 'john smith' compare equal."""
+    return " ".join(sorted(_NON_WORD.sub(" ", fold(name or "")).split()))
+
+
+def shingles(text: str, size: int = 3) -> Set[str]:
+    """Character n-grams of each token (padded, so short tokens still contribute)."""
+    grams: Set[str] = set()
+    for token in text.split():
+        padded = f" {token} "
+        grams.update(padded[i:i + size] for i in range(max(1, len(padded) - size + 1)))
+    return grams
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def similar_names(a: Optional[str], b: Optional[str], threshold: float = 0.85) -> bool:
+    """Same name up to word order, accents and small typos ('Jonh Smith' ~ 'John Smith')."""
+    left, right = normalize_name(a), normalize_name(b)
+    if left == right:
+        return True
+    return difflib.SequenceMatcher(None, left, right).ratio() >= threshold
+
+
+class MinHashIndex:
+    """Locality-sensitive index for near-duplicate text.
+
+    Each entry is reduced to a MinHash signature of its character 3-grams and
+    bucketed by bands of that signature; a lookup hashes the query the same way
+    and only compares the entries sharing a band. Candidates are confirmed with
+    the exact Jaccard similarity of their n-grams, and entries whose numbers
+    differ (house / flat numbers, postcodes) never match.
+
+    `num_perm` = `bands` x rows; the default 32 x 2 finds pairs above ~0.7
+    similarity with high probability. Lookups stay well under a millisecond
+    because the work depends on the query and its few candidates, not on the
+    number of entries."""
+
+    def __init__(self, threshold: float = 0.7, num_perm: int = 64, bands: int = 32, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self._rows = num_perm // bands
+        # One fixed random 64-bit mask per permutation; XOR-ing well-mixed gram
+        # hashes with it gives an independent-enough ordering at C speed
+        rng = random.Random(seed)
+        self._masks = [rng.getrandbits(64) for _ in range(num_perm)]
+        self._buckets: List[Dict[Tuple[int, ...], List[Hashable]]] = [{} for _ in range(bands)]
+        self._entries: Dict[Hashable, Tuple[Set[str], Tuple[str, ...]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _signature(self, grams: Set[str]) -> List[int]:
+        hashes = [int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=8).digest(), "little") for g in grams] or [0]
+        return [min(map(mask.__xor__, hashes)) for mask in self._masks]
+
+    def _bands(self, grams: Set[str]):
+        signature = self._signature(grams)
+        rows = self._rows
+        for band in range(len(self._buckets)):
+            yield band, tuple(signature[band * rows:(band + 1) * rows])
+
+    def add(self, key: Hashable, text: str) -> None:
+        if key in self._entries:
+            return
+        grams = shingles(text)
+        self._entries[key] = (grams, tuple(_DIGITS.findall(text)))
+        for band, bucket in self._bands(grams):
+            self._buckets[band].setdefault(bucket, []).append(key)
+
+    def query(self, text: str) -> List[Tuple[Hashable, float]]:
+        """Entries near-identical to `text`, best first, as (key, similarity)."""
+        grams = shingles(text)
+        numbers = tuple(_DIGITS.findall(text))
+        candidates: Set[Hashable] = set()
+        for band, bucket in self._bands(grams):
+            candidates.update(self._buckets[band].get(bucket, ()))
+        matches = []
+        for key in candidates:
+            other_grams, other_numbers = self._entries[key]
+            if other_numbers != numbers:
+                continue
+            score = jaccard(grams, other_grams)
+            if score >= self.threshold:
+                matches.append((key, score))
+        matches.sort(key=lambda m: m[1], reverse=True)
+        return matches
@@ -0,0 +1,73 @@
+import asyncio
+import json
+import shutil
+import tempfile
+import unittest
+
+import httpx
+
+from bench.orders import generate_orders
+from bench.startup import DEFAULT_BENCH_ARGS, _drain, _free_port, start_server, wait_ready
+
+
+class BatchOverUvicornTest(unittest.IsolatedAsyncioTestCase):
+    """/api/v1/analyze/batch through a real uvicorn worker (serve.py), where the
+    server owns the receive channel; the in-process ASGI transport hides that."""
+
+    async def asyncSetUp(self):
+        self.port = _free_port()
+        self.shared_dir = tempfile.mkdtemp(prefix="riskguard-test-")
+        self.server = await start_server(1, self.port, self.shared_dir, DEFAULT_BENCH_ARGS)
+        await wait_ready(self.server, 1, timeout=30)
+        self.drain = asyncio.ensure_future(_drain(self.server))
+        self.client = httpx.AsyncClient(base_url=f"http://127.0.0.1:{self.port}", timeout=20)
+        self.orders = generate_orders(6, seed=7)
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+        self.server.terminate()
+        await self.server.wait()
+        self.drain.cancel()
+        shutil.rmtree(self.shared_dir, ignore_errors=True)
+
+    def _indexes(self, resp: httpx.Response):
+        lines = [json.loads(line) for line in resp.text.splitlines() if line.strip()]
+        self.assertTrue(all("assessment" in line for line in lines), lines)
+        return sorted(line["index"] for line in lines)
+
+    async def test_ndjson_body_sent_in_chunks(self):
+        async def body():
+            for order in self.orders:
+                yield (json.dumps(order) + "\n").encode()
+                await asyncio.sleep(0.05)
+
+        resp = await self.client.post("/api/v1/analyze/batch", content=body(), headers={"content-type": "application/x-ndjson"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(self._indexes(resp), list(range(len(self.orders))))
+
+    async def test_json_array(self):
+        resp = await self.client.post("/api/v1/analyze/batch", json=self.orders)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(self._indexes(resp), list(range(len(self.orders))))
+
+    async def test_orders_before_broken_input_are_answered(self):
+        body = b"".join(json.dumps(o).encode() + b"\n" for o in self.orders) + b"\xff\xfe\n"
+        resp = await self.client.post("/api/v1/analyze/batch", content=body, headers={"content-type": "application/x-ndjson"})
+        lines = [json.loads(line) for line in resp.text.splitlines() if line.strip()]
+        self.assertEqual(sorted(line["index"] for line in lines if "assessment" in line), list(range(len(self.orders))))
+        self.assertIsNone(lines[-1]["index"])
+        self.assertIn("Batch input error", lines[-1]["error"])
+
+    async def test_server_keeps_serving_after_client_disconnects(self):
+        payload = "\n".join(json.dumps(o) for o in generate_orders(200, seed=8))
+        async with self.client.stream(
+            "POST", "/api/v1/analyze/batch", content=payload, headers={"content-type": "application/x-ndjson"},
+        ) as resp:
+            async for line in resp.aiter_lines():
+                self.assertIn("assessment", json.loads(line))
+                break
+        resp = await self.client.post("/api/v1/analyze/batch", json=self.orders[:2])
+        self.assertEqual(self._indexes(resp), [0, 1])
+
+if __name__ == "__main__":
+    unittest.main()
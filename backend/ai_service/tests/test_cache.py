@@ -0,0 +1,55 @@
+import os
+import tempfile
+import unittest
+
+from cache import SqliteStore, TieredCache, TTLCache
+
+
+class Clock:
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class NegativeTTLTest(unittest.TestCase):
+    """Lookups that found nothing expire after negative_ttl, found ones after ttl."""
+
+    def setUp(self):
+        self.clock = Clock()
+        self.cache = TieredCache("test", maxsize=10, ttl=3600, negative_ttl=60)
+        self.cache.memory = TTLCache(10, 3600, clock=self.clock)
+
+    def test_negative_entry_expires_first(self):
+        self.cache.set("found", {"city": "Pune"})
+        self.cache.set("missing", {"city": None}, negative=True)
+        self.clock.now += 59
+        self.assertEqual(self.cache.get("missing"), {"city": None})
+        self.clock.now += 1
+        self.assertIsNone(self.cache.get("missing"))
+        self.assertEqual(self.cache.get("found"), {"city": "Pune"})
+        self.clock.now += 3600
+        self.assertIsNone(self.cache.get("found"))
+        self.assertEqual((self.cache.stats["sets"], self.cache.stats["negative_sets"]), (1, 1))
+
+    def test_store_keeps_the_negative_ttl(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        store = SqliteStore(os.path.join(tmp.name, "cache.sqlite"), "test")
+        self.addCleanup(store.close)
+        self.cache.store = store
+        self.cache.set("missing", {"city": None}, negative=True)
+        value, remaining = store.get("missing")
+        self.assertEqual(value, {"city": None})
+        self.assertLessEqual(remaining, 60)
+
+        # A restarted worker reloads it into memory with what is left of the negative TTL
+        self.cache.memory.clear()
+        self.assertEqual(self.cache.get("missing"), {"city": None})
+        self.assertEqual(self.cache.stats["store_hits"], 1)
+        self.assertLessEqual(self.cache.memory.remaining_ttl("missing"), 60)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import asyncio
+import unittest
+
+from cascade import ModelCascade, confidence_band
+from metrics import METRICS
+
+
+def _tiers(small_answer, confidence, large_answer="large"):
+    calls = []
+
+    async def small():
+        calls.append("small")
+        if isinstance(small_answer, Exception):
+            raise small_answer
+        return small_answer, confidence
+
+    async def large():
+        calls.append("large")
+        return large_answer
+
+    return small, large, calls
+
+
+def _same(a, b):
+    return a == b
+
+
+class CascadeTest(unittest.TestCase):
+    def setUp(self):
+        METRICS.reset()
+
+    def _run(self, mode, small_answer, confidence, contradicts=None, large_answer="large"):
+        small, large, calls = _tiers(small_answer, confidence, large_answer)
+        answer = asyncio.run(ModelCascade(mode, 0.85).run("test", small, large, _same, contradicts))
+        return answer, calls
+
+    def test_confident_small_answer_is_used(self):
+        self.assertEqual(self._run("cascade", "small", 0.9), ("small", ["small"]))
+        self.assertIn('ai_cascade_decisions_total{reason="confident",task="test",tier="small"} 1', METRICS.render())
+
+    def test_low_confidence_escalates(self):
+        self.assertEqual(self._run("cascade", "small", 0.84), ("large", ["small", "large"]))
+        self.assertIn('reason="low_confidence"', METRICS.render())
+
+    def test_contradiction_escalates(self):
+        self.assertEqual(self._run("cascade", "small", 0.99, contradicts=lambda a: True), ("large", ["small", "large"]))
+        self.assertIn('reason="contradiction"', METRICS.render())
+
+    def test_small_error_escalates(self):
+        self.assertEqual(self._run("cascade", ConnectionError("down"), 0.0), ("large", ["small", "large"]))
+        self.assertIn('reason="small_error"', METRICS.render())
+
+    def test_off_uses_only_the_large_model(self):
+        self.assertEqual(self._run("off", "small", 1.0), ("large", ["large"]))
+
+    def test_unknown_mode_is_rejected(self):
+        with self.assertRaises(ValueError):
+            ModelCascade("sometimes")
+
+
+class ShadowAgreementTest(unittest.TestCase):
+    """Shadow mode always answers with the large model and counts agreement per band."""
+
+    def setUp(self):
+        METRICS.reset()
+
+    def _run(self, small_answer, confidence, large_answer, contradicts=None):
+        small, large, _ = _tiers(small_answer, confidence, large_answer)
+        return asyncio.run(ModelCascade("shadow", 0.85).run("test", small, large, _same, contradicts))
+
+    def test_agreement_is_counted_per_band(self):
+        self.assertEqual(self._run("VALID", 0.92, "VALID"), "VALID")
+        self.assertEqual(self._run("VALID", 0.93, "VALID"), "VALID")
+        self.assertIn(
+            'ai_cascade_shadow_total{confidence="0.90",outcome="agree",task="test",would_use_small="true"} 2',
+            METRICS.render(),
+        )
+
+    def test_disagreement_keeps_the_large_answer(self):
+        self.assertEqual(self._run("VALID", 0.5, "INVALID"), "INVALID")
+        self.assertIn(
+            'ai_cascade_shadow_total{confidence="0.50",outcome="disagree",task="test",would_use_small="false"} 1',
+            METRICS.render(),
+        )
+
+    def test_contradicted_answer_would_not_be_used(self):
+        self._run("VALID", 0.95, "VALID", contradicts=lambda a: True)
+        self.assertIn('outcome="agree",task="test",would_use_small="false"', METRICS.render())
+
+    def test_small_error_is_counted(self):
+        self.assertEqual(self._run(ConnectionError("down"), 0.0, "VALID"), "VALID")
+        self.assertIn('ai_cascade_shadow_total{outcome="small_error",task="test"} 1', METRICS.render())
+
+    def test_confidence_bands(self):
+        self.assertEqual([confidence_band(c) for c in (0.0, 0.049, 0.87, 0.9, 1.0)], ["0.00", "0.00", "0.85", "0.90", "0.95"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+
+from feature_store import DAY, EVICT_INTERVAL, WINDOW, FeatureStore, merge_identity_context
+
+
+class Clock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _order(email: str):
+    return {"user_profile": {"email": email, "user_id": "u1", "full_name": "Ayesha Khan"}}
+
+
+class VelocityWindowTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock(100 * DAY)
+        self.store = FeatureStore(clock=self.clock)
+
+    def _counts(self, email: str):
+        orders = self.store.historical_context(_order(email))["same_person_orders"]
+        return orders["orders_last_24h"], orders["orders_last_7d"], orders["total_past_orders"]
+
+    def test_out_of_order_commits_are_counted(self):
+        now = self.clock.now
+        # The newest commit arrives first; older ones inside the window must not be pruned
+        for at in (now - 60, now - 3 * DAY, now - 2 * 3600, now - 6 * DAY, now - 8 * DAY):
+            self.store.record_order(_order("a@example.com"), committed_at=at)
+        self.assertEqual(self._counts("a@example.com"), (2, 4, 5))
+
+    def test_idle_windows_are_evicted(self):
+        self.store.record_order(_order("idle@example.com"), committed_at=self.clock.now)
+        self.clock.now += WINDOW + EVICT_INTERVAL
+        self.store.record_order(_order("busy@example.com"))
+        self.assertEqual(self.store.snapshot()["windows"], 1)
+        self.assertEqual(self._counts("idle@example.com"), (0, 0, 1))
+
+
+class MergeIdentityContextTest(unittest.TestCase):
+    """The API's exact matches keep emails as entered; the store's are canonical."""
+
+    def test_same_mailbox_is_not_repeated(self):
+        context = {
+            "address_history": {"other_names_at_this_address": ["Bilal Ahmed (Bilal.Ahmed+shop@Gmail.com)"]},
+            "duplicate_email_matches": [{"name": "Bilal Ahmed", "email": "Bilal.Ahmed+shop@Gmail.com"}],
+            "duplicate_phone_matches": [],
+        }
+        extra = {
+            "address_history": {"other_names_at_this_address": ["bilal ahmed (bilalahmed@gmail.com)", "Sara Malik (sara@example.com)"]},
+            "duplicate_email_matches": [{"name": "Bilal Ahmed", "email": "bilalahmed@gmail.com"}],
+            "duplicate_phone_matches": [{"name": "Bilal Ahmed", "email": "bilalahmed@gmail.com"}],
+        }
+        merged = merge_identity_context(context, extra)
+        self.assertEqual(
+            merged["address_history"]["other_names_at_this_address"],
+            ["Bilal Ahmed (Bilal.Ahmed+shop@Gmail.com)", "Sara Malik (sara@example.com)"],
+        )
+        self.assertEqual(len(merged["duplicate_email_matches"]), 1)
+        self.assertEqual(len(merged["duplicate_phone_matches"]), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
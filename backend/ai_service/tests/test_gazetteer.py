@@ -0,0 +1,55 @@
+import os
+import tempfile
+import unittest
+
+from gazetteer import Gazetteer, build_index
+
+POSTAL_ROWS = [
+    ("GB", "SW1A", "London", "England"),
+    ("GB", "SW1A 2AA", "Westminster", "England"),
+    ("CA", "M5V", "Toronto", "Ontario"),
+    ("PK", "54000", "Lahore", "Punjab"),
+]
+
+
+class OutwardCodeFallbackTest(unittest.TestCase):
+    """Full postcodes missing from the dumps resolve through their outward part."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        postal_path = os.path.join(cls.tmp.name, "postal.txt")
+        with open(postal_path, "w", encoding="utf-8") as f:
+            for row in POSTAL_ROWS:
+                f.write("\t".join(row) + "\n")
+        index_path = os.path.join(cls.tmp.name, "gazetteer.idx")
+        build_index(index_path, postal_path, None)
+        cls.gazetteer = Gazetteer(index_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.gazetteer.close()
+        cls.tmp.cleanup()
+
+    def test_full_code_falls_back_to_outward_code(self):
+        self.assertEqual(self.gazetteer.lookup_postal("SW1A 1AA", "GB"), ("London", "England", "GB"))
+        self.assertEqual(self.gazetteer.lookup_postal("m5v 3l9", "CA"), ("Toronto", "Ontario", "CA"))
+
+    def test_indexed_full_code_wins(self):
+        self.assertEqual(self.gazetteer.lookup_postal("SW1A 2AA", "GB"), ("Westminster", "England", "GB"))
+
+    def test_codes_without_a_space_are_looked_up_as_given(self):
+        self.assertEqual(self.gazetteer.lookup_postal("54000", "PK"), ("Lahore", "Punjab", "PK"))
+        self.assertIsNone(self.gazetteer.lookup_postal("SW1A1AA", "GB"))
+
+    def test_unknown_codes_and_countries(self):
+        self.assertIsNone(self.gazetteer.lookup_postal("ZZ9 9ZZ", "GB"))
+        self.assertIsNone(self.gazetteer.lookup_postal("SW1A 1AA", "IE"))
+
+    def test_postal_places_are_indexed_as_cities(self):
+        self.assertTrue(self.gazetteer.has_city("lahore", "PK"))
+        self.assertFalse(self.gazetteer.has_city("Lahore", "IN"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+
+from phone_numbers import check_phone
+
+
+class TrunkPrefixTest(unittest.TestCase):
+    """A national trunk digit written after the calling code is dropped."""
+
+    def test_pakistan_mobile_with_trunk(self):
+        check = check_phone("+92 0300 1234567", "Pakistan")
+        self.assertTrue(check.valid, check.explanation)
+        self.assertEqual(check.e164, "+923001234567")
+
+    def test_uk_mobile_with_trunk(self):
+        check = check_phone("+44 07911 123456", "United Kingdom")
+        self.assertTrue(check.valid, check.explanation)
+        self.assertEqual(check.e164, "+447911123456")
+
+    def test_double_zero_prefix_with_trunk(self):
+        check = check_phone("0092-0300-1234567", "PK")
+        self.assertTrue(check.valid, check.explanation)
+        self.assertEqual(check.e164, "+923001234567")
+
+    def test_number_without_trunk_is_unchanged(self):
+        self.assertEqual(check_phone("+44 7911 123456", "GB").e164, "+447911123456")
+
+    def test_russian_area_code_starting_with_trunk_digit_is_kept(self):
+        self.assertEqual(check_phone("+7 812 123 4567", "Russia").e164, "+78121234567")
+
+
+class PhonePlanTest(unittest.TestCase):
+    """National formats, plan lengths / first digits and country matching."""
+
+    def test_national_format_uses_the_customer_country(self):
+        check = check_phone("0300-1234567", "Pakistan")
+        self.assertEqual((check.e164, check.iso2, check.valid, check.country_matches), ("+923001234567", "PK", True, True))
+
+    def test_country_code_without_plus(self):
+        self.assertEqual(check_phone("923001234567", "PK").e164, "+923001234567")
+
+    def test_wrong_length_is_invalid(self):
+        check = check_phone("+92 300 12345", "PK")
+        self.assertFalse(check.valid)
+        self.assertIn("exactly 10 digits", check.explanation)
+
+    def test_wrong_first_digit_is_invalid(self):
+        check = check_phone("+91 5123 456789", "India")
+        self.assertFalse(check.valid)
+        self.assertIn("must start with", check.explanation)
+
+    def test_foreign_number_is_valid_but_flags_the_country(self):
+        check = check_phone("+44 7911 123456", "Pakistan")
+        self.assertTrue(check.valid)
+        self.assertFalse(check.country_matches)
+
+    def test_shared_calling_code_prefers_the_customer_country(self):
+        self.assertEqual(check_phone("+1 416 555 0123", "Canada").iso2, "CA")
+        self.assertEqual(check_phone("+1 212 555 0123", None).iso2, "US")
+
+    def test_letters_are_invalid(self):
+        self.assertFalse(check_phone("+92 300 CALLME", "PK").valid)
+
+    def test_unclassifiable_numbers_are_left_to_the_llm(self):
+        self.assertIsNone(check_phone("+999 1234567", "PK"))
+        self.assertIsNone(check_phone("0300 1234567", "Atlantis"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import asyncio
+import unittest
+
+from resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, hedged
+
+
+class Clock:
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=30, clock=self.clock)
+
+    def _open(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, OPEN)
+
+    def test_opens_after_consecutive_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, OPEN)
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.check()
+
+    def test_half_open_lets_one_trial_through(self):
+        self._open()
+        self.clock.now += 30
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.assertFalse(self.breaker.allow())
+
+    def test_successful_trial_closes(self):
+        self._open()
+        self.clock.now += 30
+        self.breaker.check()
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.assertTrue(self.breaker.allow())
+
+    def test_failed_trial_reopens(self):
+        self._open()
+        self.clock.now += 30
+        self.breaker.check()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertFalse(self.breaker.allow())
+        self.assertEqual(self.breaker.retry_in(), 30)
+
+    def test_abandoned_trial_is_replaced(self):
+        self._open()
+        self.clock.now += 30
+        self.assertTrue(self.breaker.allow())
+        # The trial's caller was cancelled and never reported back
+        self.clock.now += 30
+        self.assertTrue(self.breaker.allow())
+
+
+class HedgedTest(unittest.TestCase):
+    def _run(self, delays, delay=0.05):
+        """Call i sleeps delays[i] and answers i (a negative delay raises instead)."""
+        calls = []
+        hedges = []
+
+        async def fn():
+            index = len(calls)
+            calls.append(index)
+            await asyncio.sleep(abs(delays[index]))
+            if delays[index] < 0:
+                raise ConnectionError(f"call {index} failed")
+            return index
+
+        result = asyncio.run(hedged(fn, delay, hedges.append))
+        return result, len(calls), hedges
+
+    def test_fast_primary_is_not_hedged(self):
+        self.assertEqual(self._run([0.0]), (0, 1, []))
+
+    def test_slow_primary_loses_to_the_hedge(self):
+        self.assertEqual(self._run([1.0, 0.0]), (1, 2, [True]))
+
+    def test_primary_can_still_win_after_hedging(self):
+        self.assertEqual(self._run([0.1, 1.0]), (0, 2, [False]))
+
+    def test_failed_call_falls_back_to_the_other(self):
+        self.assertEqual(self._run([-0.1, 0.2]), (1, 2, [True]))
+
+    def test_both_failing_raises(self):
+        with self.assertRaises(ConnectionError):
+            self._run([-0.1, -0.2])
+
+
+if __name__ == "__main__":
+    unittest.main()
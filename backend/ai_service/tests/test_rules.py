@@ -0,0 +1,106 @@
+import unittest
+
+from rules import OrderFacts, _rule_5, build_assessment, deterministic_hints, evaluate_deterministic, pending_rules
+
+
+def _facts(match, addr_state="Maharashtra"):
+    return OrderFacts(
+        addr_street="12 MG Road",
+        addr_city="Pune",
+        addr_state=addr_state,
+        postal_code="411001",
+        user_country="India",
+        city_check="",
+        postal_check={"summary": "", "match": match},
+        address_status="VALID",
+        address_detail="",
+    )
+
+
+class PostalRuleTest(unittest.TestCase):
+    """Rule 5 against lookup matches with missing fields (postal_result stores None)."""
+
+    def test_matching_lookup_passes(self):
+        flag = _rule_5(_facts({"city": "Pune", "state": "Maharashtra", "country": "IN"}))
+        self.assertIsNotNone(flag)
+        self.assertFalse(flag["triggered"])
+
+    def test_null_state_is_left_to_the_llm(self):
+        self.assertIsNone(_rule_5(_facts({"city": "Pune", "state": None, "country": "IN"})))
+
+    def test_null_state_without_user_state_passes(self):
+        flag = _rule_5(_facts({"city": "Pune", "state": None, "country": "IN"}, addr_state=""))
+        self.assertFalse(flag["triggered"])
+
+    def test_null_city_and_country_are_left_to_the_llm(self):
+        self.assertIsNone(_rule_5(_facts({"city": None, "state": None, "country": None})))
+
+
+class DeterministicRulesTest(unittest.TestCase):
+    """Rules decided from data alone, and what is left to the LLM."""
+
+    def _facts(self, **overrides):
+        facts = _facts({"city": "Pune", "state": "Maharashtra", "country": "IN"})
+        for name, value in overrides.items():
+            setattr(facts, name, value)
+        return facts
+
+    def test_clean_order_leaves_only_unclassified_rules(self):
+        decided = evaluate_deterministic(self._facts())
+        # The street does not name the city (Rule 8) and no local phone check ran (Rule 9)
+        self.assertEqual(pending_rules(decided), [8, 9])
+        self.assertFalse(any(flag["triggered"] for flag in decided.values()))
+
+    def test_hurry_booking_triggers_rule_3(self):
+        history = {"same_person_orders": {"minutes_since_last_order": 3, "orders_last_24h": 4, "orders_last_7d": 4}}
+        flag = evaluate_deterministic(self._facts(historical_context=history))[3]
+        self.assertTrue(flag["triggered"])
+        self.assertIn("only 3 minutes", flag["explanation"])
+
+    def test_phone_check_and_city_in_street_decide_rules_8_and_9(self):
+        phone = {"valid": False, "explanation": "Pakistan numbers must be exactly 10 digits after +92, but 8 found."}
+        decided = evaluate_deterministic(self._facts(addr_street="12 MG Road, Pune", phone_check=phone))
+        self.assertFalse(decided[8]["triggered"])
+        self.assertTrue(decided[9]["triggered"])
+        self.assertEqual(pending_rules(decided), [])
+
+    def test_assessment_score_and_action(self):
+        decided = evaluate_deterministic(self._facts(
+            historical_context={"duplicate_email_matches": [{"name": "Sara Malik", "email": "s@example.com"}]},
+            address_status="INVALID",
+            address_detail="No street number.",
+        ))
+        assessment = build_assessment("o-1", list(decided.values()))
+        self.assertEqual(assessment["risk_score"], 10)
+        self.assertEqual(assessment["recommended_action"], "manual_review")
+        self.assertEqual([f["rule_id"] for f in assessment["risk_flags"]], sorted(decided))
+        self.assertIn("risk score of 10", assessment["summary"])
+
+
+class PostalHintTest(unittest.TestCase):
+    """Rule 5 hints only when the lookup really names another place."""
+
+    def test_abbreviated_state_is_not_escalated(self):
+        facts = _facts({"city": "Pune", "state": "Maharashtra", "country": "IN"}, addr_state="MH")
+        self.assertIsNone(_rule_5(facts))
+        self.assertEqual(deterministic_hints(facts, [5]), {})
+
+    def test_accents_and_case_are_not_escalated(self):
+        facts = _facts({"city": "PUNE", "state": "Mahārāshtra", "country": "IN"}, addr_state="Maharashtra")
+        self.assertEqual(deterministic_hints(facts, [5]), {})
+
+    def test_other_state_is_hinted(self):
+        facts = _facts({"city": "Pune", "state": "Karnataka", "country": "IN"})
+        self.assertIsNone(_rule_5(facts))
+        self.assertEqual(deterministic_hints(facts, [5]), {5: True})
+
+    def test_other_city_is_hinted(self):
+        facts = _facts({"city": "Mumbai", "state": "Maharashtra", "country": "IN"})
+        self.assertEqual(deterministic_hints(facts, [5]), {5: True})
+
+    def test_empty_lookup_fields_are_not_hinted(self):
+        self.assertEqual(deterministic_hints(_facts({"city": None, "state": None, "country": None}), [5]), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
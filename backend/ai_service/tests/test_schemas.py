@@ -0,0 +1,57 @@
+import unittest
+
+from schemas import coerce_confidence, parse_llm_assessment
+
+
+class ParseLLMAssessmentTest(unittest.TestCase):
+    """Repair of the usual LLM slips, and rejection of what can't be repaired."""
+
+    def test_slips_are_repaired(self):
+        text = """Here is the assessment:
+```json
+{"risk_flags": [
+    {"rule_id": "Rule 5", "rule_name": "whatever", "triggered": "yes", "confidence": "85%", "explanation": null},
+    {"rule_id": 8, "triggered": "false", "confidence": 90, "explanation": "City matches."}
+], "summary": "  Looks fine.  ", "verification_suggestions": ["Call", "", 3, {"x": 1}]}
+```"""
+        verdict = parse_llm_assessment(text, [5, 8])
+        self.assertEqual(verdict.flags[5], {
+            "rule_id": 5,
+            "rule_name": "Postal Code Validation",
+            "triggered": True,
+            "confidence": 0.85,
+            "explanation": "",
+        })
+        self.assertFalse(verdict.triggered(8))
+        self.assertEqual(verdict.flags[8]["confidence"], 0.9)
+        self.assertEqual(verdict.summary, "Looks fine.")
+        self.assertEqual(verdict.suggestions, ["Call", "3"])
+        self.assertEqual(verdict.rejected, [])
+
+    def test_unrepairable_flags_are_rejected(self):
+        text = '{"risk_flags": [{"rule_id": "five", "triggered": true}, {"rule_id": 8, "triggered": "maybe"}, "Rule 9"]}'
+        verdict = parse_llm_assessment(text, [5, 8, 9])
+        self.assertEqual(verdict.flags, {})
+        self.assertEqual(len(verdict.rejected), 3)
+        self.assertIsNone(verdict.summary)
+
+    def test_flags_for_decided_rules_are_ignored(self):
+        verdict = parse_llm_assessment('{"risk_flags": [{"rule_id": 3, "triggered": true, "confidence": 1}]}', [5])
+        self.assertEqual(verdict.flags, {})
+        self.assertEqual(verdict.rejected, [])
+        # A pending rule the LLM left out counts as no confidence
+        self.assertEqual(verdict.confidence([5]), 0.0)
+
+    def test_non_object_is_an_error(self):
+        with self.assertRaises(ValueError):
+            parse_llm_assessment("I cannot help with that.", [5])
+        with self.assertRaises(ValueError):
+            parse_llm_assessment("{not json}", [5])
+
+    def test_confidence_forms(self):
+        self.assertEqual([coerce_confidence(v) for v in (0.85, "0.85", 85, "85%", 250, -1)], [0.85, 0.85, 0.85, 0.85, 1.0, 0.0])
+        self.assertEqual(coerce_confidence(None), None)
+
+
+if __name__ == "__main__":
+    unittest.main()
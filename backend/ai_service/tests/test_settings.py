@@ -0,0 +1,23 @@
+import os
+import unittest
+from unittest import mock
+
+import main
+
+
+class LifespanSettingsTest(unittest.IsolatedAsyncioTestCase):
+    """Configuration set after `main` is imported (serve.py workers, the bench,
+    tests) must still be what the app runs with."""
+
+    async def test_env_read_at_startup(self):
+        env = {"LLM_BACKEND": "fake", "BATCH_CONCURRENCY": "3", "CITY_STAGE_TIMEOUT": "1.5", "PHONE_LLM_FALLBACK": "0"}
+        with mock.patch.dict(os.environ, env):
+            async with main.app.router.lifespan_context(main.app):
+                settings = main.app.state.settings
+        self.assertEqual(settings.batch_concurrency, 3)
+        self.assertEqual(settings.city_stage_timeout, 1.5)
+        self.assertFalse(settings.phone_llm_fallback)
+
+
+if __name__ == "__main__":
+    unittest.main()
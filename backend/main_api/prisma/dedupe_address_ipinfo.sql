@@ -0,0 +1,29 @@
+-- Run once before `npx prisma db push` on a database created before Address and
+-- IpInfo became unique: repoints orders at the oldest identical row and removes
+-- the duplicates so the new unique constraints can be created.
+--   psql "$DATABASE_URL" -f prisma/dedupe_address_ipinfo.sql
+BEGIN;
+
+WITH ranked AS (
+    SELECT id, FIRST_VALUE(id) OVER (
+        PARTITION BY street, city, state, "postalCode", country ORDER BY id
+    ) AS keep_id
+    FROM "Address"
+)
+UPDATE "Order" o SET "addressId" = r.keep_id
+FROM ranked r WHERE o."addressId" = r.id AND r.id <> r.keep_id;
+
+DELETE FROM "Address" a WHERE NOT EXISTS (SELECT 1 FROM "Order" o WHERE o."addressId" = a.id);
+
+WITH ranked AS (
+    SELECT id, FIRST_VALUE(id) OVER (
+        PARTITION BY "ipAddress", "ipCountry", "ipRegion", "ipCity" ORDER BY id
+    ) AS keep_id
+    FROM "IpInfo"
+)
+UPDATE "Order" o SET "ipInfoId" = r.keep_id
+FROM ranked r WHERE o."ipInfoId" = r.id AND r.id <> r.keep_id;
+
+DELETE FROM "IpInfo" i WHERE NOT EXISTS (SELECT 1 FROM "Order" o WHERE o."ipInfoId" = i.id);
+
+COMMIT;
@@ -0,0 +1,238 @@
+import { BadRequestException, HttpException, HttpStatus, Injectable, Logger, NotFoundException, OnModuleDestroy, OnModuleInit } from '@nestjs/common';
+import { HttpService } from '@nestjs/axios';
+import { lastValueFrom } from 'rxjs';
+import { PrismaService } from '../prisma/prisma.service';
+import { OrdersService } from './orders.service';
+
+type ClaimedJob = { id: string; payload: any; callbackUrl: string | null; attempts: number; createdAt: Date };
+
+// Worker pool and backpressure limits (override with env vars)
+const WORKERS = parseInt(process.env.ORDER_WORKERS ?? '4', 10);
+const MAX_QUEUE_DEPTH = parseInt(process.env.ORDER_QUEUE_MAX_DEPTH ?? '1000', 10);
+const MAX_ATTEMPTS = parseInt(process.env.ORDER_JOB_MAX_ATTEMPTS ?? '3', 10);
+const POLL_INTERVAL_MS = parseInt(process.env.ORDER_QUEUE_POLL_MS ?? '1000', 10);
+// Jobs left in 'processing' longer than this (e.g. by a crashed process) are requeued
+const STALE_JOB_MS = parseInt(process.env.ORDER_JOB_STALE_MS ?? '300000', 10);
+// How often the poll loop sweeps for stale jobs (those of crashed replicas included)
+const STALE_SWEEP_MS = parseInt(process.env.ORDER_JOB_STALE_SWEEP_MS ?? '60000', 10);
+// Hosts callback_url may point at, comma-separated ("hooks.example.com,*.example.org");
+// unset means callbacks are disabled, so clients cannot make the server call internal services
+const CALLBACK_ALLOWED_HOSTS = (process.env.ORDER_CALLBACK_ALLOWED_HOSTS ?? '')
+    .split(',')
+    .map(h => h.trim().toLowerCase())
+    .filter(Boolean);
+
+function callbackAllowed(callbackUrl: string): boolean {
+    let url: URL;
+    try {
+        url = new URL(callbackUrl);
+    } catch {
+        return false;
+    }
+    if (url.protocol !== 'http:' && url.protocol !== 'https:') return false;
+    const host = url.hostname.toLowerCase();
+    return CALLBACK_ALLOWED_HOSTS.some(allowed =>
+        allowed.startsWith('*.') ? host.endsWith(allowed.slice(1)) : host === allowed,
+    );
+}
+
+@Injectable()
+export class OrderQueueService implements OnModuleInit, OnModuleDestroy {
+    private readonly logger = new Logger(OrderQueueService.name);
+    private running = false;
+    private workers: Promise<void>[] = [];
+    private wakeups: (() => void)[] = [];
+    private lastSweep = 0;
+
+    constructor(
+        private prisma: PrismaService,
+        private ordersService: OrdersService,
+        private httpService: HttpService,
+    ) { }
+
+    async onModuleInit() {
+        await this.requeueStale();
+        this.running = true;
+        this.workers = Array.from({ length: WORKERS }, (_, i) => this.workerLoop(i));
+        this.logger.log(`Started ${WORKERS} order scoring worker(s)`);
+    }
+
+    async onModuleDestroy() {
+        this.running = false;
+        this.wake(WORKERS);
+        await Promise.all(this.workers);
+    }
+
+    // Durably queue an order for scoring; rejects with 503 when the backlog is full
+    async enqueue(orderPayload: any, callbackUrl?: string) {
+        if (callbackUrl != null && !callbackAllowed(String(callbackUrl))) {
+            throw new BadRequestException('callback_url must be an http(s) URL on a host listed in ORDER_CALLBACK_ALLOWED_HOSTS');
+        }
+        const depth = await this.prisma.orderJob.count({ where: { status: { in: ['queued', 'processing'] } } });
+        if (depth >= MAX_QUEUE_DEPTH) {
+            throw new HttpException(
+                { statusCode: HttpStatus.SERVICE_UNAVAILABLE, message: 'Order queue is full, retry later', queueDepth: depth },
+                HttpStatus.SERVICE_UNAVAILABLE,
+            );
+        }
+        const job = await this.prisma.orderJob.create({
+            data: { payload: orderPayload, callbackUrl: callbackUrl ?? null },
+            select: { id: true, status: true, createdAt: true },
+        });
+        this.wake(1);
+        return { jobId: job.id, status: job.status, statusUrl: `/orders/jobs/${job.id}`, queuedAt: job.createdAt };
+    }
+
+    async getJob(id: string) {
+        const job = await this.prisma.orderJob.findUnique({
+            where: { id },
+            select: { id: true, status: true, result: true, error: true, attempts: true, createdAt: true, startedAt: true, finishedAt: true },
+        });
+        if (!job) {
+            throw new NotFoundException(`Order job ${id} not found`);
+        }
+        return job;
+    }
+
+    // Put jobs stuck in 'processing' (their worker or whole replica died) back in the
+    // queue; those already tried MAX_ATTEMPTS times (a payload that keeps crashing or
+    // hanging the worker) fail instead, so they are not requeued forever
+    private async requeueStale() {
+        this.lastSweep = Date.now();
+        const staleBefore = new Date(Date.now() - STALE_JOB_MS);
+        const error = `Order job did not finish within ${STALE_JOB_MS} ms after ${MAX_ATTEMPTS} attempt(s)`;
+        const failed = await this.prisma.$queryRaw<ClaimedJob[]>`
+            UPDATE "OrderJob"
+            SET status = 'failed', error = ${error}, "finishedAt" = now()
+            WHERE status = 'processing' AND "startedAt" < ${staleBefore} AND attempts >= ${MAX_ATTEMPTS}
+            RETURNING id, payload, "callbackUrl", attempts, "createdAt"`;
+        for (const job of failed) {
+            this.logger.warn(`Order job ${job.id} failed: ${error}`);
+            await this.notify(job, { jobId: job.id, status: 'failed', error });
+        }
+        const requeued = await this.prisma.orderJob.updateMany({
+            where: { status: 'processing', startedAt: { lt: staleBefore }, attempts: { lt: MAX_ATTEMPTS } },
+            data: { status: 'queued' },
+        });
+        if (requeued.count > 0) {
+            this.logger.warn(`Requeued ${requeued.count} stale order job(s)`);
+            this.wake(requeued.count);
+        }
+    }
+
+    private wake(count: number) {
+        this.wakeups.splice(0, count).forEach(resolve => resolve());
+    }
+
+    private sleep(ms: number) {
+        return new Promise<void>(resolve => {
+            const done = () => {
+                clearTimeout(timer);
+                this.wakeups = this.wakeups.filter(w => w !== done);
+                resolve();
+            };
+            const timer = setTimeout(done, ms);
+            this.wakeups.push(done);
+        });
+    }
+
+    // Atomically claim the oldest runnable job; SKIP LOCKED lets workers (and
+    // other API instances) claim different jobs without blocking each other
+    private async claim(): Promise<ClaimedJob | null> {
+        const rows = await this.prisma.$queryRaw<ClaimedJob[]>`
+            UPDATE "OrderJob"
+            SET status = 'processing', attempts = attempts + 1, "startedAt" = now()
+            WHERE id = (
+                SELECT id FROM "OrderJob"
+                WHERE status = 'queued' AND "runAfter" <= now()
+                ORDER BY "createdAt"
+                FOR UPDATE SKIP LOCKED
+                LIMIT 1
+            )
+            RETURNING id, payload, "callbackUrl", attempts, "createdAt"`;
+        return rows[0] ?? null;
+    }
+
+    private async workerLoop(worker: number) {
+        while (this.running) {
+            let job: ClaimedJob | null = null;
+            try {
+                if (Date.now() - this.lastSweep >= STALE_SWEEP_MS) {
+                    await this.requeueStale();
+                }
+                job = await this.claim();
+            } catch (error) {
+                this.logger.error(`Worker ${worker} failed to claim a job: ${error.message}`);
+            }
+            if (!job) {
+                await this.sleep(POLL_INTERVAL_MS);
+                continue;
+            }
+            try {
+                await this.runJob(job);
+            } catch (error) {
+                // e.g. the DB write recording a failure failed too; the job is left in
+                // 'processing' for the stale-job sweep, and this worker keeps going
+                this.logger.error(`Worker ${worker} could not finish order job ${job.id}: ${error.message}`);
+                await this.sleep(POLL_INTERVAL_MS);
+            }
+        }
+    }
+
+    private async runJob(job: ClaimedJob) {
+        try {
+            // The job is marked done in the same transaction that saves the order, so a
+            // crash can never leave a saved order behind a job that will be re-run; the
+            // order keeps the job's intake time, however long it waited in the queue
+            const result = await this.ordersService.processIncomingOrder(
+                job.payload,
+                (tx, result) => tx.orderJob.update({
+                    where: { id: job.id },
+                    data: { status: 'done', result: { ...result }, error: null, finishedAt: new Date() },
+                }),
+                job.createdAt,
+            );
+            await this.notify(job, { jobId: job.id, status: 'done', result });
+        } catch (error) {
+            // P2002: the order id is already saved (an earlier run of this job, or the
+            // same order submitted twice), so the job is answered from the stored order
+            if (error.code === 'P2002') {
+                const existing = await this.ordersService.findProcessedOrder(job.payload?.order_details?.order_id);
+                if (existing) {
+                    await this.prisma.orderJob.update({
+                        where: { id: job.id },
+                        data: { status: 'done', result: { ...existing }, error: null, finishedAt: new Date() },
+                    });
+                    await this.notify(job, { jobId: job.id, status: 'done', result: existing });
+                    return;
+                }
+            }
+            const retry = job.attempts < MAX_ATTEMPTS;
+            await this.prisma.orderJob.update({
+                where: { id: job.id },
+                data: retry
+                    ? { status: 'queued', error: error.message, runAfter: new Date(Date.now() + 2 ** job.attempts * 1000) }
+                    : { status: 'failed', error: error.message, finishedAt: new Date() },
+            });
+            this.logger.warn(`Order job ${job.id} attempt ${job.attempts} failed: ${error.message}${retry ? ' (will retry)' : ''}`);
+            if (!retry) {
+                await this.notify(job, { jobId: job.id, status: 'failed', error: error.message });
+            }
+        }
+    }
+
+    private async notify(job: ClaimedJob, body: any) {
+        if (!job.callbackUrl) return;
+        // Re-checked at send time: the allow-list may have changed since the job was queued
+        if (!callbackAllowed(job.callbackUrl)) {
+            this.logger.warn(`Callback for order job ${job.id} skipped: ${job.callbackUrl} is not an allowed host`);
+            return;
+        }
+        try {
+            // No redirects, so an allowed host cannot bounce the request elsewhere
+            await lastValueFrom(this.httpService.post(job.callbackUrl, body, { timeout: 5000, maxRedirects: 0 }));
+        } catch (error) {
+            this.logger.warn(`Callback for order job ${job.id} to ${job.callbackUrl} failed: ${error.message}`);
+        }
+    }
+}
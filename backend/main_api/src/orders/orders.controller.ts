@@ -1,19 +1,44 @@
-import { Controller, Post, Get, Body, HttpCode, Delete, Param } from '@nestjs/common';
-import { OrdersService } from './orders.service';
+import { Controller, Post, Get, Body, HttpCode, Delete, Param, Query } from '@nestjs/common';
+import { OrderListQuery, OrdersService } from './orders.service';
+import { OrderQueueService } from './order-queue.service';
 
 @Controller('orders')
 export class OrdersController {
-    constructor(private readonly ordersService: OrdersService) { }
+    constructor(
+        private readonly ordersService: OrdersService,
+        private readonly orderQueue: OrderQueueService,
+    ) { }
 
+    // Queues the order for scoring and returns immediately; poll statusUrl
+    // (or pass callback_url) for the assessment
     @Post()
     @HttpCode(202)
-    async placeOrder(@Body() orderPayload: any) {
-        return this.ordersService.processIncomingOrder(orderPayload);
+    async placeOrder(@Body() body: any) {
+        const { callback_url, ...orderPayload } = body;
+        return this.orderQueue.enqueue(orderPayload, callback_url);
     }
 
+    @Get('jobs/:id')
+    async getOrderJob(@Param('id') id: string) {
+        return this.orderQueue.getJob(id);
+    }
+
+    // Synchronous batch re-scoring: responds once every order is saved or failed
+    @Post('bulk')
+    @HttpCode(200)
+    async placeOrders(@Body() orderPayloads: any[]) {
+        return this.ordersService.processIncomingOrders(orderPayloads);
+    }
+
+    // ?limit&cursor&action&minScore&maxScore&from&to&fields=list|full
     @Get()
-    async getOrders() {
-        return this.ordersService.getAllOrders();
+    async getOrders(@Query() query: OrderListQuery) {
+        return this.ordersService.listOrders(query);
+    }
+
+    @Get('summary')
+    async getOrdersSummary(@Query() query: OrderListQuery) {
+        return this.ordersService.getOrdersSummary(query);
     }
 
     @Get('customer/:email')
@@ -21,6 +46,11 @@ export class OrdersController {
         return this.ordersService.getCustomerOrderHistory(email);
     }
 
+    @Get(':id')
+    async getOrder(@Param('id') id: string) {
+        return this.ordersService.getOrder(id);
+    }
+
     @Delete(':id')
     async deleteOrder(@Param('id') id: string) {
         return this.ordersService.deleteOrder(id);
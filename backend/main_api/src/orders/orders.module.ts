@@ -2,10 +2,11 @@ import { Module } from '@nestjs/common';
 import { HttpModule } from '@nestjs/axios';
 import { OrdersController } from './orders.controller';
 import { OrdersService } from './orders.service';
+import { OrderQueueService } from './order-queue.service';
 
 @Module({
     imports: [HttpModule],
     controllers: [OrdersController],
-    providers: [OrdersService],
+    providers: [OrdersService, OrderQueueService],
 })
 export class OrdersModule { }
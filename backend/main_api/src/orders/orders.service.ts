@@ -1,18 +1,84 @@
-import { Injectable, Logger } from '@nestjs/common';
+import { BadRequestException, Injectable, Logger, NotFoundException } from '@nestjs/common';
+import { Prisma } from '@prisma/client';
 import { PrismaService } from '../prisma/prisma.service';
 import { HttpService } from '@nestjs/axios';
 import { lastValueFrom } from 'rxjs';
+import { createInterface } from 'readline';
+import { Readable } from 'stream';
+
+// Query parameters of GET /orders and GET /orders/summary (all optional)
+export interface OrderListQuery {
+    limit?: string;
+    cursor?: string;
+    action?: string;
+    minScore?: string;
+    maxScore?: string;
+    from?: string;
+    to?: string;
+    fields?: 'list' | 'full';
+}
+
+// OrderListQuery filters once parsed and validated
+interface OrderFilter {
+    action?: string;
+    from?: Date;
+    to?: Date;
+    minScore?: number;
+    maxScore?: number;
+}
+
+export interface ProcessedOrder {
+    success: boolean;
+    orderId: string;
+    riskScore: number;
+    action: string;
+}
+
+export const AI_SERVICE_URL = process.env.AI_SERVICE_URL ?? 'http://localhost:8000';
+// Bulk re-scoring: the whole batch call must finish within BULK_TIMEOUT_MS, and
+// the AI service may go silent for at most BULK_IDLE_TIMEOUT_MS between results
+const BULK_TIMEOUT_MS = parseInt(process.env.ORDER_BULK_TIMEOUT_MS ?? '600000', 10);
+const BULK_IDLE_TIMEOUT_MS = parseInt(process.env.ORDER_BULK_IDLE_TIMEOUT_MS ?? '60000', 10);
 
 @Injectable()
 export class OrdersService {
     private readonly logger = new Logger(OrdersService.name);
+    private static readonly BULK_PERSIST_CHUNK = 100;
+    // Orders whose historical context is built at once in bulk re-scoring; each runs
+    // four queries, so this keeps a large batch within the Prisma connection pool
+    private static readonly BULK_CONTEXT_CHUNK = 4;
+    private static readonly MAX_PAGE_SIZE = 500;
+
+    private static readonly LIST_ORDER_SELECT = {
+        id: true,
+        orderIdString: true,
+        totalAmount: true,
+        createdAt: true,
+        userProfile: { select: { fullName: true, email: true, phone: true, country: true } },
+        address: { select: { street: true, postalCode: true } },
+        riskAssessment: { select: { riskScore: true, recommendedAction: true } },
+    } satisfies Prisma.OrderSelect;
+
+    private static readonly FULL_ORDER_SELECT = {
+        id: true,
+        orderIdString: true,
+        totalAmount: true,
+        itemCount: true,
+        method: true,
+        createdAt: true,
+        userProfile: true,
+        address: true,
+        riskAssessment: { include: { riskFlags: { orderBy: { ruleId: 'asc' } } } },
+    } satisfies Prisma.OrderSelect;
 
     constructor(
         private prisma: PrismaService,
         private httpService: HttpService,
     ) { }
 
-    // Build historical context from database for AI enrichment
+    // Build historical context from database for AI enrichment.
+    // Four independent, index-backed queries run concurrently and return only
+    // counts, the latest timestamp and distinct matches — never whole order rows.
     private async buildHistoricalContext(orderPayload: any) {
         const now = new Date();
         const oneDayAgo = new Date(now.getTime() - 24 * 60 * 60 * 1000);
@@ -23,105 +89,108 @@ export class OrdersService {
         const fullName = (orderPayload.user_profile.full_name || '').trim();
         const phone = orderPayload.user_profile.phone;
 
-        // 1. Past orders by the same email (primary identifier for "same person")
-        const allMatchingProfiles = await this.prisma.userProfile.findMany({
-            where: { email: email },
-            include: {
-                orders: {
-                    include: { address: true },
-                    orderBy: { createdAt: 'desc' }
-                }
-            }
-        });
-
-        const allPastOrders = allMatchingProfiles.flatMap(p => p.orders);
-        const ordersLast24h = allPastOrders.filter(o => new Date(o.createdAt) >= oneDayAgo).length;
-        const ordersLast7d = allPastOrders.filter(o => new Date(o.createdAt) >= sevenDaysAgo).length;
+        const [orderStats, addressProfiles, duplicateEmailProfiles, duplicatePhoneProfiles] = await Promise.all([
+            // 1. Past orders by the same email (primary identifier for "same person")
+            this.prisma.$queryRaw<{ total: number; last_24h: number; last_7d: number; last_order: Date | null }[]>`
+                SELECT COUNT(*)::int AS total,
+                       COUNT(*) FILTER (WHERE o."createdAt" >= ${oneDayAgo})::int AS last_24h,
+                       COUNT(*) FILTER (WHERE o."createdAt" >= ${sevenDaysAgo})::int AS last_7d,
+                       MAX(o."createdAt") AS last_order
+                FROM "Order" o
+                JOIN "UserProfile" p ON p.id = o."userProfileId"
+                WHERE p.email = ${email}`,
+
+            // 2. Other customers at the same delivery address (different email)
+            this.prisma.userProfile.findMany({
+                where: {
+                    email: { not: email },
+                    orders: {
+                        some: {
+                            address: {
+                                street: orderPayload.address.street,
+                                city: orderPayload.address.city,
+                                postalCode: orderPayload.address.postal_code,
+                            },
+                        },
+                    },
+                },
+                select: { fullName: true, email: true },
+                distinct: ['fullName', 'email'],
+            }),
+
+            // 3. DUPLICATE EMAIL — same email used by a DIFFERENT name in DB
+            this.prisma.userProfile.findMany({
+                where: { email: email, NOT: { userId: userId } },
+                select: { fullName: true, email: true, phone: true },
+                distinct: ['fullName', 'email', 'phone'],
+            }),
+
+            // 4. DUPLICATE PHONE — same phone used by a DIFFERENT name in DB
+            this.prisma.userProfile.findMany({
+                where: { phone: phone, NOT: { email: email } },
+                select: { fullName: true, email: true, phone: true },
+                distinct: ['fullName', 'email', 'phone'],
+            }),
+        ]);
+
+        const { total, last_24h, last_7d, last_order } = orderStats[0];
 
         // HURRY ORDER BOOKING: compute time since last order by this email
         let minutesSinceLastOrder: number | null = null;
         let lastOrderTimestamp: string | null = null;
-        if (allPastOrders.length > 0) {
-            const lastOrder = allPastOrders[0]; // already sorted desc
-            lastOrderTimestamp = lastOrder.createdAt.toISOString();
-            const diffMs = now.getTime() - new Date(lastOrder.createdAt).getTime();
-            minutesSinceLastOrder = Math.round(diffMs / 60000);
+        if (last_order) {
+            lastOrderTimestamp = last_order.toISOString();
+            minutesSinceLastOrder = Math.round((now.getTime() - last_order.getTime()) / 60000);
         }
 
-        // 2. Other customers at the same delivery address (different email)
-        const matchingAddresses = await this.prisma.address.findMany({
-            where: {
-                street: orderPayload.address.street,
-                city: orderPayload.address.city,
-                postalCode: orderPayload.address.postal_code,
-            },
-            include: {
-                orders: {
-                    include: { userProfile: true }
-                }
-            }
-        });
-        const otherNamesAtAddress: string[] = [];
-        for (const addr of matchingAddresses) {
-            for (const order of addr.orders) {
-                if (order.userProfile?.email && order.userProfile.email !== email) {
-                    const entry = `${order.userProfile.fullName} (${order.userProfile.email})`;
-                    if (!otherNamesAtAddress.includes(entry)) {
-                        otherNamesAtAddress.push(entry);
-                    }
-                }
-            }
-        }
-
-        // 3. DUPLICATE EMAIL — same email used by a DIFFERENT name in DB
-        const duplicateEmailProfiles = await this.prisma.userProfile.findMany({
-            where: {
-                email: email,
-                NOT: { userId: userId }
-            },
-        });
-        const duplicateEmailMatches = duplicateEmailProfiles
-            .filter(p => p.fullName.trim().toLowerCase() !== fullName.toLowerCase())
-            .map(p => ({
-                name: p.fullName,
-                email: p.email,
-                phone: p.phone,
-            }));
+        const otherNamesAtAddress = [...new Set(addressProfiles.map(p => `${p.fullName} (${p.email})`))];
 
-        // 4. DUPLICATE PHONE — same phone used by a DIFFERENT name in DB
-        const duplicatePhoneProfiles = await this.prisma.userProfile.findMany({
-            where: {
-                phone: phone,
-                NOT: { email: email }
-            }
+        const differentName = (p: { fullName: string }) => p.fullName.trim().toLowerCase() !== fullName.toLowerCase();
+        const toMatch = (p: { fullName: string; email: string; phone: string }) => ({
+            name: p.fullName,
+            email: p.email,
+            phone: p.phone,
         });
-        const duplicatePhoneMatches = duplicatePhoneProfiles
-            .filter(p => p.fullName.trim().toLowerCase() !== fullName.toLowerCase())
-            .map(p => ({
-                name: p.fullName,
-                email: p.email,
-                phone: p.phone,
-            }));
 
         return {
             same_person_orders: {
                 email: email,
                 full_name: fullName,
-                orders_last_24h: ordersLast24h,
-                orders_last_7d: ordersLast7d,
-                total_past_orders: allPastOrders.length,
+                orders_last_24h: last_24h,
+                orders_last_7d: last_7d,
+                total_past_orders: total,
                 last_order_timestamp: lastOrderTimestamp,
                 minutes_since_last_order: minutesSinceLastOrder,
             },
             address_history: {
                 other_names_at_this_address: otherNamesAtAddress,
             },
-            duplicate_email_matches: duplicateEmailMatches,
-            duplicate_phone_matches: duplicatePhoneMatches,
+            duplicate_email_matches: duplicateEmailProfiles.filter(differentName).map(toMatch),
+            duplicate_phone_matches: duplicatePhoneProfiles.filter(differentName).map(toMatch),
         };
     }
 
-    async processIncomingOrder(orderPayload: any) {
+    // Keeps the AI service's velocity / identity features current without blocking the order flow
+    private recordCommittedOrder(orderPayload: any, committedAt: Date) {
+        const committed = {
+            user_profile: orderPayload.user_profile,
+            address: orderPayload.address,
+            order_details: orderPayload.order_details,
+            committed_at: committedAt.toISOString(),
+        };
+        lastValueFrom(this.httpService.post(`${AI_SERVICE_URL}/api/v1/features/orders`, committed))
+            .catch(err => this.logger.warn(`Failed to update feature store: ${err.message}`));
+    }
+
+    // `onPersisted` runs inside the transaction that saves the order, so callers
+    // (the job queue) can record the outcome atomically with it. `receivedAt` is
+    // when the order came in (the job's intake time), stored as its createdAt so
+    // queueing delays and retries never shift it in the velocity windows.
+    async processIncomingOrder(
+        orderPayload: any,
+        onPersisted?: (tx: Prisma.TransactionClient, result: ProcessedOrder) => Promise<unknown>,
+        receivedAt: Date = new Date(),
+    ) {
         try {
             // 1. Build historical context from database
             const historicalContext = await this.buildHistoricalContext(orderPayload);
@@ -130,178 +199,392 @@ export class OrdersService {
             // 2. Enrich payload with historical context and send to AI Service
             const enrichedPayload = { ...orderPayload, historical_context: historicalContext };
             const aiResponse = await lastValueFrom(
-                this.httpService.post('http://localhost:8000/api/v1/analyze', enrichedPayload)
+                this.httpService.post(`${AI_SERVICE_URL}/api/v1/analyze`, enrichedPayload)
             );
 
-            let riskData = aiResponse.data;
-            if (typeof riskData === 'string') {
-                try {
-                    // Remove markdown wrapping if present
-                    let cleanedData = riskData.replace(/```json\n?/g, '').replace(/```/g, '').trim();
-                    riskData = JSON.parse(cleanedData);
-                } catch (e) {
-                    this.logger.error(`Failed to parse AI response: ${riskData}`);
-                    throw new Error('Invalid JSON response from AI service');
-                }
+            // The AI service returns a validated assessment whose score, action and
+            // summary are already authoritative (computed from the triggered flags)
+            const riskData = aiResponse.data;
+            if (!riskData || typeof riskData !== 'object' || !Array.isArray(riskData.risk_flags)) {
+                this.logger.error(`Unexpected AI response: ${JSON.stringify(riskData)}`);
+                throw new Error('Invalid response from AI service');
             }
 
             this.logger.log(`Received risk assessment for order ${riskData.order_id}: Score ${riskData.risk_score} -> ${riskData.recommended_action}`);
 
-            // 3. Save everything to Database
-            // Create user profile if doesn't exist
-            let userProfile = await this.prisma.userProfile.findFirst({
-                where: { userId: orderPayload.user_profile.user_id }
+            // 3. Save everything to Database in one transaction
+            const { order, result } = await this.prisma.$transaction(async tx => {
+                const order = await this.persistAssessedOrder(tx, orderPayload, riskData, false, receivedAt);
+                const result: ProcessedOrder = {
+                    success: true,
+                    orderId: order.id,
+                    riskScore: riskData.risk_score,
+                    action: riskData.recommended_action
+                };
+                if (onPersisted) {
+                    await onPersisted(tx, result);
+                }
+                return { order, result };
             });
 
-            if (!userProfile) {
-                userProfile = await this.prisma.userProfile.create({
-                    data: {
-                        userId: orderPayload.user_profile.user_id,
-                        fullName: orderPayload.user_profile.full_name || '',
-                        email: orderPayload.user_profile.email,
-                        phone: orderPayload.user_profile.phone,
-                        country: orderPayload.user_profile.country,
-                        createdAt: new Date(orderPayload.user_profile.created_at)
-                    }
-                });
-            }
+            // 4. Fold the committed order into the AI service's feature store (best effort)
+            this.recordCommittedOrder(orderPayload, order.createdAt);
 
-            // Create Address
-            const address = await this.prisma.address.create({
-                data: {
-                    street: orderPayload.address.street,
-                    city: orderPayload.address.city,
-                    state: orderPayload.address.state,
-                    postalCode: orderPayload.address.postal_code,
-                    country: orderPayload.address.country,
-                }
-            });
+            return result;
 
-            // Create IP Info
-            const ipInfo = await this.prisma.ipInfo.create({
-                data: {
-                    ipAddress: orderPayload.ip_info.ip_address,
-                    ipCountry: orderPayload.ip_info.ip_country,
-                    ipRegion: orderPayload.ip_info.ip_region,
-                    ipCity: orderPayload.ip_info.ip_city,
-                    latitude: orderPayload.ip_info.latitude,
-                    longitude: orderPayload.ip_info.longitude,
-                }
-            });
+        } catch (error) {
+            this.logger.error(`Error processing order: ${error.message}`);
+            throw error;
+        }
+    }
+
+    // The stored outcome of an already-saved order, in processIncomingOrder's shape
+    async findProcessedOrder(orderIdString: string): Promise<ProcessedOrder | null> {
+        if (!orderIdString) return null;
+        const order = await this.prisma.order.findUnique({
+            where: { orderIdString: String(orderIdString) },
+            select: { id: true, riskAssessment: { select: { riskScore: true, recommendedAction: true } } },
+        });
+        if (!order?.riskAssessment) return null;
+        return {
+            success: true,
+            orderId: order.id,
+            riskScore: order.riskAssessment.riskScore,
+            action: order.riskAssessment.recommendedAction,
+        };
+    }
 
-            // Create Order
-            const order = await this.prisma.order.create({
+    // Writes profile (if new), address and IP info (deduplicated), the order, its
+    // assessment and all flags using the given transaction client. With
+    // `replaceExisting`, an order whose orderIdString is already stored gets its
+    // assessment replaced instead of failing on the unique constraint; a new
+    // order is stored with `createdAt` (its intake time).
+    private async persistAssessedOrder(
+        tx: Prisma.TransactionClient,
+        orderPayload: any,
+        riskData: any,
+        replaceExisting = false,
+        createdAt: Date = new Date(),
+    ) {
+        const profile = orderPayload.user_profile;
+        const addr = orderPayload.address;
+        const ip = orderPayload.ip_info;
+
+        const userProfile =
+            (await tx.userProfile.findFirst({ where: { userId: profile.user_id }, select: { id: true } })) ??
+            (await tx.userProfile.create({
                 data: {
-                    orderIdString: orderPayload.order_details.order_id,
-                    totalAmount: orderPayload.order_details.total_amount,
-                    itemCount: orderPayload.order_details.item_count,
-                    method: orderPayload.order_details.method,
-                    createdAt: new Date(),
-                    userProfileId: userProfile.id,
-                    addressId: address.id,
-                    ipInfoId: ipInfo.id,
-                }
-            });
+                    userId: profile.user_id,
+                    fullName: profile.full_name || '',
+                    email: profile.email,
+                    phone: profile.phone,
+                    country: profile.country,
+                    createdAt: new Date(profile.created_at),
+                },
+                select: { id: true },
+            }));
 
-            // AUTHORITATIVE RISK SCORE — computed server-side from triggered flags
-            // This ensures the score is always correct, even if the LLM miscalculates.
-            const ruleWeights: Record<number, number> = {
-                1: 0,   // Specific Email and Phone (passed check)
-                2: 0,   // Delivery City Verification (passed check)
-                3: 5,   // Hurry Order Booking
-                4: 5,   // Different Name with Same Address
-                5: 5,   // Postal Code Validation
-                6: 5,   // Duplicate Email — Different Identity
-                7: 5,   // Duplicate Phone — Different Identity
-                8: 5,   // City Name Mismatch
-                9: 5,   // Phone Number VS Country Name
-                10: 5,  // Delivery Address Details (Geocoding)
-            };
+        const addressKey = {
+            street: addr.street ?? '',
+            city: addr.city ?? '',
+            state: addr.state ?? '',
+            postalCode: addr.postal_code ?? '',
+            country: addr.country ?? '',
+        };
+        const address = await tx.address.upsert({
+            where: { street_city_state_postalCode_country: addressKey },
+            create: addressKey,
+            update: {},
+            select: { id: true },
+        });
 
-            const computedScore = (riskData.risk_flags as any[])
-                .filter(f => f.triggered === true)
-                .reduce((sum, f) => sum + (ruleWeights[f.rule_id] ?? 0), 0);
+        const ipKey = {
+            ipAddress: ip.ip_address ?? '',
+            ipCountry: ip.ip_country ?? '',
+            ipRegion: ip.ip_region ?? '',
+            ipCity: ip.ip_city ?? '',
+        };
+        const ipInfo = await tx.ipInfo.upsert({
+            where: { ipAddress_ipCountry_ipRegion_ipCity: ipKey },
+            create: { ...ipKey, latitude: ip.latitude ?? 0, longitude: ip.longitude ?? 0 },
+            update: {},
+            select: { id: true },
+        });
 
-            const llmScore = riskData.risk_score;
-            if (computedScore !== llmScore) {
-                this.logger.warn(
-                    `LLM risk_score=${llmScore} differs from computed score=${computedScore}. Saving computed score.`
-                );
+        const orderIdString = orderPayload.order_details.order_id;
+        const orderData = {
+            totalAmount: orderPayload.order_details.total_amount,
+            itemCount: orderPayload.order_details.item_count,
+            method: orderPayload.order_details.method,
+            userProfileId: userProfile.id,
+            addressId: address.id,
+            ipInfoId: ipInfo.id,
+        };
+        // Assessment and flags as one nested create (flags via createMany)
+        const riskAssessment = {
+            create: {
+                riskScore: riskData.risk_score,
+                recommendedAction: riskData.recommended_action,
+                verificationSuggestions: riskData.verification_suggestions,
+                summary: riskData.summary,
+                riskFlags: {
+                    createMany: {
+                        data: riskData.risk_flags.map((flag: any) => ({
+                            ruleId: flag.rule_id,
+                            ruleName: flag.rule_name,
+                            triggered: flag.triggered,
+                            confidence: flag.confidence,
+                            explanation: flag.explanation,
+                        })),
+                    },
+                },
+            },
+        };
+        const select = { id: true, createdAt: true };
+
+        // Re-scoring: keep the order (and its createdAt), replace its assessment
+        if (replaceExisting) {
+            const existing = await tx.order.findUnique({ where: { orderIdString }, select: { id: true } });
+            if (existing) {
+                await tx.riskAssessment.deleteMany({ where: { orderId: existing.id } });
+                const order = await tx.order.update({ where: { id: existing.id }, data: { ...orderData, riskAssessment }, select });
+                return { ...order, rescored: true };
             }
+        }
 
-            const riskScore = Math.min(computedScore, 40);
-            let enforcedAction: string;
-            if (riskScore >= 1) {
-                enforcedAction = 'manual_review';
-            } else {
-                enforcedAction = 'ship';
-            }
+        const order = await tx.order.create({
+            data: { orderIdString, createdAt, ...orderData, riskAssessment },
+            select,
+        });
+        return { ...order, rescored: false };
+    }
 
-            // Sync AI Summary numerical score with our computed and capped score
-            let syncedSummary = riskData.summary || "No summary provided.";
-            // Regex to replace numbers directly following "risk score of " or "risk score is "
-            syncedSummary = syncedSummary.replace(/risk score of \d+/gi, `risk score of ${riskScore}`);
-            syncedSummary = syncedSummary.replace(/risk score is \d+/gi, `risk score is ${riskScore}`);
+    // Batch re-scoring: build historical context BULK_CONTEXT_CHUNK orders at a time,
+    // assess them through the AI service's batch endpoint and persist the NDJSON
+    // results as they stream in, BULK_PERSIST_CHUNK orders per transaction, so
+    // memory stays bounded by one chunk however large the batch
+    async processIncomingOrders(orderPayloads: any[]) {
+        const enriched: any[] = [];
+        for (let i = 0; i < orderPayloads.length; i += OrdersService.BULK_CONTEXT_CHUNK) {
+            const chunk = orderPayloads.slice(i, i + OrdersService.BULK_CONTEXT_CHUNK);
+            enriched.push(...await Promise.all(chunk.map(async payload => ({
+                ...payload,
+                historical_context: await this.buildHistoricalContext(payload),
+            }))));
+        }
 
-            // Fallback: If it didn't specifically say "risk score of X", just prepend the real score to avoid confusion
-            if (!syncedSummary.includes(`score of ${riskScore}`) && !syncedSummary.includes(`score is ${riskScore}`)) {
-                syncedSummary = `(Score: ${riskScore}/40) ${syncedSummary}`;
-            }
+        const failed: { orderId: string | null; error: string }[] = [];
+        const saved: { orderId: string; riskScore: number; action: string; rescored: boolean }[] = [];
+        const orderIdAt = (index: any) => (index != null ? orderPayloads[index]?.order_details?.order_id ?? null : null);
 
-            // Create Risk Assessment with enforced action and synced summary
-            const riskAssessment = await this.prisma.riskAssessment.create({
-                data: {
-                    orderId: order.id,
-                    riskScore: riskScore,
-                    recommendedAction: enforcedAction,
-                    verificationSuggestions: riskData.verification_suggestions || [],
-                    summary: syncedSummary,
+        const persist = async (rows: any[]) => {
+            const orders = await this.prisma.$transaction(async tx => {
+                const written: { id: string; createdAt: Date; rescored: boolean }[] = [];
+                for (const r of rows) {
+                    written.push(await this.persistAssessedOrder(tx, orderPayloads[r.index], r.assessment, true));
                 }
-            });
+                return written;
+            }, { timeout: 60000 });
 
+            rows.forEach((r, j) => {
+                // A re-scored order was already folded into the feature store
+                if (!orders[j].rescored) {
+                    this.recordCommittedOrder(orderPayloads[r.index], orders[j].createdAt);
+                }
+                saved.push({ orderId: orders[j].id, riskScore: r.assessment.risk_score, action: r.assessment.recommended_action, rescored: orders[j].rescored });
+            });
+        };
 
-            // Create Risk Flags
-            for (const flag of riskData.risk_flags) {
-                await this.prisma.riskFlag.create({
-                    data: {
-                        riskAssessmentId: riskAssessment.id,
-                        ruleId: flag.rule_id,
-                        ruleName: flag.rule_name,
-                        triggered: flag.triggered,
-                        confidence: parseFloat(flag.confidence),
-                        explanation: flag.explanation
+        const persistChunk = async (chunk: any[]) => {
+            try {
+                await persist(chunk);
+            } catch (error) {
+                // One bad order rolls back its chunk: retry the chunk order by order so
+                // only the orders that really fail are reported
+                this.logger.warn(`Bulk persist of ${chunk.length} orders failed (${error.message}); retrying one by one`);
+                for (const r of chunk) {
+                    try {
+                        await persist([r]);
+                    } catch (orderError) {
+                        failed.push({ orderId: orderIdAt(r.index), error: orderError.message });
                     }
-                });
+                }
             }
+        };
 
-            return {
-                success: true,
-                orderId: order.id,
-                riskScore: riskScore,
-                action: enforcedAction
-            };
-
+        // `timeout` is the socket idle limit; the signal bounds the whole call
+        const aiResponse = await lastValueFrom(
+            this.httpService.post(`${AI_SERVICE_URL}/api/v1/analyze/batch`, enriched, {
+                responseType: 'stream',
+                timeout: BULK_IDLE_TIMEOUT_MS,
+                signal: AbortSignal.timeout(BULK_TIMEOUT_MS),
+            })
+        );
+        const answered = new Set<number>();
+        let pending: any[] = [];
+        try {
+            // Reading pauses while a chunk is persisted, so the stream applies backpressure
+            for await (const line of createInterface({ input: aiResponse.data as Readable, crlfDelay: Infinity })) {
+                if (!line.trim()) continue;
+                const r = JSON.parse(line);
+                if (r.index != null) answered.add(r.index);
+                if (!r.assessment) {
+                    failed.push({ orderId: orderIdAt(r.index), error: r.error });
+                    continue;
+                }
+                pending.push(r);
+                if (pending.length >= OrdersService.BULK_PERSIST_CHUNK) {
+                    await persistChunk(pending);
+                    pending = [];
+                }
+            }
         } catch (error) {
-            this.logger.error(`Error processing order: ${error.message}`);
-            throw error;
+            // Cut off (timeout, AI service gone): what was read is still saved below,
+            // every order without a result is reported as failed
+            this.logger.error(`Bulk assessment stream broke off: ${error.message}`);
         }
+        if (pending.length) {
+            await persistChunk(pending);
+        }
+        orderPayloads.forEach((_, index) => {
+            if (!answered.has(index)) {
+                failed.push({ orderId: orderIdAt(index), error: 'No assessment received from the AI service' });
+            }
+        });
+
+        this.logger.log(`Bulk processed ${orderPayloads.length} orders: ${saved.length} saved, ${failed.length} failed`);
+        return { success: failed.length === 0, saved, failed };
     }
 
-    async getAllOrders() {
-        return this.prisma.order.findMany({
-            include: {
-                riskAssessment: {
-                    include: {
-                        riskFlags: true
-                    }
-                },
-                userProfile: true,
-                address: true
-            },
-            orderBy: {
-                createdAt: 'asc'
-            }
+    // Cursor-paginated listing (newest first). `fields=full` adds the flags and
+    // assessment text; the default projection carries only what the table shows.
+    async listOrders(query: OrderListQuery) {
+        const requested = query.limit ? OrdersService.parseNumber('limit', query.limit) : 50;
+        const limit = Math.min(Math.max(Math.floor(requested), 1), OrdersService.MAX_PAGE_SIZE);
+        const select = query.fields === 'full' ? OrdersService.FULL_ORDER_SELECT : OrdersService.LIST_ORDER_SELECT;
+
+        const rows = await this.prisma.order.findMany({
+            where: this.orderFilter(query),
+            select,
+            orderBy: [{ createdAt: 'desc' }, { id: 'desc' }],
+            take: limit + 1,
+            ...(query.cursor ? { cursor: { id: query.cursor }, skip: 1 } : {}),
         });
+
+        const hasMore = rows.length > limit;
+        const items = hasMore ? rows.slice(0, limit) : rows;
+        return { items, nextCursor: hasMore ? items[items.length - 1].id : null };
+    }
+
+    async getOrder(id: string) {
+        const order = await this.prisma.order.findUnique({ where: { id }, select: OrdersService.FULL_ORDER_SELECT });
+        if (!order) {
+            throw new NotFoundException(`Order ${id} not found`);
+        }
+        return order;
+    }
+
+    // Counts, action split, score distribution and daily trend, all aggregated in the database
+    async getOrdersSummary(query: OrderListQuery) {
+        const where = this.orderFilter(query);
+        const [total, byAction, byScore, daily] = await Promise.all([
+            this.prisma.order.count({ where }),
+            this.prisma.riskAssessment.groupBy({
+                by: ['recommendedAction'],
+                where: { order: where },
+                _count: { _all: true },
+            }),
+            this.prisma.riskAssessment.groupBy({
+                by: ['riskScore'],
+                where: { order: where },
+                _count: { _all: true },
+                orderBy: { riskScore: 'asc' },
+            }),
+            this.prisma.$queryRaw<{ date: Date; ship: number; manual_review: number }[]>`
+                SELECT date_trunc('day', o."createdAt") AS date,
+                       COUNT(*) FILTER (WHERE ra."recommendedAction" = 'ship')::int AS ship,
+                       COUNT(*) FILTER (WHERE ra."recommendedAction" = 'manual_review')::int AS manual_review
+                FROM "Order" o
+                JOIN "RiskAssessment" ra ON ra."orderId" = o.id
+                WHERE ${this.orderFilterSql(query)}
+                GROUP BY 1
+                ORDER BY 1`,
+        ]);
+
+        return {
+            total,
+            byAction: Object.fromEntries(byAction.map(g => [g.recommendedAction, g._count._all])),
+            scoreDistribution: byScore.map(g => ({ riskScore: g.riskScore, count: g._count._all })),
+            daily: daily.map(d => ({ date: d.date.toISOString().slice(0, 10), ship: d.ship, manual_review: d.manual_review })),
+        };
+    }
+
+    private static parseNumber(name: string, value: string): number {
+        // A repeated query parameter arrives as an array; String() makes it fail the check
+        const parsed = Number(String(value));
+        if (String(value).trim() === '' || !Number.isFinite(parsed)) {
+            throw new BadRequestException(`${name} must be a number, got "${value}"`);
+        }
+        return parsed;
+    }
+
+    private static parseDate(name: string, value: string): Date {
+        const parsed = new Date(value);
+        if (Number.isNaN(parsed.getTime())) {
+            throw new BadRequestException(`${name} must be an ISO 8601 date, got "${value}"`);
+        }
+        return parsed;
+    }
+
+    // Typed filter values shared by orderFilter() and orderFilterSql(); bad input is a 400, not a database error
+    private parseFilter(query: OrderListQuery): OrderFilter {
+        const filter: OrderFilter = {
+            action: query.action ? String(query.action) : undefined,
+            from: query.from ? OrdersService.parseDate('from', query.from) : undefined,
+            to: query.to ? OrdersService.parseDate('to', query.to) : undefined,
+            minScore: query.minScore ? OrdersService.parseNumber('minScore', query.minScore) : undefined,
+            maxScore: query.maxScore ? OrdersService.parseNumber('maxScore', query.maxScore) : undefined,
+        };
+        if (filter.from && filter.to && filter.from > filter.to) {
+            throw new BadRequestException('from must not be after to');
+        }
+        if (filter.minScore !== undefined && filter.maxScore !== undefined && filter.minScore > filter.maxScore) {
+            throw new BadRequestException('minScore must not be greater than maxScore');
+        }
+        return filter;
+    }
+
+    private orderFilter(query: OrderListQuery): Prisma.OrderWhereInput {
+        const { action, from, to, minScore, maxScore } = this.parseFilter(query);
+        const hasScore = minScore !== undefined || maxScore !== undefined;
+        const riskScore: Prisma.FloatFilter = {};
+        if (minScore !== undefined) riskScore.gte = minScore;
+        if (maxScore !== undefined) riskScore.lte = maxScore;
+        const createdAt: Prisma.DateTimeFilter = {};
+        if (from) createdAt.gte = from;
+        if (to) createdAt.lte = to;
+
+        const where: Prisma.OrderWhereInput = {};
+        if (from || to) where.createdAt = createdAt;
+        if (action || hasScore) {
+            where.riskAssessment = {
+                ...(action ? { recommendedAction: action } : {}),
+                ...(hasScore ? { riskScore } : {}),
+            };
+        }
+        return where;
+    }
+
+    // Same filters as orderFilter() for the raw aggregate (aliases o = Order, ra = RiskAssessment)
+    private orderFilterSql(query: OrderListQuery): Prisma.Sql {
+        const { action, from, to, minScore, maxScore } = this.parseFilter(query);
+        const conditions: Prisma.Sql[] = [Prisma.sql`TRUE`];
+        if (from) conditions.push(Prisma.sql`o."createdAt" >= ${from}`);
+        if (to) conditions.push(Prisma.sql`o."createdAt" <= ${to}`);
+        if (action) conditions.push(Prisma.sql`ra."recommendedAction" = ${action}`);
+        if (minScore !== undefined) conditions.push(Prisma.sql`ra."riskScore" >= ${minScore}`);
+        if (maxScore !== undefined) conditions.push(Prisma.sql`ra."riskScore" <= ${maxScore}`);
+        return Prisma.join(conditions, ' AND ');
     }
 
     async deleteOrder(id: string) {
@@ -18,48 +18,35 @@ import {
 const COLORS = ['#22c55e', '#eab308']; // Green for Ship, Yellow for Manual Review
 
 export default function GraphAnalysis() {
-    const [orders, setOrders] = useState<any[]>([]);
+    const [summary, setSummary] = useState<any | null>(null);
     const [loading, setLoading] = useState(true);
 
+    // Counts and the daily trend are aggregated by the API, not from the raw order list
     useEffect(() => {
-        fetch("http://localhost:3001/orders")
+        fetch("http://localhost:3001/orders/summary")
             .then(res => res.json())
             .then(data => {
-                setOrders(data);
+                setSummary(data);
                 setLoading(false);
             })
             .catch(err => {
-                console.error("Failed to fetch orders:", err);
+                console.error("Failed to fetch order summary:", err);
                 setLoading(false);
             });
     }, []);
 
-    // Aggregating Data
-    const totalShip = orders.filter(o => o.riskAssessment?.recommendedAction?.toLowerCase() === 'ship').length;
-    const totalManualReview = orders.filter(o => o.riskAssessment?.recommendedAction?.toLowerCase() === 'manual_review').length;
+    const totalShip = summary?.byAction?.ship ?? 0;
+    const totalManualReview = summary?.byAction?.manual_review ?? 0;
 
     const chartData = [
         { name: 'Ship', count: totalShip },
         { name: 'Manual Review', count: totalManualReview }
     ];
 
-    // Daily Trends Data Parsing
-    const dateCounts: Record<string, { date: string; ship: number; manual_review: number }> = {};
-
-    orders.forEach(order => {
-        const dateStr = new Date(order.createdAt).toLocaleDateString();
-        if (!dateCounts[dateStr]) {
-            dateCounts[dateStr] = { date: dateStr, ship: 0, manual_review: 0 };
-        }
-        const action = order.riskAssessment?.recommendedAction?.toLowerCase();
-        if (action === 'ship') {
-            dateCounts[dateStr].ship += 1;
-        } else if (action === 'manual_review') {
-            dateCounts[dateStr].manual_review += 1;
-        }
-    });
-
-    const timeSeriesData = Object.values(dateCounts);
+    const timeSeriesData: { date: string; ship: number; manual_review: number }[] = (summary?.daily ?? []).map((d: any) => ({
+        ...d,
+        date: new Date(`${d.date}T00:00:00`).toLocaleDateString(),
+    }));
 
     return (
         <div className="flex flex-col flex-1 min-h-screen bg-slate-50 p-6 font-sans">
@@ -12,18 +12,67 @@ export default function Dashboard() {
   const [customerHistory, setCustomerHistory] = useState<any | null>(null);
   const [historyLoading, setHistoryLoading] = useState(false);
 
-  useEffect(() => {
-    fetch("http://localhost:3001/orders")
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [summary, setSummary] = useState<any | null>(null);
+
+  // Tabs map to the API's server-side action filter
+  const tabAction: Record<string, string> = { "medium risk": "manual_review", "low risk": "ship" };
+
+  const fetchOrdersPage = (cursor: string | null) => {
+    const params = new URLSearchParams({ limit: "100" });
+    if (tabAction[activeTab]) params.set("action", tabAction[activeTab]);
+    if (cursor) params.set("cursor", cursor);
+    return fetch(`http://localhost:3001/orders?${params}`).then(res => res.json());
+  };
+
+  const fetchSummary = () => {
+    fetch("http://localhost:3001/orders/summary")
       .then(res => res.json())
+      .then(data => setSummary(data))
+      .catch(err => console.error("Failed to fetch order summary:", err));
+  };
+
+  useEffect(() => {
+    fetchSummary();
+  }, []);
+
+  useEffect(() => {
+    setLoading(true);
+    fetchOrdersPage(null)
       .then(data => {
-        setOrders(data);
+        setOrders(data.items);
+        setNextCursor(data.nextCursor);
         setLoading(false);
       })
       .catch(err => {
         console.error("Failed to fetch orders:", err);
         setLoading(false);
       });
-  }, []);
+  }, [activeTab]);
+
+  const loadMore = () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    fetchOrdersPage(nextCursor)
+      .then(data => {
+        setOrders(prev => [...prev, ...data.items]);
+        setNextCursor(data.nextCursor);
+        setLoadingMore(false);
+      })
+      .catch(err => {
+        console.error("Failed to fetch orders:", err);
+        setLoadingMore(false);
+      });
+  };
+
+  // The list rows carry only table columns; flags and summary come from the detail endpoint
+  const openDetails = (order: any) => {
+    fetch(`http://localhost:3001/orders/${order.id}`)
+      .then(res => res.json())
+      .then(data => setSelectedOrder(data))
+      .catch(err => console.error("Failed to fetch order details:", err));
+  };
 
   // Whenever a new order is selected, reset modal state and fetch customer history
   useEffect(() => {
@@ -56,6 +105,7 @@ export default function Dashboard() {
         });
         if (response.ok) {
           setOrders(orders.filter(o => o.id !== dbId));
+          fetchSummary();
         } else {
           console.error("Failed to delete order");
         }
@@ -65,17 +115,9 @@ export default function Dashboard() {
     }
   };
 
-  const filteredOrders = orders.filter(o => {
-    if (activeTab === "all") return true;
-    const action = o.riskAssessment?.recommendedAction?.toLowerCase() || "";
-    if (activeTab === "medium risk" && action === "manual_review") return true;
-    if (activeTab === "low risk" && action === "ship") return true;
-    return false;
-  });
-
-  const totalOrders = orders.length;
-  const totalShip = orders.filter(o => o.riskAssessment?.recommendedAction?.toLowerCase() === 'ship').length;
-  const totalManualReview = orders.filter(o => o.riskAssessment?.recommendedAction?.toLowerCase() === 'manual_review').length;
+  const totalOrders = summary?.total ?? 0;
+  const totalShip = summary?.byAction?.ship ?? 0;
+  const totalManualReview = summary?.byAction?.manual_review ?? 0;
 
   return (
     <div className="flex flex-col flex-1 min-h-0 gap-2">
@@ -158,9 +200,9 @@ export default function Dashboard() {
             <tbody className="divide-y divide-solid divide-black">
               {loading ? (
                 <tr><td colSpan={14} className="py-8 text-center text-slate-500 font-medium">Loading orders...</td></tr>
-              ) : filteredOrders.length === 0 ? (
+              ) : orders.length === 0 ? (
                 <tr><td colSpan={14} className="py-8 text-center text-slate-500 font-medium">No orders found.</td></tr>
-              ) : filteredOrders.map((order, i) => {
+              ) : orders.map((order, i) => {
                 const riskScore = order.riskAssessment?.riskScore || 0;
                 const recommended = order.riskAssessment?.recommendedAction || 'N/A';
 
@@ -198,7 +240,7 @@ export default function Dashboard() {
                     </td>
                     <td className="py-3 px-2 text-right">
                       <button
-                        onClick={() => setSelectedOrder(order)}
+                        onClick={() => openDetails(order)}
                         className="text-white bg-blue-600 hover:bg-blue-700 transition-colors px-3 py-1.5 rounded-lg text-xs font-semibold border border-blue-600 shadow-sm whitespace-nowrap"
                       >
                         Details
@@ -217,6 +259,17 @@ export default function Dashboard() {
               })}
             </tbody>
           </table>
+          {nextCursor && !loading && (
+            <div className="p-3 flex justify-center border-t border-slate-200">
+              <button
+                onClick={loadMore}
+                disabled={loadingMore}
+                className="text-white bg-blue-600 hover:bg-blue-700 disabled:opacity-50 transition-colors px-4 py-2 rounded-lg text-sm font-semibold border border-blue-600 shadow-sm"
+              >
+                {loadingMore ? "Loading..." : "Load more"}
+              </button>
+            </div>
+          )}
         </div>
       </div>
 
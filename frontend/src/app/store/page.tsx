@@ -311,6 +311,18 @@ export default function Storefront() {
         localStorage.setItem('storeCheckoutData', JSON.stringify(formData));
     }, [formData]);
 
+    const pollOrderJob = async (statusUrl: string) => {
+        for (let attempt = 0; attempt < 120; attempt++) {
+            const res = await fetch(`http://localhost:3001${statusUrl}`);
+            if (!res.ok) throw new Error('Failed to check order status');
+            const job = await res.json();
+            if (job.status === 'done') return job.result;
+            if (job.status === 'failed') throw new Error(job.error || 'Risk scoring failed for this order');
+            await new Promise(resolve => setTimeout(resolve, 1000));
+        }
+        throw new Error('Timed out waiting for the risk assessment');
+    };
+
     const handleSubmit = async (e: React.FormEvent) => {
         e.preventDefault();
 
@@ -372,9 +384,12 @@ export default function Storefront() {
                 body: JSON.stringify(payload),
             });
 
+            if (response.status === 503) throw new Error('The store is busy right now. Please try again in a moment.');
             if (!response.ok) throw new Error('Failed to submit order');
 
-            const data = await response.json();
+            // The order is queued for risk scoring; poll the job until the assessment is ready
+            const { statusUrl } = await response.json();
+            const data = await pollOrderJob(statusUrl);
             setResult({ success: true, message: 'Order Placed Successfully!', data });
 
         } catch (error: any) {